@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+from .rdfio import read_turtle
+
+# size of the write buffer used for the output files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def extract_abox(reasoned_file, identifier_roots):
+    """
+    Replace the reasoned_file with its instance triples, written as N-Triples. Only the triples whose subject is a
+    data IRI are kept, which includes the asserted and inferred types of the individuals. The ontology axioms the
+    reasoner carried along, ex: the ontology header, declarations and annotations, are dropped, as the SPARQL query
+    only matches the instance data.
+
+    The file is read one statement at a time and the filtered copy is renamed over the reasoned_file once complete,
+    so an interrupted run never leaves a partial file behind.
+
+    :param identifier_roots: list of the identifier_root of each entity
+    :return: tuple of the number of triples kept and dropped
+    """
+    roots = tuple('<' + root for root in identifier_roots)
+    kept = 0
+    dropped = 0
+
+    tmp_file = reasoned_file + '.tmp'
+    with open(tmp_file, 'w', buffering=WRITE_BUFFER_SIZE) as out:
+        for s, p, o in read_turtle(reasoned_file):
+            if s.startswith(roots):
+                out.write("{} {} {} .\n".format(s, p, o))
+                kept += 1
+            else:
+                dropped += 1
+    os.replace(tmp_file, reasoned_file)
+
+    logging.debug("kept {} instance triples and dropped {} ontology triples in {}".format(kept, dropped, reasoned_file))
+    return kept, dropped
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import csv
+import logging
+import os
+import shutil
+
+from .rdfio import parse_ntriples_line
+
+
+class Bisector(object):
+    """
+    Runs a job, ex: the reasoner, on a triples file. If the job fails or times out, the records of the file are split
+    in half and the job is run on each half, until the records that make it fail are isolated. The outputs of the
+    halves that succeed are merged into the output of the file, and the isolated records are quarantined, so a bad
+    record only drops its own triples instead of the whole file.
+
+    A record is a group of connected individuals, ex: the vertTrait, vertOrg and measurementDatum individuals of a
+    data row, which are linked by the relations. Files are only split between records, so the inferences and query
+    joins that depend on the related individuals of a record are the same as when the whole file is run. The schema
+    triples, ex: the ontology import, are copied to each half.
+
+    Before the first file is bisected, the job is run on the schema triples alone. If that fails too, the failure
+    doesn't depend on the data, ex: robot can't load the ontology, so failed files are quarantined without being
+    bisected.
+    """
+
+    def __init__(self, work_dir, schema_triples):
+        """
+        :param work_dir: directory to write the halves and their outputs to
+        :param schema_triples: list of the schema triples, without the trailing " ."
+        """
+        self.work_dir = work_dir
+        self.schema_triples = set(schema_triples)
+        # list of (file, error, triples) of the quarantined records
+        self.quarantined = []
+        self._schema_check = None
+
+    async def run(self, job, input_file, output_file, merge):
+        """
+        :param job: coroutine function job(input_file, output_file). It fails if it raises a RuntimeError or doesn't
+        write the output_file
+        :param merge: function merge(output_files, output_file) that merges the outputs of the halves
+        :return: True if the job succeeded on all triples of the input_file
+        """
+        err = await self._try(job, input_file, output_file)
+        if err is None:
+            return True
+
+        logging.warning("{} failed, bisecting to isolate the failing triples: {}".format(
+            input_file, _first_line(err)))
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        with open(input_file) as f:
+            lines = f.readlines()
+        instance, schema = self._split_schema(lines)
+        records = group_records(instance)
+
+        if not await self._schema_succeeds(job, schema, output_file):
+            logging.error("{} also fails without its instance triples, so it is not bisected".format(input_file))
+            self.quarantined.extend((input_file, err, record) for record in records)
+            return False
+
+        name = os.path.splitext(os.path.basename(input_file))[0]
+        outputs = await self._bisect(job, records, schema, name, os.path.splitext(output_file)[1], input_file, err)
+
+        if outputs:
+            merge(outputs, output_file)
+            self._remove(outputs)
+        return False
+
+    def write_report(self, path):
+        """
+        Write the quarantined triples to a csv file, one triple per row with the file and error it was isolated from,
+        and the first subject of its record
+
+        :return: number of quarantined triples
+        """
+        count = 0
+
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['file', 'error', 'record', 'triple'])
+            for file, err, triples in self.quarantined:
+                record = _subject(triples[0]) if triples else ''
+                for triple in triples:
+                    writer.writerow([os.path.basename(file), _first_line(err), record, triple.rstrip('\n')])
+                    count += 1
+
+        if count:
+            logging.warning("{} triples of {} records failed reasoning and were quarantined in {}".format(
+                count, len(self.quarantined), path))
+        return count
+
+    async def _bisect(self, job, records, schema, name, output_ext, source, err):
+        """
+        :param records: list of the records, each a list of triple lines
+        :return: list of the outputs of the parts of records that succeeded
+        """
+        if len(records) <= 1:
+            for record in records:
+                logging.warning("quarantined a record of {} triples from {}".format(len(record), source))
+                self.quarantined.append((source, err, record))
+            return []
+
+        mid = len(records) // 2
+        outputs = []
+        tasks = []
+
+        for i, part in enumerate((records[:mid], records[mid:]), 1):
+            part_name = "{}.{}".format(name, i)
+            part_file = os.path.join(self.work_dir, part_name + '.ttl')
+            part_output = os.path.join(self.work_dir, part_name + '.out' + output_ext)
+            with open(part_file, 'w') as f:
+                for record in part:
+                    f.writelines(record)
+                f.writelines(schema)
+            tasks.append(self._run_part(job, part, schema, part_name, part_file, part_output, output_ext, source))
+
+        for part_outputs in await asyncio.gather(*tasks):
+            outputs.extend(part_outputs)
+        return outputs
+
+    async def _run_part(self, job, part, schema, part_name, part_file, part_output, output_ext, source):
+        err = await self._try(job, part_file, part_output)
+        self._remove([part_file])
+
+        if err is None:
+            return [part_output]
+
+        self._remove([part_output])
+        return await self._bisect(job, part, schema, part_name, output_ext, source, err)
+
+    async def _schema_succeeds(self, job, schema, output_file):
+        if self._schema_check is None:
+            # checked once, by the first file that fails
+            self._schema_check = asyncio.ensure_future(self._check_schema(job, schema, output_file))
+        return await self._schema_check
+
+    async def _check_schema(self, job, schema, output_file):
+        schema_file = os.path.join(self.work_dir, 'schema_check.ttl')
+        schema_output = os.path.join(self.work_dir, 'schema_check.out' + os.path.splitext(output_file)[1])
+        with open(schema_file, 'w') as f:
+            f.writelines(schema)
+
+        err = await self._try(job, schema_file, schema_output)
+        self._remove([schema_file, schema_output])
+        return err is None
+
+    @staticmethod
+    async def _try(job, input_file, output_file):
+        """
+        :return: the error if the job failed, else None
+        """
+        try:
+            await job(input_file, output_file)
+        except RuntimeError as err:
+            # a failed job may have written a partial output
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            return str(err)
+
+        if not os.path.exists(output_file):
+            return "no output was written"
+
+    def _split_schema(self, lines):
+        instance = []
+        schema = []
+        for line in lines:
+            if not line.strip():
+                continue
+            if not line.endswith('\n'):
+                line += '\n'
+            (schema if line.rstrip()[:-1].rstrip() in self.schema_triples else instance).append(line)
+        return instance, schema
+
+    @staticmethod
+    def _remove(paths):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def group_records(lines):
+    """
+    Group the triple lines into records of connected individuals. Two individuals are connected if one is the object
+    of a triple of the other, ex: a relation between the entities of a data row, so individuals shared by several
+    rows join their records.
+
+    :return: list of the records, each a list of its lines, in the order of their first line
+    """
+    triples = [parse_ntriples_line(line) for line in lines]
+    subjects = {t[0] for t in triples if t}
+    # union-find of the subjects
+    parents = {}
+
+    def find(term):
+        root = term
+        while parents.get(root, root) != root:
+            root = parents[root]
+        while parents.get(term, term) != root:
+            parents[term], term = root, parents[term]
+        return root
+
+    for t in triples:
+        if t and t[2] in subjects:
+            a, b = find(t[0]), find(t[2])
+            if a != b:
+                parents[b] = a
+
+    records = {}
+    for line, t in zip(lines, triples):
+        # lines that can't be parsed are records by themselves
+        records.setdefault(find(t[0]) if t else line, []).append(line)
+    return list(records.values())
+
+
+def _subject(line):
+    triple = parse_ntriples_line(line)
+    return triple[0] if triple else ''
+
+
+def _first_line(err):
+    return str(err).strip().splitlines()[0] if str(err).strip() else ''
+
+
+def merge_files(outputs, output_file, header=False):
+    """
+    Concatenate the outputs into output_file. Turtle files can be concatenated as is, as a prefix may be declared
+    again
+
+    :param header: if True, the files are csv files with a header, which is only copied from the first file
+    """
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w') as out:
+        for i, path in enumerate(outputs):
+            with open(path) as f:
+                if header and i > 0:
+                    f.readline()
+                shutil.copyfileobj(f, out)
+    os.replace(tmp_file, output_file)
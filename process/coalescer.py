@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import os
+
+# extension of the index written next to each triplified file, with the end offset and number of triples of each
+# batch in the file, one batch per line
+BATCHES_EXTENSION = '.batches'
+
+
+class Coalescer(object):
+    """
+    Groups the triplified chunk files into reasoning units of about budget triples, so the size of each reasoner run
+    doesn't depend on the chunk_size used to read and triplify the data.
+
+    Small chunks are merged into a unit, and large chunks are split between the units. Chunks are only split between
+    their triplify batches, so all triples of a row are always in the same unit. A batch larger than the budget is
+    a unit by itself.
+
+    Chunks are added to the units in the order of their index, whatever order they are triplified in, so the same
+    chunks always give the same units and the units of a previous run can be reused.
+    """
+
+    def __init__(self, budget):
+        """
+        :param budget: number of triples to aim for in each unit
+        """
+        self.budget = max(budget, 1)
+        # names of all units emitted so far
+        self.names = []
+        # list of [chunk name, start offset, end offset] of the triples in the current unit
+        self._parts = []
+        self._size = 0
+        # index of the next chunk to add, and index -> (name, batches) of the chunks received before it
+        self._next = 1
+        self._pending = {}
+
+    def add(self, index, name, batches):
+        """
+        Add the triples of a chunk to the current unit, once all chunks with a lower index are added
+
+        :param index: index of the chunk, starting at 1
+        :param name: name of the chunk, or None if the chunk has no triples, ex: it failed validation
+        :param batches: list of (end offset, number of triples) of each batch in the chunk file
+        :return: list of (unit name, parts) of the units that are full
+        """
+        self._pending[index] = (name, batches)
+        units = []
+
+        while self._next in self._pending:
+            name, batches = self._pending.pop(self._next)
+            self._next += 1
+            if name:
+                units.extend(self._add(name, batches))
+
+        return units
+
+    def _add(self, name, batches):
+        units = []
+        start = 0
+
+        for end, num_triples in batches:
+            if self._size and self._size + num_triples > self.budget:
+                units.append(self._emit())
+
+            if self._parts and self._parts[-1][0] == name and self._parts[-1][2] == start:
+                self._parts[-1][2] = end
+            else:
+                self._parts.append([name, start, end])
+            self._size += num_triples
+            start = end
+
+        if self._size >= self.budget:
+            units.append(self._emit())
+
+        return units
+
+    def flush(self):
+        """
+        :return: list of the (unit name, parts) of the last unit, if it isn't empty
+        """
+        return [self._emit()] if self._parts else []
+
+    def _emit(self):
+        name = "unit_{}".format(len(self.names) + 1)
+        parts = self._parts
+        self.names.append(name)
+        self._parts = []
+        self._size = 0
+        return name, parts
+
+
+def write_batches(path, batches):
+    """
+    Write the index of the batches of the triples file at path
+    """
+    with open(path + BATCHES_EXTENSION, 'w') as f:
+        for end, num_triples in batches:
+            f.write("{} {}\n".format(end, num_triples))
+
+
+def read_batches(path):
+    """
+    :return: list of (end offset, number of triples) of the batches in the triples file at path
+    """
+    with open(path + BATCHES_EXTENSION) as f:
+        return [tuple(int(v) for v in line.split()) for line in f if line.strip()]
+
+
+def write_unit(unit_file, parts, input_dir, trailer=None):
+    """
+    Copy the byte ranges of the chunk files in parts to unit_file
+
+    :param parts: list of [chunk name, start offset, end offset]
+    :param input_dir: directory of the chunk files
+    :param trailer: optional lines to write at the end of the unit, ex: the schema triples
+    """
+    with open(unit_file, 'wb') as out:
+        for name, start, end in parts:
+            with open(os.path.join(input_dir, name + '.ttl'), 'rb') as f:
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    block = f.read(min(remaining, 1024 * 1024))
+                    if not block:
+                        break
+                    out.write(block)
+                    remaining -= len(block)
+
+        for line in trailer or []:
+            out.write("{} .\n".format(line).encode('utf-8'))
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import importlib.util
 import logging
 import os
 import csv
@@ -6,10 +7,20 @@ import re
 import rfc3987
 import pandas as pd
 
+from .jvm import total_memory_mb
 from .labelmap import LabelMap
+from .utils import BoundedCache
 
 VALID_RULES = ['RequiredValue', 'ControlledVocabulary', 'UniqueValue', 'Integer', 'Float']
 
+# matches ontology labels in braces, ex: {whole plant phenological stage}
+LABEL_RE = re.compile(r'(\{[A-Za-z0-9\- _\\(\\)]+\})')
+
+# maximum number of resolved labels to cache
+LABEL_CACHE_SIZE = 10000
+
+_MISSING = object()
+
 class Config(object):
     """
     class containing config values. All config data is accessible as attributes on this class
@@ -29,6 +40,39 @@ class Config(object):
         if not self.chunk_size:
             self.chunk_size = 10000
 
+        if not self.batch_size:
+            self.batch_size = 1000
+
+        if self.invalid_sample_size is None:
+            self.invalid_sample_size = 100
+
+        if not self.memory_budget:
+            self.memory_budget = int(total_memory_mb() * 0.75) if total_memory_mb() else 16384
+
+        if self.robot_worker and not self.robot_workers:
+            self.robot_workers = max((self.num_processes or 1) // 2, 1)
+
+        if not self.csv_engine:
+            self.csv_engine = 'c'
+
+        if not self.reasoner_engine:
+            self.reasoner_engine = 'robot'
+
+        if not self.rdf2csv_engine:
+            self.rdf2csv_engine = 'robot'
+
+        if not self.merge_file_mb:
+            self.merge_file_mb = 256
+
+        if self.csv_engine == 'pyarrow':
+            if importlib.util.find_spec('pyarrow') is None:
+                logging.warning("pyarrow is not installed. Falling back to the c csv_engine")
+                self.csv_engine = 'c'
+            elif not self.parallel_read:
+                # the pyarrow engine can't read a file in chunks
+                logging.warning("the pyarrow csv_engine requires parallel_read. Falling back to the c csv_engine")
+                self.csv_engine = 'c'
+
         if not os.path.exists(self.config_dir):
             raise RuntimeError("cannot find configuration directory "+ self.config_dir)
         
@@ -45,6 +89,15 @@ class Config(object):
             os.remove(data_file_path)
 
         self.invalid_data_file = os.path.join(self.output_dir, 'invalid_data.csv')
+        self.schema_file = os.path.join(self.output_dir, 'schema.ttl')
+        self.unique_index_dir = os.path.join(self.output_dir, '.unique_index')
+        self.validation_shard_dir = os.path.join(self.output_dir, '.validation_shards')
+        self.validation_report_file = os.path.join(self.output_dir, 'validation_report.csv')
+        self.manifest_file = os.path.join(self.output_dir, 'manifest.json')
+        self.jvm_history_file = os.path.join(self.output_dir, 'jvm_history.json')
+        self.quarantine_report_file = os.path.join(self.output_dir, 'quarantined_triples.csv')
+        self.bisect_dir = os.path.join(self.output_dir, '.bisect')
+        self.merge_runs_dir = os.path.join(self.output_dir, '.merge_runs')
 
         # output directories
         self.output_csv_dir = os.path.join(self.output_dir, 'output_csv')
@@ -52,24 +105,31 @@ class Config(object):
         self.output_unreasoned_dir = os.path.join(self.output_dir, 'output_unreasoned')
         self.output_reasoned_dir = os.path.join(self.output_dir, 'output_reasoned')
         self.output_reasoned_csv_dir = os.path.join(self.output_dir, 'output_reasoned_csv')
+        self.output_units_dir = os.path.join(self.output_dir, 'reasoning_units')
+        self.output_merged_csv_dir = os.path.join(self.output_dir, 'output_reasoned_csv_merged')
 
         if not self.reasoner_config:
             self.reasoner_config = os.path.join(self.config_dir, "reasoner.conf")
 
         self.__label_map = LabelMap(self.ontology)
+        self.__label_cache = BoundedCache(LABEL_CACHE_SIZE)
 
         self._parse_headers()
         
         self.lists = {}
+        self.vocabularies = {}
         self.rules = []
         #self._add_default_rules()
         self._parse_rules()
+        self._index_rules()
 
         self.entities = []
+        self.entity_index = {}
         self._parse_entities()
         self._parse_mapping()
         self.relations = []
         self._parse_relations()
+        self._plan_load()
 
         self._find_sparql()
 
@@ -86,19 +146,27 @@ class Config(object):
         """
         Return the entity with a matching alias
         """
-
-        for entity in self.entities:
-            if entity['alias'] == alias:
-                return entity
+        return self.entity_index.get(alias)
 
     def get_list(self, column):
         """
         Return the list for a given column
         """
+        if column in self.column_lists:
+            return self.lists[self.column_lists[column]]
 
-        for rule in self.rules:
-            if rule['rule'] == 'ControlledVocabulary' and column in rule['columns']:
-                return self.lists[rule['list']]
+    def get_vocabulary(self, column):
+        """
+        Return the controlled vocabulary for a given column as a dict of field -> defined_by
+        """
+        if column in self.column_lists:
+            return self.vocabularies[self.column_lists[column]]
+
+    def get_rules(self, column):
+        """
+        Return the set of rule names that apply to a given column
+        """
+        return self.column_rules.get(column, frozenset())
 
     def _parse_rules(self):
         """
@@ -137,6 +205,43 @@ class Config(object):
 
         self.rules.extend(rules)
 
+    def _index_rules(self):
+        """
+        Build the column -> rule set and column -> list name lookup tables. The first ControlledVocabulary rule for
+        a column determines its list. These are built once and should not be modified.
+        """
+        column_rules = {}
+        self.column_lists = {}
+
+        for rule in self.rules:
+            for column in rule['columns']:
+                column_rules.setdefault(column, set()).add(rule['rule'])
+
+                if rule['rule'] == 'ControlledVocabulary':
+                    self.column_lists.setdefault(column, rule['list'])
+
+        self.column_rules = {column: frozenset(rules) for column, rules in column_rules.items()}
+
+
+    def _plan_load(self):
+        """
+        Determine which columns of the data_file need to be read, and the dtypes to read them as. Only the mapped,
+        unique_key and rule columns are used. Integer and Float rule columns are read as strings, as the rules and
+        the triplifier convert the values themselves, so pandas doesn't need to infer their type.
+        """
+        self.load_columns = set(self.headers or [])
+        self.load_columns.update(entity['unique_key'] for entity in self.entities)
+        self.load_columns.update(self.column_rules)
+
+        self.load_dtypes = {column: str for column, rules in self.column_rules.items()
+                            if 'Integer' in rules or 'Float' in rules}
+
+    def get_load_plan(self, columns):
+        """
+        Return the pandas.read_csv usecols and dtype args for a data_file with the given columns
+        """
+        usecols = [c for c in columns if c in self.load_columns]
+        return {'usecols': usecols, 'dtype': {c: self.load_dtypes[c] for c in usecols if c in self.load_dtypes}}
 
     def _parse_list(self, file_name):
         """
@@ -165,6 +270,12 @@ class Config(object):
                         r['defined_by'] = self._get_uri_from_label(r['defined_by'])
                         self.lists[file_name].append(r)
 
+            # field -> defined_by lookup table. The first entry for a field wins
+            self.vocabularies[file_name] = {}
+            for r in self.lists[file_name]:
+                if r['defined_by']:
+                    self.vocabularies[file_name].setdefault(r['field'], r['defined_by'])
+
     def _parse_entities(self):
         """
         Parse entity.csv file. Used to define the entities for triplifying
@@ -186,6 +297,7 @@ class Config(object):
 
             entity['concept_uri'] = self._get_uri_from_label(entity['concept_uri'])
             entity['columns'] = []
+            self.entity_index.setdefault(entity['alias'], entity)
 
     def _parse_mapping(self):
         """
@@ -231,22 +343,43 @@ class Config(object):
 
             r['predicate'] = self._get_uri_from_label(r['predicate'])
 
+    def resolve_label(self, label):
+        """
+        Return the IRI of the ontology term with the given label, ex: "whole plant"
+        """
+        return self._get_uri_from_label('{' + label + '}')
+
+    def label_cache_info(self):
+        """
+        Return the hits, misses, maxsize and currsize of the label -> IRI cache used by _get_uri_from_label
+        """
+        return self.__label_cache.info()
+
     def _get_uri_from_label(self, def_text):
         """
         Fetches a URI given a label by searching
         all term labels in braces ('{' and '}').  For
         example, if we encounter "{whole plant phenological stage}",
         it will be converted to "http://purl.obolibrary.org/obo/PPO_0000001".
+
+        Resolved values are cached, so repeated values only cost a dict lookup.
         """
+        newdef = self.__label_cache.get(def_text, _MISSING)
+
+        if newdef is _MISSING:
+            newdef = self._resolve_uri_from_label(def_text)
+            self.__label_cache.put(def_text, newdef)
+
+        return newdef
+
+    def _resolve_uri_from_label(self, def_text):
         #labelre = re.compile(r'(\{[A-Za-z0-9\- _]+\})')
         #labelre = re.compile(r'(\{[(.*?)]\})')
-        labelre = re.compile(r'(\{[A-Za-z0-9\- _\\(\\)]+\})')
-
-        defparts = labelre.split(def_text)
+        defparts = LABEL_RE.split(def_text)
 
         newdef = ''
         for defpart in defparts:
-            if labelre.match(defpart):
+            if LABEL_RE.match(defpart):
                 label = defpart.strip("{}")
 
                 # Get the class IRI associated with this label.
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import collections
+import json
+import logging
+import os
+import shlex
+import subprocess
+import threading
+
+from .worker import RobotWorkerPool
+
+# java executable used to run the JVM jobs
+JAVA = 'java'
+
+# heap sizes used for a kind of job until the peak memory of a job of that kind has been observed
+DEFAULT_HEAP_MB = {
+    'reason': 8048,
+    'query': 6048,
+    'reason_query': 8048,
+    'prepare': 8048,
+}
+MIN_HEAP_MB = 512
+
+# the estimated heap is the observed peak memory per input byte of similar files * input size * HEAP_HEADROOM
+HEAP_HEADROOM = 1.5
+# number of observations kept for each kind of job
+HISTORY_SIZE = 50
+
+# seconds between reads of the peak memory of a running job
+POLL_INTERVAL = 0.5
+# number of stderr lines kept for the error message of a failed job
+STDERR_LINES = 50
+
+
+def total_memory_mb():
+    """
+    Return the physical memory of the machine in MB, or None if it can't be determined
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class JvmJobError(RuntimeError):
+    def __init__(self, cmd, returncode, stderr):
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__("java exited with {}: {}\n{}".format(returncode, subprocess.list2cmdline(cmd), stderr))
+
+
+class JvmTimeoutError(JvmJobError):
+    def __init__(self, cmd, timeout, stderr=''):
+        self.timeout = timeout
+        super().__init__(cmd, None, "timed out after {} seconds\n{}".format(timeout, stderr))
+
+
+class JvmExecutor(object):
+    """
+    Runs JVM jobs, ex: ROBOT commands, as asyncio subprocesses on an event loop in a background thread.
+
+    Jobs are only started while the sum of their heap sizes fits in the memory budget, so the number of jobs
+    running at once adapts to the size of their inputs. The heap of each job is estimated from the size of its input
+    and the peak memory of previous jobs of the same kind with similar input sizes. The stdout and stderr of each
+    job are read while it runs, so a job can't block on a full pipe.
+
+    If a worker command is given, the robot jobs are instead sent to a pool of long running RobotWorkers, which
+    have a fixed heap set by their command. Jobs are admitted to the workers with the same memory budget.
+    """
+
+    def __init__(self, memory_budget_mb, max_jobs, history_file=None, worker_cmd=None, num_workers=1):
+        """
+        :param memory_budget_mb: maximum total heap of the running jobs
+        :param max_jobs: maximum number of jobs running at once
+        :param history_file: optional json file to load and save the observed peak memory of the jobs, so the
+        estimates carry over to later runs
+        :param worker_cmd: optional command line that starts a RobotWorker
+        :param num_workers: number of RobotWorkers to run when a worker_cmd is given
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self.max_jobs = max(max_jobs, 1)
+        self.history_file = history_file
+        self.workers = RobotWorkerPool(shlex.split(worker_cmd), num_workers) if worker_cmd else None
+        # kind -> list of [input size in bytes, peak memory in MB]
+        self.history = {}
+        self._used_mb = 0
+        self._running = 0
+        self._loop = None
+        self._thread = None
+        self._admission = None
+
+        if history_file and os.path.exists(history_file):
+            try:
+                with open(history_file) as f:
+                    self.history = json.load(f)
+            except ValueError:
+                logging.warning("ignoring invalid jvm history file {}".format(history_file))
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self._loop)
+            self._admission = asyncio.Condition()
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name='jvm-executor', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def close(self):
+        if self._loop:
+            if self.workers:
+                asyncio.run_coroutine_threadsafe(self.workers.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+        if self.history_file:
+            with open(self.history_file, 'w') as f:
+                json.dump(self.history, f)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        """
+        Run the coroutine function func(*args) on the event loop. Has the same signature as
+        multiprocessing.Pool.apply_async, so the executor can run the tasks of a scheduler Stage.
+        """
+        future = asyncio.run_coroutine_threadsafe(func(*args), self._loop)
+
+        def done(f):
+            err = f.exception()
+            if err is not None:
+                if error_callback:
+                    error_callback(err)
+            elif callback:
+                callback(f.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def run_sync(self, args, input_file, kind, timeout=None):
+        """
+        Call run from a thread other than the event loop, and wait for the result
+        """
+        return asyncio.run_coroutine_threadsafe(self.run(args, input_file, kind, timeout), self._loop).result()
+
+    async def run(self, args, input_file, kind, timeout=None):
+        """
+        Run java with the given args once there is enough memory for the estimated heap. If the job runs out of
+        memory, it is run again with double the heap, up to the memory budget.
+
+        :param args: args passed to java after the -Xmx option
+        :param input_file: input of the job, used to estimate the heap
+        :param kind: kind of job, ex: reason or query. Heap estimates are based on jobs of the same kind
+        :param timeout: optional wall-clock limit in seconds for each run of the job. The job is killed and a
+        JvmTimeoutError raised if it runs longer
+        :return: stdout of the job
+        """
+        input_size = os.path.getsize(input_file) if os.path.exists(input_file) else 0
+        heap_mb = self.estimate_heap(kind, input_size)
+
+        if self.workers:
+            # the heap of the workers is fixed, but the memory a job uses within it still counts against the budget
+            await self._acquire(heap_mb)
+            try:
+                return await self._run_in_worker(args, timeout)
+            finally:
+                await self._release(heap_mb)
+
+        while True:
+            try:
+                return await self._run(args, heap_mb, input_size, kind, timeout)
+            except JvmJobError as err:
+                if isinstance(err, JvmTimeoutError) or 'OutOfMemoryError' not in err.stderr or \
+                        heap_mb >= self.memory_budget_mb:
+                    raise
+                heap_mb = min(heap_mb * 2, self.memory_budget_mb)
+                logging.warning("{} ran out of memory, retrying with {}m heap".format(input_file, heap_mb))
+
+    def estimate_heap(self, kind, input_size):
+        """
+        Estimate the heap in MB for a job of the given kind from the peak memory per input byte of previous jobs of
+        that kind. Jobs with input sizes within a factor of 2 are preferred.
+        """
+        observations = self.history.get(kind)
+
+        if not observations:
+            heap_mb = DEFAULT_HEAP_MB.get(kind, MIN_HEAP_MB)
+        else:
+            similar = [o for o in observations if input_size / 2 <= o[0] <= input_size * 2] or observations
+            ratio = max(peak_mb / max(size, 1) for size, peak_mb in similar)
+            heap_mb = ratio * input_size * HEAP_HEADROOM
+
+        return int(min(max(heap_mb, MIN_HEAP_MB), self.memory_budget_mb))
+
+    async def _run(self, args, heap_mb, input_size, kind, timeout=None):
+        await self._acquire(heap_mb)
+        try:
+            cmd = [JAVA, '-Xmx{}m'.format(heap_mb)] + args
+            logging.debug("running java with {}m heap: {}".format(heap_mb, subprocess.list2cmdline(cmd)))
+
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.PIPE)
+            stdout = []
+            stderr = collections.deque(maxlen=STDERR_LINES)
+            peak_mb = [0]
+            poll = asyncio.ensure_future(self._poll_peak_memory(proc.pid, peak_mb))
+
+            try:
+                await asyncio.wait_for(asyncio.gather(self._read_lines(proc.stdout, stdout),
+                                                      self._read_lines(proc.stderr, stderr), proc.wait()), timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise JvmTimeoutError(cmd, timeout, "\n".join(stderr))
+            finally:
+                poll.cancel()
+        finally:
+            await self._release(heap_mb)
+
+        if proc.returncode != 0:
+            raise JvmJobError(cmd, proc.returncode, "\n".join(stderr))
+
+        if peak_mb[0]:
+            observations = self.history.setdefault(kind, [])
+            observations.append([input_size, peak_mb[0]])
+            del observations[:-HISTORY_SIZE]
+
+        return "\n".join(stdout)
+
+    async def _run_in_worker(self, args, timeout=None):
+        # the workers already run robot, so only the robot args are sent
+        robot_args = args[args.index('-jar') + 2:] if '-jar' in args else args
+        try:
+            result = await asyncio.wait_for(self.workers.run(robot_args), timeout)
+        except asyncio.TimeoutError:
+            raise JvmTimeoutError(robot_args, timeout)
+
+        for line in result.get('stdout', '').splitlines():
+            logging.debug(line)
+
+        if result['exit'] != 0:
+            raise JvmJobError(robot_args, result['exit'], result.get('stderr', ''))
+
+        return result.get('stdout', '')
+
+    async def _acquire(self, heap_mb):
+        async with self._admission:
+            # a job larger than the budget is run alone, instead of never being run
+            await self._admission.wait_for(lambda: self._running < self.max_jobs and (
+                    self._used_mb + heap_mb <= self.memory_budget_mb or self._running == 0))
+            self._used_mb += heap_mb
+            self._running += 1
+
+    async def _release(self, heap_mb):
+        async with self._admission:
+            self._used_mb -= heap_mb
+            self._running -= 1
+            self._admission.notify_all()
+
+    @staticmethod
+    async def _read_lines(stream, lines):
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            line = line.decode('utf-8', errors='replace').rstrip()
+            logging.debug(line)
+            lines.append(line)
+
+    @staticmethod
+    async def _poll_peak_memory(pid, peak_mb):
+        """
+        Store the peak resident memory (VmHWM) of the process in peak_mb[0] until cancelled. The memory can't be
+        read once the process has exited, so it is polled while the process runs. Only supported on linux.
+        """
+        while True:
+            peak_mb[0] = max(peak_mb[0], read_peak_memory_mb(pid) or 0)
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+def read_peak_memory_mb(pid):
+    """
+    Return the peak resident memory of the process in MB, or None if it is not available
+    """
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        return None
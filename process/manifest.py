@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+# the recorded outputs are saved after this many updates, or this many seconds after the last save
+SAVE_EVERY = 100
+SAVE_INTERVAL = 10
+
+
+class Manifest(object):
+    """
+    Records the inputs and stage outputs of each chunk of a run, so a later run can skip the chunks that have not
+    changed.
+
+    Each chunk is stored under its name with the hash of its input rows, the fingerprint of the config directory,
+    ontology and pipeline version, and the output file written by each completed stage. The outputs of a chunk are
+    only reused if all of the hashes match and the output files still exist.
+
+    When the triplified chunks are coalesced into reasoning units, each unit is stored the same way, with the byte
+    ranges of the chunks it contains and the input hashes of those chunks in place of an input hash.
+
+    The updates of each chunk and unit are batched, and the manifest is saved every SAVE_EVERY updates or
+    SAVE_INTERVAL seconds, so the number of saves doesn't grow with the number of chunks. The pending updates are
+    saved when the manifest is used as a context manager and the block exits. If a run is killed before then, the
+    outputs of the last updates are recomputed by the next run.
+    """
+
+    def __init__(self, path, fingerprint, save_every=SAVE_EVERY, save_interval=SAVE_INTERVAL):
+        """
+        :param path: path of the manifest json file
+        :param fingerprint: dict of the hashes of the config, ontology and version for this run
+        :param save_every: number of updates after which the manifest is saved
+        :param save_interval: seconds after the last save after which an update saves the manifest
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.chunks = {}
+        self.units = {}
+        # number of updates since the last save
+        self._pending = 0
+        self._last_save = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def load(self):
+        """
+        Load the chunks recorded by a previous run. A missing or unreadable manifest is treated as empty
+        """
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+            self.chunks = manifest.get('chunks', {})
+            self.units = manifest.get('units', {})
+        except (OSError, ValueError):
+            self.chunks = {}
+            self.units = {}
+
+    def save(self):
+        # write to a temp file first so an interrupted run never leaves a partial manifest
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'chunks': self.chunks, 'units': self.units}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+        self._last_save = time.monotonic()
+
+    def flush(self):
+        """
+        Save the updates that haven't been saved yet
+        """
+        if self._pending:
+            self.save()
+
+    def completed_stages(self, name, input_hash):
+        """
+        :return: dict of stage -> output path for the stages of the chunk that can be reused
+        """
+        chunk = self.chunks.get(name)
+
+        if not chunk or chunk['input'] != input_hash or chunk['fingerprint'] != self.fingerprint:
+            return {}
+
+        return {stage: path for stage, path in chunk['outputs'].items() if os.path.exists(path)}
+
+    def start_chunk(self, name, input_hash):
+        """
+        Record a chunk that is about to be processed. Any outputs recorded for the chunk by a previous run are
+        discarded
+
+        :return: list of the output paths previously recorded for the chunk
+        """
+        previous = self.chunks.get(name)
+        self.chunks[name] = {'input': input_hash, 'fingerprint': self.fingerprint, 'outputs': {}}
+        return list(previous['outputs'].values()) if previous else []
+
+    def add_output(self, name, stage, path):
+        """
+        Record the output of a stage of a chunk or reasoning unit
+        """
+        record = self.units[name] if name in self.units else self.chunks[name]
+        record['outputs'][stage] = path
+        self._updated()
+
+    def completed_unit_stages(self, name, parts):
+        """
+        :param parts: list of [chunk name, start offset, end offset] of the triples in the unit
+        :return: dict of stage -> output path for the stages of the unit that can be reused
+        """
+        unit = self.units.get(name)
+
+        if not unit or unit['parts'] != self._unit_parts(parts) or unit['fingerprint'] != self.fingerprint:
+            return {}
+
+        return {stage: path for stage, path in unit['outputs'].items() if os.path.exists(path)}
+
+    def start_unit(self, name, parts):
+        """
+        Record a reasoning unit that is about to be processed. Any outputs recorded for the unit by a previous run
+        are discarded
+
+        :return: list of the output paths previously recorded for the unit
+        """
+        previous = self.units.get(name)
+        self.units[name] = {'parts': self._unit_parts(parts), 'fingerprint': self.fingerprint, 'outputs': {}}
+        self._updated()
+        return list(previous['outputs'].values()) if previous else []
+
+    def prune_units(self, names):
+        """
+        Remove all reasoning units not in names from the manifest
+
+        :return: list of the output paths of the removed units
+        """
+        removed = [name for name in self.units if name not in names]
+        paths = []
+
+        for name in removed:
+            paths.extend(self.units.pop(name)['outputs'].values())
+
+        self.save()
+        return paths
+
+    def _updated(self):
+        self._pending += 1
+        if self._pending >= self.save_every or time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def _unit_parts(self, parts):
+        # the input hash of each chunk is included, so a unit is not reused if the rows of one of its chunks changed
+        return [[name, self.chunks[name]['input'], start, end] for name, start, end in parts]
+
+    def prune(self, names):
+        """
+        Remove all chunks not in names from the manifest
+
+        :return: list of the output paths of the removed chunks
+        """
+        removed = [name for name in self.chunks if name not in names]
+        paths = []
+
+        for name in removed:
+            paths.extend(self.chunks.pop(name)['outputs'].values())
+
+        self.save()
+        return paths
+
+    @staticmethod
+    def hash_chunk(data_frame):
+        """
+        Hash the column names and values of the data_frame
+        """
+        h = hashlib.sha256()
+        h.update("\x1f".join(str(c) for c in data_frame.columns).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(data_frame, index=False).to_numpy().tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def hash_path(path):
+        """
+        Hash the contents of a file, or of all files in a directory. If the path doesn't exist, ex: the ontology
+        is a url, the path itself is hashed
+        """
+        h = hashlib.sha256()
+
+        if os.path.isdir(path):
+            for root, dirs, files in sorted(os.walk(path)):
+                dirs.sort()
+                for file in sorted(files):
+                    file_path = os.path.join(root, file)
+                    h.update(os.path.relpath(file_path, path).encode('utf-8'))
+                    _hash_file(h, file_path)
+        elif os.path.isfile(path):
+            _hash_file(h, path)
+        else:
+            h.update(path.encode('utf-8'))
+
+        return h.hexdigest()
+
+
+def _hash_file(h, path):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+import csv
+import logging
+import os
+
+import requests
+from lxml import etree
+
+from .rdfio import OWL, RDF, RDF_TYPE, RDFS, is_iri, parse_ntriples_line
+
+RDF_ABOUT = '{{{}}}about'.format(RDF)
+RDF_RESOURCE = '{{{}}}resource'.format(RDF)
+
+NAMED_INDIVIDUAL = '<{}NamedIndividual>'.format(OWL)
+
+# types in these namespaces are declarations, ex: rdfs:Class or owl:ObjectProperty, not classes of individuals
+BUILTIN_NAMESPACES = ('<' + RDF, '<' + RDFS, '<' + OWL)
+
+# size of the write buffer used for the output files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class TypeMaterializer(object):
+    """
+    Infers the types of the individuals in a triples file without running a reasoner. Only supports the "types"
+    inferences of the reasoner.conf, which are the named superclasses of the asserted types and the domains and
+    ranges of the properties used.
+
+    The subclass hierarchy of the ontology, including its imports closure, is loaded once. Each class is given an
+    integer id, and the ids of the ancestors of each class, including itself, are precomputed as a tuple. The
+    ancestors are only as many as the depth and fan-in of the hierarchy, so the closures stay linear in the size of
+    large ontologies. The types of an individual are then the union of the ancestors of its asserted types, so
+    expanding the types while streaming the triples is a set update per triple.
+
+    Named superclasses in owl:intersectionOf expressions are followed. Other class expressions, ex: restrictions, are
+    ignored, so inferences that need a full OWL reasoner are not made.
+    """
+
+    def __init__(self, ontology, excluded_types=None):
+        """
+        :param ontology: filepath or url of the ontology
+        :param excluded_types: optional list of (class IRI, exclude class, exclude superclasses) tuples. The class
+        itself and/or its superclasses are not added as inferred types. Asserted types are always kept
+        """
+        self.ontology = ontology
+        # class term -> id, and id -> class term
+        self._ids = {}
+        self._classes = []
+        # class id -> set of parent class ids
+        self._parents = []
+        # property term -> sets of super property terms, domain class ids and range class ids
+        self._super_properties = {}
+        self._domains = {}
+        self._ranges = {}
+
+        self._load(ontology, set())
+
+        # class id -> tuple of the ids of its ancestors
+        self._ancestors = self._closures()
+        self._domain_types, self._range_types = self._property_types()
+        self._excluded = self._excluded_ids(excluded_types or [])
+        # set of class ids -> list of class terms, since most individuals share the same few sets of types
+        self._terms_cache = {}
+
+    @property
+    def num_classes(self):
+        return len(self._classes)
+
+    def ancestors(self, cls):
+        """
+        :param cls: class IRI
+        :return: set of the IRIs of the class and its named superclasses
+        """
+        cls_id = self._ids.get('<{}>'.format(cls))
+        if cls_id is None:
+            return {cls}
+        return {term[1:-1] for term in self._terms(self._ancestors[cls_id])}
+
+    def materialize(self, input_file, output_file):
+        """
+        Copy the N-Triples input_file to output_file, followed by an owl:NamedIndividual type and the inferred types
+        of each individual
+        """
+        # individual -> set of the ids of its types, and individual -> set of its asserted type terms
+        types = {}
+        asserted = {}
+
+        with open(input_file) as src, open(output_file, 'w', buffering=WRITE_BUFFER_SIZE) as out:
+            for line in src:
+                out.write(line)
+
+                triple = parse_ntriples_line(line)
+                if not triple:
+                    continue
+                s, p, o = triple
+
+                if p == RDF_TYPE:
+                    if o.startswith(BUILTIN_NAMESPACES) or not is_iri(o):
+                        continue
+                    asserted.setdefault(s, set()).add(o)
+                    cls_id = self._ids.get(o)
+                    individual_types = types.setdefault(s, set())
+                    if cls_id is not None:
+                        individual_types.update(self._ancestors[cls_id])
+                else:
+                    ids = self._domain_types.get(p)
+                    if ids is not None:
+                        types.setdefault(s, set()).update(ids)
+                    ids = self._range_types.get(p)
+                    if ids is not None and is_iri(o):
+                        types.setdefault(o, set()).update(ids)
+
+            for individual in set(types) | set(asserted):
+                out.write("{} {} {} .\n".format(individual, RDF_TYPE, NAMED_INDIVIDUAL))
+
+                individual_asserted = asserted.get(individual, ())
+                for term in self._terms(frozenset(types.get(individual, ())) - self._excluded):
+                    if term not in individual_asserted:
+                        out.write("{} {} {} .\n".format(individual, RDF_TYPE, term))
+
+    def _terms(self, ids):
+        """
+        :param ids: frozenset of class ids
+        :return: list of the class terms, in id order
+        """
+        terms = self._terms_cache.get(ids)
+        if terms is None:
+            terms = self._terms_cache[ids] = [self._classes[cls_id] for cls_id in sorted(ids)]
+        return terms
+
+    def _class_id(self, term):
+        cls_id = self._ids.get(term)
+        if cls_id is None:
+            cls_id = self._ids[term] = len(self._classes)
+            self._classes.append(term)
+            self._parents.append(set())
+        return cls_id
+
+    def _load(self, ontology, loaded):
+        """
+        Load the class hierarchy of the ontology and its imports closure
+        """
+        if ontology in loaded:
+            return
+        loaded.add(ontology)
+
+        root = _parse(ontology)
+
+        for element in root:
+            subject = element.get(RDF_ABOUT)
+            if not subject:
+                continue
+            term = '<{}>'.format(subject)
+
+            for child in element:
+                if child.tag == '{{{}}}imports'.format(OWL):
+                    self._load(child.get(RDF_RESOURCE), loaded)
+                elif child.tag == '{{{}}}subClassOf'.format(RDFS):
+                    cls_id = self._class_id(term)
+                    self._parents[cls_id].update(self._class_id(c) for c in _named_classes(child))
+                elif child.tag == '{{{}}}equivalentClass'.format(OWL):
+                    cls_id = self._class_id(term)
+                    for cls in _named_classes(child):
+                        self._parents[cls_id].add(self._class_id(cls))
+                        # named equivalent classes are subclasses of each other
+                        if child.get(RDF_RESOURCE):
+                            self._parents[self._class_id(cls)].add(cls_id)
+                elif child.tag == '{{{}}}subPropertyOf'.format(RDFS):
+                    self._super_properties.setdefault(term, set()).update(_named_classes(child))
+                elif child.tag == '{{{}}}domain'.format(RDFS):
+                    self._domains.setdefault(term, set()).update(self._class_id(c) for c in _named_classes(child))
+                elif child.tag == '{{{}}}range'.format(RDFS):
+                    self._ranges.setdefault(term, set()).update(self._class_id(c) for c in _named_classes(child))
+
+    def _closures(self):
+        """
+        :return: list of the tuple of the ancestor ids of each class, including the class itself
+        """
+        closures = [None] * len(self._classes)
+        cyclic = False
+
+        for start in range(len(self._classes)):
+            if closures[start] is not None:
+                continue
+
+            # iterative post-order dfs, so deep hierarchies don't hit the recursion limit
+            stack = [(start, iter(self._parents[start]))]
+            # an empty closure marks a class that is still on the stack
+            closures[start] = ()
+            while stack:
+                cls_id, parents = stack[-1]
+                parent = next(parents, None)
+                if parent is None:
+                    stack.pop()
+                    ancestors = {cls_id}
+                    for p in self._parents[cls_id]:
+                        ancestors.update(closures[p])
+                    closures[cls_id] = tuple(sorted(ancestors))
+                elif closures[parent] is None:
+                    closures[parent] = ()
+                    stack.append((parent, iter(self._parents[parent])))
+                elif not closures[parent]:
+                    # the parent is still on the stack, so its closure isn't complete yet
+                    cyclic = True
+
+        # equivalent classes form cycles. Propagate until the closures of the classes in each cycle are complete
+        while cyclic:
+            cyclic = False
+            for cls_id, parents in enumerate(self._parents):
+                ancestors = set(closures[cls_id])
+                for p in parents:
+                    ancestors.update(closures[p])
+                if len(ancestors) != len(closures[cls_id]):
+                    closures[cls_id] = tuple(sorted(ancestors))
+                    cyclic = True
+
+        # owl:Thing is implied for every individual, and is not written by the reasoner
+        thing = self._ids.get('<{}Thing>'.format(OWL))
+        if thing is not None:
+            closures = [tuple(a for a in ancestors if a != thing) for ancestors in closures]
+
+        return closures
+
+    def _property_types(self):
+        """
+        :return: dicts of property term -> tuple of the ids of the types of the subject and object of the property,
+        including the domains and ranges of its super properties
+        """
+        domain_types = {}
+        range_types = {}
+
+        for prop in set(self._domains) | set(self._ranges) | set(self._super_properties):
+            properties = {prop}
+            stack = [prop]
+            while stack:
+                for parent in self._super_properties.get(stack.pop(), ()):
+                    if parent not in properties:
+                        properties.add(parent)
+                        stack.append(parent)
+
+            domain = set()
+            range_ = set()
+            for p in properties:
+                for cls_id in self._domains.get(p, ()):
+                    domain.update(self._ancestors[cls_id])
+                for cls_id in self._ranges.get(p, ()):
+                    range_.update(self._ancestors[cls_id])
+
+            if domain:
+                domain_types[prop] = tuple(sorted(domain))
+            if range_:
+                range_types[prop] = tuple(sorted(range_))
+
+        return domain_types, range_types
+
+    def _excluded_ids(self, excluded_types):
+        """
+        :return: frozenset of the ids of the classes that are not added as inferred types
+        """
+        ids = set()
+        for cls, exclude_class, exclude_superclasses in excluded_types:
+            cls_id = self._ids.get('<{}>'.format(cls))
+            if cls_id is None:
+                logging.warning("excluded type {} is not a class in the ontology".format(cls))
+                continue
+            if exclude_class:
+                ids.add(cls_id)
+            if exclude_superclasses:
+                ids.update(a for a in self._ancestors[cls_id] if a != cls_id)
+        return frozenset(ids)
+
+
+def read_excluded_types(path, resolve_label):
+    """
+    Read the excluded_types.csv file. The ID column contains either a class IRI, or a class label in single quotes
+
+    :param resolve_label: function returning the IRI of the class with the given label
+    :return: list of (class IRI, exclude class, exclude superclasses) tuples
+    """
+    excluded_types = []
+
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            cls = row['ID'].strip()
+            if cls.startswith("'") and cls.endswith("'"):
+                try:
+                    cls = resolve_label(cls[1:-1])
+                except (RuntimeError, KeyError):
+                    logging.warning("ignoring excluded type {}, the label is not in the ontology".format(cls))
+                    continue
+
+            excluded_types.append((cls, _is_yes(row.get('Exclude class')), _is_yes(row.get('Exclude superclasses'))))
+
+    return excluded_types
+
+
+def _is_yes(value):
+    return str(value).strip().upper() in ('Y', 'YES', 'TRUE')
+
+
+def _named_classes(element):
+    """
+    :return: list of the IRIs of the named classes in an rdf:resource attribute, or in a nested class or
+    owl:intersectionOf expression
+    """
+    resource = element.get(RDF_RESOURCE)
+    if resource:
+        return ['<{}>'.format(resource)]
+
+    classes = []
+    for child in element:
+        about = child.get(RDF_ABOUT)
+        if about:
+            classes.append('<{}>'.format(about))
+        for intersection in child.findall('{{{}}}intersectionOf'.format(OWL)):
+            classes.extend('<{}>'.format(m.get(RDF_ABOUT)) for m in intersection if m.get(RDF_ABOUT))
+    return classes
+
+
+def _parse(ontology):
+    if os.path.exists(ontology):
+        return etree.parse(ontology).getroot()
+
+    response = requests.get(ontology)
+    if response.status_code != 200:
+        raise RuntimeError("Failed to fetch the ontology {}: {}".format(ontology, response.status_code))
+    return etree.fromstring(response.content)
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import logging
+import os
+import re
+import shutil
+from collections import OrderedDict
+
+# maximum number of sorted runs read at a time by the k-way merge. More runs are first merged in groups
+MAX_FAN_IN = 128
+
+# maximum number of partition files kept open at a time while merging
+MAX_OPEN_PARTITIONS = 64
+
+# size of the write buffer used for the output files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# maximum length of the partition directory names, which is below the 255 bytes allowed by most filesystems
+MAX_NAME_LENGTH = 200
+
+# characters that are percent-encoded in the partition directory names
+UNSAFE_NAME_RE = re.compile(r'[^\w.-]', re.ASCII)
+
+
+def sort_csv(csv_file, run_file, key_column=None):
+    """
+    Write the rows of a reasoned csv file to run_file, sorted by the key column and then by the whole row, without
+    duplicate rows. The run is written to a temp file that is renamed once complete.
+
+    :param key_column: name of the column to sort by. Defaults to the first column
+    """
+    with _open(csv_file) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise RuntimeError("{} is empty, expected a csv header".format(csv_file))
+        sort_key = _sort_key(header, key_column, csv_file)
+        rows = sorted(reader, key=sort_key)
+
+    tmp_file = run_file + '.tmp'
+    with open(tmp_file, 'w', newline='', buffering=WRITE_BUFFER_SIZE) as out:
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(header)
+        previous = None
+        for row in rows:
+            if row != previous:
+                writer.writerow(row)
+            previous = row
+    os.replace(tmp_file, run_file)
+
+
+class CsvMerger(object):
+    """
+    Merges the sorted runs written by sort_csv into the final dataset in a single streaming pass. Rows are read from
+    all runs at once with a k-way merge, so only one row of each run is held in memory. Rows that are in more than
+    one run, ex: duplicates across chunk boundaries, are written once.
+
+    The rows are written in the order of the key column, split by the partition_column into one directory per value,
+    and into files of about target_bytes each.
+    """
+
+    def __init__(self, output_dir, work_dir, key_column=None, partition_column=None, target_bytes=256 * 1024 * 1024,
+                 compress=False):
+        """
+        :param output_dir: directory to write the merged files to. Files of a previous merge are removed
+        :param work_dir: directory to write the intermediate runs to, if there are more than MAX_FAN_IN runs
+        :param key_column: name of the column the runs are sorted by. Defaults to the first column
+        :param partition_column: optional name of the column to split the output by
+        :param target_bytes: size after which a new file is started for a partition
+        :param compress: if True, the files are gzipped
+        """
+        self.output_dir = output_dir
+        self.work_dir = work_dir
+        self.key_column = key_column
+        self.partition_column = partition_column
+        self.target_bytes = max(target_bytes, 1)
+        self.compress = compress
+
+    def merge(self, run_files):
+        """
+        :param run_files: list of the sorted runs to merge
+        :return: tuple of the list of the files written and the number of rows written
+        """
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(self.output_dir)
+        if not run_files:
+            return [], 0
+
+        intermediate = []
+        level = 0
+        while len(run_files) > MAX_FAN_IN:
+            # merge the runs in groups, so the number of open files stays bounded
+            level += 1
+            os.makedirs(self.work_dir, exist_ok=True)
+            merged = []
+            for i in range(0, len(run_files), MAX_FAN_IN):
+                merged_file = os.path.join(self.work_dir, 'merge_{}_{}.csv'.format(level, len(merged) + 1))
+                self._merge_runs(run_files[i:i + MAX_FAN_IN], _RunWriter(merged_file))
+                merged.append(merged_file)
+            intermediate.extend(merged)
+            run_files = merged
+
+        writer = _PartitionWriter(self.output_dir, self.partition_column, self.target_bytes, self.compress)
+        count = self._merge_runs(run_files, writer)
+
+        for path in intermediate:
+            os.remove(path)
+
+        logging.info("merged {} rows into {} files in {}".format(count, len(writer.files), self.output_dir))
+        return writer.files, count
+
+    def _merge_runs(self, run_files, writer):
+        """
+        :return: number of rows written
+        """
+        files = [open(path, newline='') for path in run_files]
+        count = 0
+
+        try:
+            readers = [csv.reader(f) for f in files]
+            headers = [next(reader, None) for reader in readers]
+            header = headers[0]
+            for path, h in zip(run_files, headers):
+                if h != header:
+                    raise RuntimeError("{} has a different header than {}".format(path, run_files[0]))
+
+            writer.open(header)
+            previous = None
+            for row in heapq.merge(*readers, key=_sort_key(header, self.key_column, run_files[0])):
+                if row != previous:
+                    writer.write(row)
+                    count += 1
+                previous = row
+        finally:
+            for f in files:
+                f.close()
+            writer.close()
+
+        return count
+
+
+class _RunWriter(object):
+    """
+    Writes the rows to a single csv file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def open(self, header):
+        self._file = open(self.path, 'w', newline='', buffering=WRITE_BUFFER_SIZE)
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        self._writer.writerow(header)
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+class _PartitionWriter(object):
+    """
+    Writes the rows to a file for each value of the partition column, starting a new file once a file reaches the
+    target size. At most MAX_OPEN_PARTITIONS files are kept open, the least recently written are closed and reopened
+    in append mode when needed.
+    """
+
+    def __init__(self, output_dir, partition_column, target_bytes, compress):
+        self.output_dir = output_dir
+        self.partition_column = partition_column
+        self.target_bytes = target_bytes
+        self.compress = compress
+        # list of the files written
+        self.files = []
+        self._header = None
+        self._header_line = None
+        self._partition_index = None
+        # partition value -> [path, number of the file, bytes written]
+        self._partitions = {}
+        # path -> open file, in least recently written order
+        self._open = OrderedDict()
+        # formats the rows, so the bytes written to each file are known
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+
+    def open(self, header):
+        self._header = header
+        self._header_line = self._format(header)
+        if self.partition_column:
+            if self.partition_column not in header:
+                raise RuntimeError("partition_column {} is not a column of the reasoned csv files".format(
+                    self.partition_column))
+            self._partition_index = header.index(self.partition_column)
+
+    def write(self, row):
+        value = row[self._partition_index] if self._partition_index is not None else None
+        line = self._format(row)
+
+        partition = self._partitions.get(value)
+        if partition is None:
+            partition = self._new_file(value, 1)
+        elif partition[2] + len(line) > self.target_bytes and partition[2] > len(self._header_line):
+            # a file has at least one row, even if the row is larger than the target size
+            partition = self._new_file(value, partition[1] + 1)
+
+        self._file(partition[0]).write(line)
+        partition[2] += len(line)
+
+    def close(self):
+        for f in self._open.values():
+            f.close()
+        self._open.clear()
+
+    def _new_file(self, value, number):
+        if value is None:
+            directory = self.output_dir
+        else:
+            directory = os.path.join(self.output_dir, '{}={}'.format(self.partition_column, _safe_name(value)))
+            os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, 'part_{:04d}.csv'.format(number) + ('.gz' if self.compress else ''))
+        previous = self._partitions.get(value)
+        if previous and previous[0] in self._open:
+            self._open.pop(previous[0]).close()
+
+        self.files.append(path)
+        self._partitions[value] = [path, number, len(self._header_line)]
+        self._file(path, new=True).write(self._header_line)
+        return self._partitions[value]
+
+    def _file(self, path, new=False):
+        f = self._open.get(path)
+        if f is not None:
+            self._open.move_to_end(path)
+            return f
+
+        mode = 'w' if new else 'a'
+        if self.compress:
+            # gzip files can be appended to, each append is a new member of the file
+            f = gzip.open(path, mode + 't', newline='')
+        else:
+            f = open(path, mode, newline='', buffering=WRITE_BUFFER_SIZE)
+        self._open[path] = f
+
+        if len(self._open) > MAX_OPEN_PARTITIONS:
+            self._open.popitem(last=False)[1].close()
+        return f
+
+    def _format(self, row):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerow(row)
+        return self._buffer.getvalue()
+
+
+def _sort_key(header, key_column, path):
+    if key_column is None:
+        return lambda row: (row[0] if row else '', row)
+    if key_column not in header:
+        raise RuntimeError("key column {} is not a column of {}".format(key_column, path))
+    index = header.index(key_column)
+    return lambda row: (row[index] if len(row) > index else '', row)
+
+
+def _safe_name(value):
+    """
+    :return: the value percent-encoded for a directory name, ex: b/c is b%2Fc. All characters besides ascii letters,
+    digits, _, . and - are encoded, including %, so distinct values never share a directory. Names longer than
+    MAX_NAME_LENGTH are cut, and suffixed with ~ and a hash of the value, as ~ is always encoded otherwise
+    """
+    name = UNSAFE_NAME_RE.sub(lambda m: ''.join('%{:02X}'.format(b) for b in m.group().encode('utf-8')), value)
+    if len(name) > MAX_NAME_LENGTH:
+        digest = hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
+        name = '{}~{}'.format(name[:MAX_NAME_LENGTH - len(digest) - 1], digest)
+    return name
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+import re
+import shutil
+from urllib.parse import urljoin, urlparse
+from xml.sax.saxutils import quoteattr
+
+import requests
+
+from .reasoner import reasoner_settings
+
+CATALOG_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<catalog prefer="public" xmlns="urn:oasis:names:tc:entity:xmlns:xml:catalog">
+    <uri name={} uri={}/>
+</catalog>
+"""
+
+# owl:imports of an ontology in RDF/XML, Turtle or N-Triples, OWL/XML and functional syntax
+IMPORTS_RES = [
+    re.compile(rb'<owl:imports\s+rdf:resource\s*=\s*"([^"]+)"'),
+    re.compile(rb'(?:owl:imports|<http://www\.w3\.org/2002/07/owl#imports>)\s+((?:<[^>]*>[\s,]*)+)'),
+    re.compile(rb'<Import>\s*([^<\s]+)\s*</Import>'),
+    re.compile(rb'\bImport\(\s*<([^>]+)>\s*\)'),
+]
+IRI_RE = re.compile(rb'<([^>]*)>')
+
+
+class OntologyCache(object):
+    """
+    Prepares a local, pre-classified copy of the ontology once, so reasoning on each file doesn't fetch the imports
+    and classify the ontology again.
+
+    The ontology and its imports closure are merged into a single file and classified with robot. The result is
+    cached in a directory keyed by the hash of the content of each ontology in the imports closure and the reasoner
+    settings, so a change to an imported ontology prepares a new copy. The directory also has an xml catalog that
+    maps the ontology IRI to the classified file. The catalog is passed to each robot command, so the
+    owl:imports in the data files resolves to the local file.
+    """
+
+    def __init__(self, cache_dir, robot_path, reasoner_config):
+        """
+        :param cache_dir: directory to cache the prepared ontologies in
+        :param robot_path: path of the robot jar
+        :param reasoner_config: reasoner.conf file. The reasoner settings are part of the cache key
+        """
+        self.cache_dir = cache_dir
+        self.robot_path = robot_path
+        self.reasoner_config = reasoner_config
+
+    def prepare(self, ontology, run_robot):
+        """
+        Prepare the ontology if it isn't cached yet.
+
+        :param ontology: filepath or url of the ontology, as used in the owl:imports of the data files
+        :param run_robot: function that runs robot with the given java args, excluding the heap size, and input file
+        :return: path of the xml catalog for the prepared ontology
+        """
+        closure = self._fetch_closure(ontology)
+        content = closure[0][1]
+        settings = reasoner_settings(self.reasoner_config)
+
+        h = hashlib.sha256()
+        for location, document in closure:
+            h.update(location.encode('utf-8'))
+            h.update(hashlib.sha256(document).digest())
+        h.update(repr(sorted(settings.items())).encode('utf-8'))
+        ontology_dir = os.path.join(self.cache_dir, h.hexdigest())
+        catalog = os.path.join(ontology_dir, 'catalog-v001.xml')
+
+        if os.path.exists(catalog):
+            logging.debug("using the cached ontology {}".format(ontology_dir))
+            return catalog
+
+        logging.info("preparing the ontology {} in {}".format(ontology, ontology_dir))
+
+        # prepare in a temp directory, so an interrupted run doesn't leave a partial cache entry
+        tmp_dir = ontology_dir + '.tmp{}'.format(os.getpid())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        # keep a copy of the ontology that was prepared. robot reads the original, so relative imports resolve
+        source = os.path.join(tmp_dir, 'ontology.owl')
+        with open(source, 'wb') as f:
+            f.write(content)
+        input_args = ['-i', ontology] if os.path.exists(ontology) else ['-I', ontology]
+
+        classified = os.path.join(tmp_dir, 'classified.owl')
+        run_robot(['-jar', self.robot_path, 'merge'] + input_args + ['--collapse-import-closure', 'true',
+                   'reason', '-r', settings['reasoner'], '--axiom-generators', 'SubClass',
+                   '--exclude-tautologies', 'structural', '-o', classified], source)
+
+        if not os.path.exists(classified):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise RuntimeError("Failed to prepare the ontology {}".format(ontology))
+
+        with open(os.path.join(tmp_dir, 'catalog-v001.xml'), 'w') as f:
+            # the classified file is resolved relative to the catalog
+            f.write(CATALOG_TEMPLATE.format(quoteattr(ontology), quoteattr('classified.owl')))
+
+        try:
+            os.rename(tmp_dir, ontology_dir)
+        except OSError:
+            # prepared by another run at the same time
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return catalog
+
+    @classmethod
+    def _fetch_closure(cls, ontology):
+        """
+        Fetch the ontology and the ontologies it imports, recursively. Relative imports are resolved against the
+        location of the importing ontology
+
+        :return: list of (location, content) of each ontology in the closure, starting with the ontology itself
+        """
+        closure = []
+        seen = {ontology}
+        stack = [ontology]
+
+        while stack:
+            location = stack.pop()
+            content = cls._fetch(location)
+            closure.append((location, content))
+
+            imports = [_resolve(location, iri.decode('utf-8')) for iri in _imports(content)]
+            # pushed in reverse, so the imports are fetched in the order they are declared
+            for imported in reversed(imports):
+                if imported not in seen:
+                    seen.add(imported)
+                    stack.append(imported)
+
+        return closure
+
+    @staticmethod
+    def _fetch(ontology):
+        if os.path.exists(ontology):
+            with open(ontology, 'rb') as f:
+                return f.read()
+
+        response = requests.get(ontology)
+        if response.status_code != 200:
+            raise RuntimeError("Unable to fetch the ontology {}: {}".format(ontology, response.status_code))
+        return response.content
+
+
+def _imports(content):
+    """
+    :return: list of the IRIs imported by the ontology content, in the order they are declared
+    """
+    imports = []
+    for pattern in IMPORTS_RES:
+        for m in pattern.finditer(content):
+            value = m.group(1)
+            # the turtle imports can be a list of IRIs
+            iris = IRI_RE.findall(value) if value.startswith(b'<') else [value]
+            imports.extend((m.start(), iri) for iri in iris)
+    return [iri for start, iri in sorted(imports, key=lambda i: i[0])]
+
+
+def _resolve(parent, iri):
+    """
+    :return: location of the imported iri, relative to the location of the importing parent ontology
+    """
+    if iri.startswith('file:'):
+        return urlparse(iri).path
+    if urlparse(iri).scheme:
+        return iri
+    if urlparse(parent).scheme:
+        return urljoin(parent, iri)
+    return os.path.join(os.path.dirname(parent), iri)
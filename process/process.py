@@ -1,21 +1,34 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import asyncio
 import logging
 import os
-import math
+import shutil
 
+import functools
+import itertools
 import multiprocessing
-from itertools import repeat
 
 import numpy
 import pandas as pd
 
-from .rdf2csv import convert_rdf2csv
+from .abox import extract_abox
+from .jvm import JvmExecutor
+from .rdf2csv import compact_prefixes, rdf2csv_args, read_sparql_prefixes
 from .splitter import split_file
 from .utils import  loadClass, clean_dir
+from .bisector import Bisector, merge_files
+from .coalescer import BATCHES_EXTENSION, Coalescer, read_batches, write_batches, write_unit
 from .config import Config
-from .reasoner import run_reasoner
+from .manifest import Manifest
+from .materializer import TypeMaterializer, read_excluded_types
+from .merger import CsvMerger, sort_csv
+from .projector import Projector
+from .ontology import OntologyCache
+from .reader import CsvRange, get_reader
+from .reasoner import check_reasoner_output, reasoner_args, reasoner_settings
+from .scheduler import Stage, StageScheduler
 from .triplifier import Triplifier
 from .validator import Validator
 
@@ -23,6 +36,37 @@ from .validator import Validator
 """process.Process: provides entry point main()."""
 __version__ = "0.1.0"
 
+# size of the write buffer used for the triples files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+
+# the Process used by the tasks run in each worker of the pool, and the hits and misses of the label cache shared by
+# all workers. Set once when the worker starts
+_worker_process = None
+_label_cache_stats = None
+
+
+def _init_worker(process, label_cache_stats=None):
+    global _worker_process, _label_cache_stats
+    _worker_process = process
+    _label_cache_stats = label_cache_stats
+
+
+def _run_task(method, *args):
+    """
+    Call the given method of the worker's Process. Only the method name and args are sent to the worker. The label
+    cache hits and misses of the task are added to the stats shared with the main process
+    """
+    before = _worker_process.config.label_cache_info()
+    try:
+        return getattr(_worker_process, method)(*args)
+    finally:
+        after = _worker_process.config.label_cache_info()
+        if _label_cache_stats is not None and after != before:
+            with _label_cache_stats.get_lock():
+                _label_cache_stats[0] += after['hits'] - before['hits']
+                _label_cache_stats[1] += after['misses'] - before['misses']
 
 
 class Process(object):
@@ -31,108 +75,508 @@ class Process(object):
 
         self.triplifier = Triplifier(config)
         self.validator = Validator(config)
+        self.manifest = Manifest(config.manifest_file, self._fingerprint())
+        self.jvm = None
+        # xml catalog resolving the ontology to the prepared local copy, if the ontology_cache is used
+        self.catalog = None
+        # TypeMaterializer used instead of robot by the native reasoner_engine
+        self.materializer = None
+        # groups the triplified chunks into reasoning units, if reason_batch_triples is set
+        self.coalescer = Coalescer(config.reason_batch_triples) if config.reason_batch_triples else None
+        self._scheduler = None
+        # bisects the files that fail reasoning, and quarantines the failing records
+        self.bisector = Bisector(config.bisect_dir, self.triplifier.schema_triples())
+        # prefixes compacted in the csv files
+        self.csv_prefixes = read_sparql_prefixes(config.reasoned_sparql if config.reasoned_sparql_exists else None)
+        # Projector used instead of the SPARQL query by the native rdf2csv_engine
+        self.projector = Projector(config.entities, config.relations) if config.rdf2csv_engine == 'native' else None
+
+    def __getstate__(self):
+        # the jvm executor only runs in the main process
+        state = self.__dict__.copy()
+        state['jvm'] = None
+        state['_scheduler'] = None
+        return state
 
     def run(self):
-
-        # empty output directories
-        clean_dir(self.config.output_unreasoned_dir)
-        clean_dir(self.config.output_reasoned_dir)
-
-        self._triplify_all()
-        self._reason_all()
-
-        if self.config.reasoned_sparql_exists:
-            clean_dir(self.config.output_reasoned_csv_dir)
-            self._csv2rdf_all()
+        output_dirs = [self.config.output_unreasoned_dir, self.config.output_reasoned_dir]
+        if self.coalescer:
+            output_dirs.append(self.config.output_units_dir)
+        if self._converts_csv():
+            output_dirs.append(self.config.output_reasoned_csv_dir)
+            if self.config.merge_csv:
+                output_dirs.append(self.config.merge_runs_dir)
         else:
             logging.warning("Skipping rdf2csv conversion, no SPARQL query found.")
 
-    def _reason_all(self):
-        num_processes = math.floor(self.config.num_processes / 2)
-        if (num_processes < 1):
-            num_processes = 1
+        if self.config.resume:
+            # keep the outputs of the previous run. The manifest determines which of them are still valid
+            self.manifest.load()
+            for dir in output_dirs:
+                os.makedirs(dir, exist_ok=True)
+        else:
+            # empty output directories
+            for dir in output_dirs:
+                clean_dir(dir)
+
+        if self.config.shared_schema:
+            self._write_schema()
+
+        if self.config.reasoner_engine == 'native':
+            # loaded before the pool is started, so the workers get the precomputed class hierarchy
+            self.materializer = self._load_materializer()
+
+        # a single pool is used for the triplify stage. The workers are initialized once with this Process, so the
+        # config, triplifier and validator are not sent with every task. The robot stages run in the jvm executor,
+        # which starts as many robot processes as fit in the memory_budget. The pending manifest updates are saved when
+        # the run ends, even if it fails, as is the validation report
+        label_cache_stats = multiprocessing.Array('q', 2)
+        with self.manifest, self.validator, \
+                multiprocessing.Pool(processes=self.config.num_processes, initializer=_init_worker,
+                                     initargs=(self, label_cache_stats)) as pool, \
+                JvmExecutor(self.config.memory_budget, self.config.num_processes,
+                            history_file=self.config.jvm_history_file, worker_cmd=self.config.robot_worker,
+                            num_workers=self.config.robot_workers) as self.jvm:
+            if self.config.ontology_cache:
+                self.catalog = OntologyCache(self.config.ontology_cache, self.config.robot,
+                                             self.config.reasoner_config).prepare(
+                    self.config.ontology, functools.partial(self.jvm.run_sync, kind='prepare'))
+
+            scheduler = self._scheduler = StageScheduler(pool, self._stages())
+            self._triplify_all(scheduler)
+            scheduler.join()
+
+            if self.coalescer:
+                # the last unit is only complete once all chunks are triplified
+                self._queue_units(self.coalescer.flush())
+                self._remove_outputs(self.manifest.prune_units(self.coalescer.names))
+                scheduler.join()
+
+            if self._merge_csv():
+                self._merge_csv_runs()
+
+        self.bisector.write_report(self.config.quarantine_report_file)
+        shutil.rmtree(self.config.bisect_dir, ignore_errors=True)
+        self._log_label_cache(label_cache_stats)
+
+    def _log_label_cache(self, label_cache_stats):
+        """
+        Log the label cache hits and misses of the run, summed over the main process and the workers of the pool
+        """
+        info = self.config.label_cache_info()
+        hits = info['hits'] + label_cache_stats[0]
+        misses = info['misses'] + label_cache_stats[1]
+        rate = hits / (hits + misses) if hits + misses else 0
+        logging.info("label cache: {} hits, {} misses, {:.1%} hit rate".format(hits, misses, rate))
+
+    def _stages(self):
+        """
+        The stages of the pipeline. Each triplified chunk is reasoned as soon as it is written, and each reasoned file
+        is converted to csv as soon as reasoning is done
+        """
+        reason_stage = 'reason_query' if self._chain_query() else 'reason'
+
+        if self.coalescer:
+            # the triplified chunks are passed to the coalescer, which queues a coalesce task for each full unit
+            stages = [
+                Stage('triplify', functools.partial(_run_task, '_triplify_indexed_chunk'), self.config.num_processes,
+                      callback=self._coalesce),
+                Stage('coalesce', functools.partial(_run_task, '_write_unit'), self.config.num_processes,
+                      next_stage=reason_stage, callback=functools.partial(self._record_output, 'coalesce')),
+            ]
+        else:
+            stages = [
+                Stage('triplify', functools.partial(_run_task, '_triplify_chunk'), self.config.num_processes,
+                      next_stage=reason_stage, callback=functools.partial(self._record_output, 'triplify')),
+            ]
+
+        if self._chain_query():
+            # the reasoned data is queried by the same robot command
+            stages.append(Stage('reason_query', self._reason_query, self.config.num_processes,
+                                next_stage='sort' if self._merge_csv() else None,
+                                callback=functools.partial(self._record_output, 'reason_query'),
+                                executor=self.jvm))
+            return stages + self._merge_stages()
+
+        if self.config.reasoner_engine == 'native':
+            # the materializer runs in the workers of the pool, as it doesn't need a JVM
+            stages.append(Stage('reason', functools.partial(_run_task, '_materialize'), self.config.num_processes,
+                                next_stage='rdf2csv' if self._converts_csv() else None,
+                                callback=functools.partial(self._record_output, 'reason')))
+        else:
+            stages.append(Stage('reason', self._reason, self.config.num_processes,
+                                next_stage='rdf2csv' if self._converts_csv() else None,
+                                callback=functools.partial(self._record_output, 'reason'), executor=self.jvm))
+
+        if self.config.rdf2csv_engine == 'native':
+            # the projector runs in the workers of the pool, as it doesn't need a JVM
+            stages.append(Stage('rdf2csv', functools.partial(_run_task, '_project'), self.config.num_processes,
+                                next_stage='sort' if self._merge_csv() else None,
+                                callback=functools.partial(self._record_output, 'rdf2csv')))
+        elif self.config.reasoned_sparql_exists:
+            stages.append(Stage('rdf2csv', self._csv2rdf, self.config.num_processes,
+                                next_stage='sort' if self._merge_csv() else None,
+                                callback=functools.partial(self._record_output, 'rdf2csv'), executor=self.jvm))
+
+        return stages + self._merge_stages()
+
+    def _converts_csv(self):
+        return self.config.reasoned_sparql_exists or self.config.rdf2csv_engine == 'native'
+
+    def _merge_csv(self):
+        return self.config.merge_csv and self._converts_csv()
+
+    def _merge_stages(self):
+        """
+        With merge_csv, each csv file is sorted into a run as soon as it is written, so the runs are ready for the
+        final merge once the last csv file is written
+        """
+        if not self._merge_csv():
+            return []
+        return [Stage('sort', functools.partial(_run_task, '_sort_csv'), self.config.num_processes,
+                      callback=functools.partial(self._record_output, 'sort'))]
+
+    def _chain_query(self):
+        return self.config.chain_query and self.config.reasoned_sparql_exists and \
+            self.config.reasoner_engine != 'native' and self.config.rdf2csv_engine != 'native'
+
+    def _fingerprint(self):
+        """
+        hashes of everything besides the input data that the outputs of a chunk depend on
+        """
+        return {
+            'version': __version__,
+            'config': Manifest.hash_path(self.config.config_dir),
+            'reasoner_config': Manifest.hash_path(self.config.reasoner_config),
+            'ontology': Manifest.hash_path(self.config.ontology),
+            'options': {'drop_invalid': bool(self.config.drop_invalid),
+                        'shared_schema': bool(self.config.shared_schema),
+                        'keep_reasoned': bool(self.config.keep_reasoned),
+                        'reasoner_engine': self.config.reasoner_engine,
+                        'rdf2csv_engine': self.config.rdf2csv_engine,
+                        'abox_only': bool(self.config.abox_only),
+                        'compress_csv': bool(self.config.compress_csv),
+                        'reason_batch_triples': self.config.reason_batch_triples},
+        }
+
+    def _output_dir(self, stage):
+        return {
+            'triplify': self.config.output_unreasoned_dir,
+            'coalesce': self.config.output_units_dir,
+            'reason': self.config.output_reasoned_dir,
+            'rdf2csv': self.config.output_reasoned_csv_dir,
+            'reason_query': self.config.output_reasoned_csv_dir,
+            'sort': self.config.merge_runs_dir,
+        }[stage]
+
+    def _record_output(self, stage, result):
+        file = result[0]
+        self.manifest.add_output(file.split('.')[0], stage, os.path.join(self._output_dir(stage), file))
+
+    @staticmethod
+    def _resume_args(stage, previous_output):
+        """
+        :return: args of the task for the given stage, given the output of the previous stage
+        """
+        if stage in ('reason', 'reason_query'):
+            return os.path.basename(previous_output), os.path.dirname(previous_output)
+        return (os.path.basename(previous_output),)
+
+    @staticmethod
+    def _remove_outputs(paths):
+        for path in paths:
+            # triplified files may have a batches index
+            for p in (path, path + BATCHES_EXTENSION):
+                if os.path.exists(p):
+                    os.remove(p)
+
+    async def _csv2rdf(self, file):
+        logging.debug("\trunning rdf2csv on {}".format(file))
+        input_file = os.path.join(self.config.output_reasoned_dir, file)
+        args, output_file = rdf2csv_args(input_file, self.config.output_reasoned_csv_dir, self.config.reasoned_sparql,
+                                         self.config.robot, catalog=self.catalog)
+        stdout = await self.jvm.run(args, input_file, 'query')
+
+        if not os.path.isfile(output_file):
+            raise RuntimeError("Could not find output file from robot for {}".format(input_file))
+
+        logging.info(stdout)
+        output_file = await asyncio.get_event_loop().run_in_executor(None, self._compact_csv, output_file)
+        return (os.path.basename(output_file),)
+
+    def _project(self, file):
+        """
+        Convert the reasoned file to csv with the Projector, instead of running the SPARQL query with robot
+
+        :return: args with the name of the csv file
+        """
+        logging.debug("\tprojecting {} to csv".format(file))
+        output_file = os.path.join(self.config.output_reasoned_csv_dir, file + '.csv')
+        self.projector.project(os.path.join(self.config.output_reasoned_dir, file), output_file)
+        return (os.path.basename(self._compact_csv(output_file)),)
+
+    def _compact_csv(self, csv_file):
+        """
+        :return: path of the compacted csv file
+        """
+        return compact_prefixes(csv_file, self.csv_prefixes, compress=self.config.compress_csv)
+
+    def _sort_csv(self, file):
+        """
+        Sort the rows of a reasoned csv file into a run for the final merge
+
+        :return: args with the name of the run
+        """
+        run_file = file[:-len('.gz')] if file.endswith('.gz') else file
+        sort_csv(os.path.join(self.config.output_reasoned_csv_dir, file),
+                 os.path.join(self.config.merge_runs_dir, run_file))
+        return (run_file,)
+
+    def _merge_csv_runs(self):
+        """
+        Merge the sorted runs of all csv files into the final dataset. The runs are removed afterwards, so they are
+        sorted again from the csv files by a resumed run
+        """
+        run_files = sorted(os.path.join(self.config.merge_runs_dir, f) for f in os.listdir(self.config.merge_runs_dir)
+                           if f.endswith('.csv'))
+        merger = CsvMerger(self.config.output_merged_csv_dir, os.path.join(self.config.merge_runs_dir, 'merge'),
+                           partition_column=self.config.partition_column,
+                           target_bytes=self.config.merge_file_mb * 1024 * 1024, compress=self.config.compress_csv)
+        merger.merge(run_files)
+        clean_dir(self.config.merge_runs_dir)
+
+    def _triplify_all(self, scheduler):
+        # check for incoming data file before triplifying
+        if not os.path.exists(self.config.data_file):
+            raise RuntimeError("cannot find input datafile "+ self.config.data_file)
 
-        for root, dirs, files in os.walk(self.config.output_unreasoned_dir):
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                pool.starmap(self._reason, zip(files, repeat(root)))
+        # with a coalescer, the stages after triplify are run on the reasoning units instead of the chunks
+        stages = ['triplify'] if self.coalescer else list(scheduler.stages)
+        names = set()
 
-    def _csv2rdf(self, file):
-        logging.debug("\trunning rdf2csv on {}".format(file))
-        out_file = os.path.join(self.config.output_reasoned_dir, file.replace('.n3', '.ttl'))
-        convert_rdf2csv(os.path.join(self.config.output_reasoned_dir,file),self.config.output_reasoned_csv_dir,
-                        self.config.reasoned_sparql, self.config.robot)
+        for i, (chunk, input_hash) in enumerate(self._chunks(), 1):
+            name = "data_{}".format(i)
+            names.add(name)
 
-    def _csv2rdf_all(self):
-        num_processes = math.floor(self.config.num_processes / 2)
-        files = []
-        for file in os.listdir(self.config.output_reasoned_dir):
-            if file.endswith(".ttl"):
-                files.append(file)
+            outputs = self.manifest.completed_stages(name, input_hash) if self.config.resume else {}
+            done = list(itertools.takewhile(lambda stage: stage in outputs, stages))
 
-        if (num_processes < 1):
-            num_processes = 1
+            if not done:
+                self._remove_outputs(self.manifest.start_chunk(name, input_hash))
+                scheduler.submit('triplify', chunk, i)
+                continue
 
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            pool.starmap(self._csv2rdf, zip(files))
+            # the chunk was validated by a previous run, but its unique values are needed to validate the other chunks
+            self.validator.register_unique(self._load(chunk, usecols=self.validator.unique_columns()))
 
-    def _triplify_all(self):
-        # check for incoming data file before triplifying
-        if not os.path.exists(self.config.data_file):
-            raise RuntimeError("cannot find input datafile "+ self.config.data_file)
-        
-        num_processes = self.config.num_processes
-        data = pd.read_csv(self.config.data_file, header=0, skipinitialspace=True,
-                           chunksize=self.config.chunk_size * num_processes)
+            if self.coalescer:
+                logging.debug("\treusing the triplified {}".format(name))
+                self._coalesce((i, (os.path.basename(outputs['triplify']),)), record=False)
+            elif len(done) == len(stages):
+                logging.debug("\tskipping {}, the outputs are up to date".format(name))
+            else:
+                logging.debug("\tresuming {} at the {} stage".format(name, stages[len(done)]))
+                scheduler.submit(stages[len(done)], *self._resume_args(stages[len(done)], outputs[done[-1]]))
 
-        i = 1
-        for data_frame in data:
-            logging.debug("\tvalidating {} records".format(len(data_frame)))
+        # remove the outputs of chunks that are no longer in the input, ex: the data_file is shorter
+        self._remove_outputs(self.manifest.prune(names))
 
-            # parallelize the process
-            # https://stackoverflow.com/questions/40357434/pandas-df-iterrow-parallelization
-            chunk_size = self.config.chunk_size
+    def _coalesce(self, result, record=True):
+        """
+        Add a triplified chunk to the coalescer, and queue the reasoning units that are full
 
-            # this solution was reworked from the above link.
-            # will work even if the length of the dataframe is not evenly divisible by num_processes
-            #chunks = [data_frame.ix[data_frame.index[i:i + chunk_size]] for i in
-            #          range(0, data_frame.shape[0], chunk_size)]
-            #chunks = [data_frame.ix[data_frame.index[i:i + chunk_size]] for i in range(0, data_frame.shape[0], chunk_size)]
+        :param result: tuple of the chunk index and the result of _triplify_chunk
+        """
+        i, triplified = result
+        if not triplified:
+            self._queue_units(self.coalescer.add(i, None, []))
+            return
+
+        if record:
+            self._record_output('triplify', triplified)
+
+        file = triplified[0]
+        batches = read_batches(os.path.join(self.config.output_unreasoned_dir, file))
+        self._queue_units(self.coalescer.add(i, file.split('.')[0], batches))
 
-            chunks = [data_frame.loc[data_frame.index[i:i + chunk_size]] for i in range(0, data_frame.shape[0], chunk_size)]
+    def _queue_units(self, units):
+        """
+        Queue the first stage of each unit that doesn't have up to date outputs from a previous run
+        """
+        stages = list(self._scheduler.stages)[1:]
 
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                pool.starmap(self._triplify_chunk, zip(chunks, [n for n in range(i, i + len(chunks) + 1)]))
+        for name, parts in units:
+            outputs = self.manifest.completed_unit_stages(name, parts) if self.config.resume else {}
+            done = list(itertools.takewhile(lambda stage: stage in outputs, stages))
 
-            i += len(chunks)
+            if not done:
+                self._remove_outputs(self.manifest.start_unit(name, parts))
+                self._scheduler.queue('coalesce', name, parts)
+            elif len(done) == len(stages):
+                logging.debug("\tskipping {}, the outputs are up to date".format(name))
+            else:
+                logging.debug("\tresuming {} at the {} stage".format(name, stages[len(done)]))
+                self._scheduler.queue(stages[len(done)], *self._resume_args(stages[len(done)], outputs[done[-1]]))
+
+    def _write_unit(self, name, parts):
+        """
+        Write the triples of the reasoning unit to a file
+
+        :return: args for reasoning the unit file
+        """
+        unit_file = os.path.join(self.config.output_units_dir, name + '.ttl')
+        # the schema triples are in every chunk file, but only the batches of instance triples are copied
+        trailer = None if self.config.shared_schema else self.triplifier.schema_triples()
+        write_unit(unit_file, parts, self.config.output_unreasoned_dir, trailer)
+        return os.path.basename(unit_file), self.config.output_units_dir
+
+    def _chunks(self):
+        """
+        :return: generator of (chunk, input_hash) from the reader for the data_file. The chunks are either DataFrames
+        or CsvRanges that are parsed by the workers
+        """
+        return get_reader(self.config).chunks()
+
+    def _load(self, chunk, usecols=None):
+        """
+        Parse the chunk if it is a CsvRange, reading only the planned columns, or the planned columns in usecols
+        """
+        if isinstance(chunk, CsvRange):
+            plan = self.config.get_load_plan(chunk.columns)
+            if usecols is not None:
+                plan['usecols'] = [c for c in plan['usecols'] if c in usecols]
+                plan['dtype'] = {c: t for c, t in plan['dtype'].items() if c in usecols}
+            return chunk.read(engine=self.config.csv_engine, **plan)
+        return chunk
+
+    def _write_schema(self):
+        with open(self.config.schema_file, 'w') as f:
+            for t in self.triplifier.schema_triples():
+                f.write("{} .\n".format(t))
 
     def _triplify_chunk(self, chunk, i):
+        """
+        :return: args for reasoning the triples file, or None if the chunk failed validation
+        """
         triples_file = os.path.join(self.config.output_unreasoned_dir, "data_{}.ttl".format(i))
-        self._triplify(chunk, triples_file)
+        written = self._triplify(self._load(chunk), triples_file)
+
+        if written:
+            return os.path.basename(triples_file), self.config.output_unreasoned_dir
+
+    def _triplify_indexed_chunk(self, chunk, i):
+        """
+        :return: tuple of the chunk index and the result of _triplify_chunk, so the coalescer is also told about the
+        chunks that failed validation
+        """
+        return i, self._triplify_chunk(chunk, i)
 
     def _triplify(self, data, triples_file):
+        logging.debug("\tvalidating {} records".format(len(data)))
         valid = self.validator.validate(data)
 
         if not valid:
-            invalid_data_path = os.path.realpath(self.config.invalid_data_file)
-            if self.config.log_file:
-                log_path = os.path.realpath(self.config.log_file)
-                print("Validation Failed! The logs are located {} and {}".format(invalid_data_path, log_path))
-            else:
-                print("Validation Failed! The logs are located {}".format(invalid_data_path))
-            return
+            # the invalid rows are written to the invalid_data_file by the validator when the run ends
+            logging.debug("\tvalidation failed, skipping {} records".format(len(data)))
+            return False
 
         logging.debug("\ttriplifying {} records".format(len(data)))
 
-        triples = self.triplifier.triplify(data)
+        # end offset and number of triples of each batch, used to split the file into reasoning units
+        batches = []
 
-        with open(triples_file, 'w') as f:
-            for t in triples:
-                f.write("{} .\n".format(t))
+        with open(triples_file, 'w', buffering=WRITE_BUFFER_SIZE) as f:
+            for triples in self.triplifier.triplify_batches(data, self.config.batch_size,
+                                                            include_schema=not self.config.shared_schema):
+                if triples:
+                    f.write(" .\n".join(triples))
+                    f.write(" .\n")
+                    if self.coalescer:
+                        batches.append((f.tell(), len(triples)))
+
+        if self.coalescer:
+            # the last batch is the schema, which is written once at the end of each unit instead
+            write_batches(triples_file, batches if self.config.shared_schema else batches[:-1])
 
-    def _reason(self, file, root):
+        return True
+
+    async def _reason(self, file, root):
         logging.debug("\trunning reasoner on {}".format(file))
+        input_file = os.path.join(root, file)
+        out_file = os.path.join(self.config.output_reasoned_dir, file.replace('.n3', '.ttl'))
+        schema_file = self.config.schema_file if self.config.shared_schema else None
+
+        async def reason(input_file, out_file):
+            args = reasoner_args(input_file, out_file, self.config.reasoner_config, self.config.robot,
+                                 schema_file=schema_file, catalog=self.catalog)
+            await self.jvm.run(args, input_file, 'reason', timeout=self.config.reason_timeout)
+
+        # a failed file is bisected, so only the failing triples are dropped and the other files are still reasoned
+        await self.bisector.run(reason, input_file, out_file, merge_files)
+        check_reasoner_output(input_file, out_file, '', '')
+
+        if os.path.exists(out_file):
+            if self.config.abox_only:
+                await asyncio.get_event_loop().run_in_executor(None, self._extract_abox, out_file)
+            return (os.path.basename(out_file),)
+
+    def _extract_abox(self, reasoned_file):
+        extract_abox(reasoned_file, [entity['identifier_root'] for entity in self.config.entities])
+
+    def _load_materializer(self):
+        settings = reasoner_settings(self.config.reasoner_config)
+        if settings['axiom_generators'] not in (['ClassAssertion'], ['InverseObjectProperties', 'ClassAssertion']):
+            logging.warning("the native reasoner_engine only infers types. Use the robot reasoner_engine for the other "
+                            "inferences in {}".format(self.config.reasoner_config))
+
+        excluded_types = None
+        if settings['excluded_types_file'] and os.path.exists(settings['excluded_types_file']):
+            excluded_types = read_excluded_types(settings['excluded_types_file'], self.config.resolve_label)
+
+        materializer = TypeMaterializer(self.config.ontology, excluded_types)
+        logging.debug("loaded {} classes for the native reasoner".format(materializer.num_classes))
+        return materializer
+
+    def _materialize(self, file, root):
+        """
+        Infer the types of the individuals in the triples file with the TypeMaterializer, instead of running robot
+
+        :return: args for converting the reasoned file to csv
+        """
+        logging.debug("\tmaterializing types in {}".format(file))
+        input_file = os.path.join(root, file)
         out_file = os.path.join(self.config.output_reasoned_dir, file.replace('.n3', '.ttl'))
-        run_reasoner(os.path.join(root, file), out_file, self.config.reasoner_config, self.config.robot)
+
+        # the shared schema only declares the classes and properties, so it isn't needed to infer the types
+        self.materializer.materialize(input_file, out_file)
+        if self.config.abox_only:
+            self._extract_abox(out_file)
+
+        logging.info('reasoned output at ' + out_file)
+        return (os.path.basename(out_file),)
+
+    async def _reason_query(self, file, root):
+        logging.debug("\trunning reasoner and query on {}".format(file))
+        input_file = os.path.join(root, file)
+        reasoned_file = file.replace('.n3', '.ttl')
+        csv_file = os.path.join(self.config.output_reasoned_csv_dir, reasoned_file + '.csv')
+        # the reasoned data is only written if it is kept for debugging
+        out_file = os.path.join(self.config.output_reasoned_dir, reasoned_file) if self.config.keep_reasoned else None
+        schema_file = self.config.schema_file if self.config.shared_schema else None
+
+        async def reason_query(part_file, part_csv_file):
+            # the reasoned data is only kept for the whole file, not for the halves of a bisected file
+            args = reasoner_args(part_file, out_file if part_file == input_file else None,
+                                 self.config.reasoner_config, self.config.robot, schema_file=schema_file,
+                                 query=(self.config.reasoned_sparql, part_csv_file), catalog=self.catalog)
+            await self.jvm.run(args, part_file, 'reason_query', timeout=self.config.reason_timeout)
+
+        await self.bisector.run(reason_query, input_file, csv_file, functools.partial(merge_files, header=True))
+        check_reasoner_output(input_file, csv_file, '', '')
+
+        if os.path.exists(csv_file):
+            csv_file = await asyncio.get_event_loop().run_in_executor(None, self._compact_csv, csv_file)
+            return (os.path.basename(csv_file),)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -143,7 +587,8 @@ def main():
 
     parser.add_argument(
         "data_file",
-        help="Specify the data file to load."
+        help="Specify the data file to load. Either a csv file, which may be compressed (.gz, .bz2, .xz, .zip, .zst), "
+             "or a Parquet (.parquet, .pq) or Arrow (.arrow, .feather, .ipc) file"
     )
     parser.add_argument(
         "output_dir",
@@ -170,6 +615,96 @@ def main():
         help="log all output to a log.txt file in the output_dir. default is to log output to the console",
         action="store_true"
     )
+    parser.add_argument(
+        "--shared_schema",
+        help="write the entity, relation and ontology import triples once to schema.ttl in the output_dir instead of "
+             "in every data file. The schema is merged with each data file when reasoning",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--resume",
+        help="reuse the outputs of a previous run in the output_dir. Only the chunks whose input rows, configuration, "
+             "ontology or pipeline version changed, or whose outputs are missing, are processed again",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--parallel_read",
+        help="split the data_file into byte ranges of about chunk_size records and parse each range in the worker "
+             "processes, instead of parsing the whole file in the main process",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--csv_engine",
+        help="pandas csv parser engine used to read the data_file ranges with parallel_read. The pyarrow engine is "
+             "faster, but requires pyarrow to be installed",
+        choices=['c', 'python', 'pyarrow'],
+        default='c'
+    )
+    parser.add_argument(
+        "--chain_query",
+        help="run the SPARQL query in the same robot command as the reasoner, so the reasoned data is not written "
+             "to output_reasoned and parsed again",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--keep_reasoned",
+        help="with --chain_query, also write the reasoned data to output_reasoned for debugging",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--abox_only",
+        help="after reasoning, only keep the triples about the data individuals, including their types, in the "
+             "reasoned files, and drop the ontology axioms the reasoner carried along. Reduces the size of "
+             "output_reasoned and the time to query it. Has no effect with --chain_query",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--compress_csv",
+        help="gzip the reasoned csv files, which are written to output_reasoned_csv with a .csv.gz extension",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--merge_csv",
+        help="merge the reasoned csv files into output_reasoned_csv_merged, ordered by the first column and without "
+             "duplicate rows. Each csv file is sorted as soon as it is written, and the sorted files are merged in "
+             "one streaming pass at the end",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--partition_column",
+        help="with --merge_csv, split the merged rows into a directory for each value of this column. The values "
+             "are percent-encoded in the directory names"
+    )
+    parser.add_argument(
+        "--merge_file_mb",
+        help="with --merge_csv, size in MB after which a new merged file is started. Default is 256",
+        type=int
+    )
+    parser.add_argument(
+        "--invalid_sample_size",
+        help="maximum number of invalid records to write to invalid_data.csv for each rule and column in a chunk. "
+             "All violations are counted in validation_report.csv",
+        type=int,
+        default=100
+    )
+    parser.add_argument(
+        "--reasoner_engine",
+        help="engine used to reason on the triplified data. robot runs the reasoner in the reasoner_config. native "
+             "infers the types of the individuals from the subclass hierarchy of the ontology in python, without "
+             "starting java, and honors the excluded_types_file of the reasoner_config. Only the types inferences "
+             "are supported by the native engine",
+        choices=['robot', 'native'],
+        default='robot'
+    )
+    parser.add_argument(
+        "--rdf2csv_engine",
+        help="engine used to convert the reasoned data to csv. robot runs the fetch_reasoned.sparql query. native "
+             "writes a row for each individual of the entity with an rdf:type column in mapping.csv, joined to the "
+             "other entities along relations.csv, in python without starting java. Each mapped column is a column "
+             "of the csv, and the rdf:type columns are the types of the individual separated by |",
+        choices=['robot', 'native'],
+        default='robot'
+    )
     parser.add_argument(
         "--reasoner_config",
         help="optionally specify the reasoner configuration file. Default is to look for reasoner.config in the configuration directory"
@@ -188,6 +723,50 @@ def main():
         type=int,
         default=10000
     )
+    parser.add_argument(
+        "--batch_size",
+        help="number of records to triplify at a time within a chunk. Limits the memory used by each process",
+        type=int,
+        default=1000
+    )
+    parser.add_argument(
+        "--reason_batch_triples",
+        help="coalesce the triplified chunks into reasoning units of about this many triples, so the size of each "
+             "reasoner run doesn't depend on the chunk_size. Small chunks are merged and large chunks are split "
+             "between their batches. The reasoned outputs are named after the units",
+        type=int
+    )
+    parser.add_argument(
+        "--ontology_cache",
+        help="directory to cache a local, pre-classified copy of the ontology and its imports in. The copy is "
+             "prepared once for each version of the ontology and its imports, and used when reasoning instead of the "
+             "imports",
+    )
+    parser.add_argument(
+        "--reason_timeout",
+        help="wall-clock limit in seconds for each reasoner run. A file that fails or times out is split in half and "
+             "reasoned again, until the failing records are isolated. Their triples are written to "
+             "quarantined_triples.csv in the output_dir",
+        type=int
+    )
+    parser.add_argument(
+        "--memory_budget",
+        help="maximum total heap in MB of the robot processes run at the same time. The heap of each process is "
+             "estimated from the size of its input. Defaults to 75%% of the memory of the machine",
+        type=int
+    )
+    parser.add_argument(
+        "--robot_worker",
+        help="command line that starts a long running robot worker. If given, robot jobs are sent to these workers "
+             "as json lines instead of starting java for every file. The worker in worker/RobotWorker.java keeps the "
+             "imported ontology loaded between jobs, ex: 'java -Xmx8g -cp lib/robot.jar:lib RobotWorker'. See "
+             "process/worker.py for the protocol"
+    )
+    parser.add_argument(
+        "--robot_workers",
+        help="number of robot workers to run with --robot_worker. Defaults to half of num_processes",
+        type=int
+    )
     parser.add_argument(
         "--num_processes",
         help="number of process to use for parallel processing of data. Defaults to cpu_count of the machine",
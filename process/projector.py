@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import csv
+import itertools
+import logging
+import os
+import re
+
+from .rdfio import OWL, RDF_TYPE, read_turtle
+
+NAMED_INDIVIDUAL = '<{}NamedIndividual>'.format(OWL)
+
+# lexical value and optional datatype or language of an N-Triples literal
+LITERAL_RE = re.compile(r'^"((?:[^"\\]|\\.)*)"(?:\^\^<[^>]*>|@[\w-]+)?$')
+LITERAL_ESCAPES = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+# size of the write buffer used for the output files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class Projector(object):
+    """
+    Converts reasoned triples to a csv file without running a SPARQL query, using the entity/relation layout of
+    entity.csv, mapping.csv and relations.csv.
+
+    The triples of a file are streamed into an index of the data individuals, grouped by subject, along with a
+    reverse index of the relation predicates. A row is written for each individual of the root entity. The other
+    entities are joined to it along the relations, and all relations between the joined individuals must hold, like
+    the triple patterns of a query. Each mapped column is the value of its property on the individual of its entity.
+    Columns mapped to rdf:type are the distinct types of the individual, besides owl:NamedIndividual, joined by the
+    separator, like a group_concat.
+    """
+
+    def __init__(self, entities, relations, root_entity=None, separator='|'):
+        """
+        :param entities: list of entity dicts, with the alias, identifier_root and columns, a list of
+        (column, property IRI) tuples
+        :param relations: list of relation dicts, with the subject_entity_alias, predicate and object_entity_alias
+        :param root_entity: alias of the entity to write a row for. Defaults to the entity with an rdf:type column,
+        or the first entity
+        :param separator: separator of the values of the rdf:type columns
+        """
+        self.separator = separator
+        # entity alias -> identifier_root, sorted by longest root first so nested roots match the right entity
+        self._roots = sorted(((e['alias'], '<' + e['identifier_root']) for e in entities),
+                             key=lambda r: len(r[1]), reverse=True)
+        self._relations = [(r['subject_entity_alias'], '<{}>'.format(r['predicate']), r['object_entity_alias'])
+                           for r in relations]
+        self._relation_predicates = {p for s, p, o in self._relations}
+
+        # list of (column name, entity alias, property term)
+        self.columns = []
+        names = set()
+        for entity in entities:
+            for column, uri in entity['columns']:
+                name = column if column not in names else '{}.{}'.format(entity['alias'], column)
+                names.add(name)
+                self.columns.append((name, entity['alias'], '<{}>'.format(uri)))
+
+        if root_entity is None:
+            typed = [alias for name, alias, p in self.columns if p == RDF_TYPE]
+            root_entity = typed[0] if typed else entities[0]['alias']
+        if root_entity not in {alias for alias, root in self._roots}:
+            raise RuntimeError("root entity {} is not in entity.csv".format(root_entity))
+        self.root_entity = root_entity
+
+    @property
+    def header(self):
+        return [name for name, alias, p in self.columns]
+
+    def project(self, input_file, output_file):
+        """
+        Write a csv row for each individual of the root entity in the N-Triples or Turtle input_file
+
+        :return: number of rows written
+        """
+        index, reverse, entities = self._index(input_file)
+        count = 0
+
+        tmp_file = output_file + '.tmp'
+        with open(tmp_file, 'w', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(self.header)
+            for individual in entities.get(self.root_entity, []):
+                for row in self._rows(individual, index, reverse):
+                    writer.writerow(row)
+                    count += 1
+        os.replace(tmp_file, output_file)
+
+        logging.debug("projected {} rows from {}".format(count, input_file))
+        return count
+
+    def _index(self, input_file):
+        """
+        :return: tuple of the dict of subject -> predicate -> list of objects, the dict of
+        (relation predicate, object) -> list of subjects, and the dict of entity alias -> list of its individuals in
+        the order they are first seen
+        """
+        index = {}
+        reverse = {}
+        entities = {}
+
+        for s, p, o in read_turtle(input_file):
+            properties = index.get(s)
+            if properties is None:
+                alias = self._entity(s)
+                if alias is None:
+                    # not a data individual, ex: an ontology axiom
+                    continue
+                properties = index[s] = {}
+                entities.setdefault(alias, []).append(s)
+
+            values = properties.setdefault(p, [])
+            if o not in values:
+                values.append(o)
+            if p in self._relation_predicates:
+                reverse.setdefault((p, o), []).append(s)
+
+        return index, reverse, entities
+
+    def _entity(self, term):
+        for alias, root in self._roots:
+            if term.startswith(root):
+                return alias
+
+    def _rows(self, root, index, reverse):
+        """
+        :return: generator of the rows of the root individual, one for each combination of joined individuals and
+        property values
+        """
+        for binding in self._join(root, index, reverse):
+            values = []
+            for name, alias, p in self.columns:
+                individual = binding.get(alias)
+                objects = index[individual].get(p, []) if individual in index else []
+                if p == RDF_TYPE:
+                    types = sorted(_value(o) for o in objects if o != NAMED_INDIVIDUAL)
+                    values.append([self.separator.join(types)])
+                else:
+                    values.append([_value(o) for o in objects] or [''])
+
+            for row in itertools.product(*values):
+                yield list(row)
+
+    def _join(self, root, index, reverse):
+        """
+        :return: list of dicts of entity alias -> individual, for each combination of individuals related to the root
+        individual along the relations
+        """
+        bindings = [{self.root_entity: root}]
+        remaining = list(self._relations)
+
+        while remaining and bindings:
+            bound = bindings[0]
+            relation = next((r for r in remaining if r[0] in bound or r[2] in bound), None)
+            if relation is None:
+                # the remaining entities aren't related to the root entity
+                break
+            remaining.remove(relation)
+            subject_alias, p, object_alias = relation
+
+            joined = []
+            for binding in bindings:
+                s = binding.get(subject_alias)
+                o = binding.get(object_alias)
+                if s is not None and o is not None:
+                    if o in index.get(s, {}).get(p, []):
+                        joined.append(binding)
+                elif s is not None:
+                    for obj in index.get(s, {}).get(p, []):
+                        if self._entity(obj) == object_alias:
+                            joined.append(dict(binding, **{object_alias: obj}))
+                else:
+                    for subj in reverse.get((p, o), []):
+                        if self._entity(subj) == subject_alias:
+                            joined.append(dict(binding, **{subject_alias: subj}))
+            bindings = joined
+
+        return bindings
+
+
+def _value(term):
+    """
+    :return: the value of a term as written by a SPARQL csv result, ex: the lexical value of a literal or the IRI
+    """
+    if term.startswith('<'):
+        return term[1:-1]
+    m = LITERAL_RE.match(term)
+    if m:
+        return re.sub(r'\\(.)', lambda e: LITERAL_ESCAPES.get(e.group(1), e.group(0)), m.group(1))
+    return term
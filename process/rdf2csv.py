@@ -1,16 +1,121 @@
 # -*- coding: utf-8 -*-
+import functools
+import gzip
 import logging
 import subprocess
-import fileinput
 import os
 import re
 
+# heap used when running the query directly with convert_rdf2csv
+DEFAULT_HEAP_MB = 6048
 
-def convert_rdf2csv(input_file, output_dir, sparql_file, robot_path):
-    logging.debug("converting reasoned data to csv for file {}".format(input_file))
+# prefixes compacted in the csv files, in addition to the prefixes declared in the SPARQL query
+DEFAULT_PREFIXES = {'obo': 'http://purl.obolibrary.org/obo/'}
+
+SPARQL_PREFIX_RE = re.compile(r'^\s*prefix\s+([A-Za-z][\w.-]*)?:\s*<([^>]*)>', re.IGNORECASE | re.MULTILINE)
+
+# size of the write buffer used for the compacted files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def rdf2csv_args(input_file, output_dir, sparql_file, robot_path, catalog=None):
+    """
+    Build the java args, excluding the heap size, to run the SPARQL query with robot
+
+    :param catalog: optional xml catalog file used to resolve the imported ontology to a local file
+    :return: tuple of the args and the path of the csv file written by robot
+    """
     input_filename = os.path.basename(input_file)
     output_pathfile = os.path.join(output_dir,input_filename+'.csv')
-    cmd = ['java', '-Xmx6048m', '-jar', robot_path, 'query','--input', input_file, '--query', sparql_file , output_pathfile] 
+    catalog_args = ['--catalog', catalog] if catalog else []
+    return ['-jar', robot_path, 'query'] + catalog_args + ['--input', input_file, '--query', sparql_file , output_pathfile], output_pathfile
+
+
+def read_sparql_prefixes(sparql_file):
+    """
+    :return: dict of prefix -> namespace of the DEFAULT_PREFIXES and the prefixes declared in the SPARQL file
+    """
+    prefixes = dict(DEFAULT_PREFIXES)
+    if sparql_file and os.path.exists(sparql_file):
+        with open(sparql_file) as f:
+            for prefix, namespace in SPARQL_PREFIX_RE.findall(f.read()):
+                # the default prefix would leave a bare ":" in the values
+                if prefix:
+                    prefixes[prefix] = namespace
+    return prefixes
+
+
+def compact_prefixes(output_pathfile, prefixes=None, compress=False):
+    """
+    Replace the namespaces in a csv file with their prefix, ex: obo: for all obo URLs, in a single streaming pass.
+    This cuts the output file sizes by 50% but we will need to remember to replace the prefix in any downstream apps.
+    The compacted file is written to a temp file, which is renamed over the file once complete. Can be run on any
+    csv file, ex: the combined outputs. Nothing is written to sys.stdout, so files can be compacted on several
+    threads at once, ex: in the executor of the rdf2csv stage.
+
+    :param prefixes: optional dict of prefix -> namespace. Defaults to DEFAULT_PREFIXES. Namespaces are matched with
+    either the http or https scheme
+    :param compress: if True, the compacted file is gzipped to output_pathfile + '.gz', and output_pathfile is removed
+    :return: path of the compacted file
+    """
+    pattern, replace = _prefix_matcher(tuple(sorted((prefixes or DEFAULT_PREFIXES).items())))
+
+    compacted_file = output_pathfile + '.gz' if compress else output_pathfile
+    tmp_file = compacted_file + '.tmp'
+    out = gzip.open(tmp_file, 'wt') if compress else open(tmp_file, 'w', buffering=WRITE_BUFFER_SIZE)
+    with open(output_pathfile) as f, out:
+        for line in f:
+            out.write(pattern.sub(replace, line) if pattern else line)
+    os.replace(tmp_file, compacted_file)
+
+    if compress:
+        os.remove(output_pathfile)
+
+    # provide docker friendly output (this way user looks for file in relative path home environment instead of docker mount)
+    cleanfilename = re.sub('^%s' % '/process/', '', compacted_file)
+    logging.info('reasoned_csv output at ' + cleanfilename)
+    return compacted_file
+
+
+@functools.lru_cache(maxsize=None)
+def _prefix_matcher(prefixes):
+    """
+    :param prefixes: tuple of (prefix, namespace)
+    :return: tuple of the compiled pattern matching any of the namespaces, or None if there are none, and the
+    function returning the prefix of a match
+    """
+    # namespace, with an http scheme -> compacted prefix
+    namespaces = {}
+    for prefix, namespace in prefixes:
+        if namespace.startswith('https://'):
+            namespace = 'http://' + namespace[len('https://'):]
+        if namespace and namespace != prefix + ':':
+            namespaces[namespace] = prefix + ':'
+
+    if not namespaces:
+        return None, None
+
+    # the longest namespaces first, so a namespace nested in another is matched as a whole
+    alternatives = []
+    for namespace in sorted(namespaces, key=len, reverse=True):
+        if namespace.startswith('http://'):
+            alternatives.append('https?://' + re.escape(namespace[len('http://'):]))
+        else:
+            alternatives.append(re.escape(namespace))
+
+    def replace(m):
+        iri = m.group()
+        if iri.startswith('https://'):
+            iri = 'http://' + iri[len('https://'):]
+        return namespaces[iri]
+
+    return re.compile('|'.join(alternatives)), replace
+
+
+def convert_rdf2csv(input_file, output_dir, sparql_file, robot_path, heap_mb=DEFAULT_HEAP_MB):
+    logging.debug("converting reasoned data to csv for file {}".format(input_file))
+    args, output_pathfile = rdf2csv_args(input_file, output_dir, sparql_file, robot_path)
+    cmd = ['java', '-Xmx{}m'.format(heap_mb)] + args
 
     logging.debug("running SPARQL query with the following robot command: ")
     logging.debug(subprocess.list2cmdline(cmd))
@@ -25,22 +130,6 @@ def convert_rdf2csv(input_file, output_dir, sparql_file, robot_path):
         #logging.info("Error message: " + stderr)
         raise RuntimeError("Could not find output file from robot.  You can isolate the process and debug using: " +subprocess.list2cmdline(cmd))
 
-
-    # write obo: prefix to all obo URLs using inplace editing.
-    # This cuts the output file sizes by 50% but we will need 
-    # to remember to replace the prefix in any downstream apps
-    with fileinput.FileInput(output_pathfile, inplace=True) as file:
-        for line in file:
-            print(line.replace('http://purl.obolibrary.org/obo/', 'obo:'), end="");
-    with fileinput.FileInput(output_pathfile, inplace=True) as file:
-        for line in file:
-            print(line.replace('https://purl.obolibrary.org/obo/', 'obo:'), end="");
-
-    fileinput.close()
-
-
     logging.info(stdout)
 
-    # provide docker friendly output (this way user looks for file in relative path home environment instead of docker mount)
-    cleanfilename = re.sub('^%s' % '/process/', '', output_pathfile)
-    logging.info('reasoned_csv output at ' + cleanfilename)
+    compact_prefixes(output_pathfile, read_sparql_prefixes(sparql_file))
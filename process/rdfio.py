@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal readers for the RDF files written by the triplifier (N-Triples lines) and by robot (Turtle). Terms are
+returned in N-Triples syntax, ex: <http://example.com/a>, "1"^^<http://www.w3.org/2001/XMLSchema#integer> or _:b1,
+so triples from either format can be compared and written as N-Triples.
+"""
+import re
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDFS = 'http://www.w3.org/2000/01/rdf-schema#'
+OWL = 'http://www.w3.org/2002/07/owl#'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+RDF_TYPE = '<{}type>'.format(RDF)
+
+# subject, predicate and object of an N-Triples line. The object is everything up to the final " ."
+NTRIPLE_RE = re.compile(r'^\s*(<[^>]*>|_:\S+)\s+(<[^>]*>)\s+(.*?)\s*\.\s*$')
+
+TURTLE_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+|\#[^\n]*)
+  | (?P<iri><[^>]*>)
+  | (?P<literal>"""(?:[^"\\]|\\.|"(?!""))*"""|'\'\'(?:[^'\\]|\\.|'(?!''))*'\'\'|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<datatype>\^\^)
+  | (?P<lang>@[a-zA-Z]+(?:-[a-zA-Z0-9]+)*)
+  | (?P<bnode>_:[A-Za-z0-9_][\w.-]*)
+  | (?P<number>[+-]?(?:\d+\.\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+|\d+))
+  | (?P<punct>[;,.\[\]()])
+  | (?P<name>(?:[A-Za-z][\w-]*)?:(?:[\w:%-]|\.(?=[\w:%-]))*|[A-Za-z][\w-]*)
+''', re.VERBOSE)
+
+
+def parse_ntriples_line(line):
+    """
+    :return: (subject, predicate, object) tuple, or None if the line is not a triple
+    """
+    m = NTRIPLE_RE.match(line)
+    if m:
+        return m.groups()
+
+
+def read_ntriples(path):
+    """
+    :return: generator of the (subject, predicate, object) triples in an N-Triples file
+    """
+    with open(path) as f:
+        for line in f:
+            triple = parse_ntriples_line(line)
+            if triple:
+                yield triple
+
+
+def read_turtle(path):
+    """
+    :return: generator of the (subject, predicate, object) triples in a Turtle file. The file is parsed one
+    statement at a time, so it is never fully loaded in memory
+    """
+    parser = TurtleParser()
+    statement = []
+
+    with open(path) as f:
+        for line in f:
+            statement.append(line)
+            if not line.rstrip().endswith('.'):
+                continue
+
+            try:
+                triples = parser.parse(''.join(statement))
+            except ValueError:
+                # the statement continues on the next lines, ex: a multi-line literal containing " ."
+                continue
+
+            statement = []
+            for triple in triples:
+                yield triple
+
+    if ''.join(statement).strip():
+        for triple in parser.parse(''.join(statement)):
+            yield triple
+
+
+def is_iri(term):
+    return term.startswith('<')
+
+
+class TurtleParser(object):
+    """
+    Parses Turtle, including prefixes, predicate and object lists, blank node property lists and collections
+    """
+
+    def __init__(self, text=''):
+        self.prefixes = {}
+        self.base = ''
+        self._bnodes = 0
+        self._load(text)
+
+    def parse(self, text):
+        """
+        Parse the statements in text, using the prefixes declared by the text parsed before
+
+        :return: list of the triples
+        """
+        self._load(text)
+        return list(self.triples())
+
+    def _load(self, text):
+        self.tokens = [(m.lastgroup, m.group()) for m in TURTLE_TOKEN_RE.finditer(text) if m.lastgroup != 'ws']
+        self.pos = 0
+        self._triples = []
+
+        consumed = sum(len(m.group()) for m in TURTLE_TOKEN_RE.finditer(text))
+        if consumed != len(text):
+            raise ValueError("Unable to parse turtle, unexpected character near: {}".format(
+                _first_unmatched(text)[:50]))
+
+    def triples(self):
+        while self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos]
+
+            if kind == 'lang' and value in ('@prefix', '@base'):
+                self.pos += 1
+                self._directive(value[1:])
+                self._expect('.')
+            elif kind == 'name' and value.lower() in ('prefix', 'base'):
+                self.pos += 1
+                self._directive(value.lower())
+            else:
+                self._statement()
+
+            for triple in self._triples:
+                yield triple
+            self._triples = []
+
+    def _directive(self, name):
+        if name == 'prefix':
+            prefix = self._next()[1]
+            self.prefixes[prefix[:-1]] = self._resolve(self._next()[1][1:-1])
+        else:
+            self.base = self._next()[1][1:-1]
+
+    def _statement(self):
+        kind, value = self._peek()
+        if value == '[':
+            subject = self._blank_node_property_list()
+            if self._peek()[1] != '.':
+                self._predicate_object_list(subject)
+        else:
+            subject = self._term()
+            self._predicate_object_list(subject)
+        self._expect('.')
+
+    def _predicate_object_list(self, subject):
+        while True:
+            kind, value = self._next()
+            predicate = RDF_TYPE if value == 'a' else self._term_from(kind, value)
+
+            while True:
+                self._triples.append((subject, predicate, self._object()))
+                if self._peek()[1] != ',':
+                    break
+                self.pos += 1
+
+            if self._peek()[1] != ';':
+                return
+            while self._peek()[1] == ';':
+                self.pos += 1
+            if self._peek()[1] in ('.', ']'):
+                return
+
+    def _object(self):
+        kind, value = self._peek()
+        if value == '[':
+            return self._blank_node_property_list()
+        if value == '(':
+            return self._collection()
+        self.pos += 1
+        return self._term_from(kind, value)
+
+    def _blank_node_property_list(self):
+        self._expect('[')
+        node = self._new_bnode()
+        if self._peek()[1] != ']':
+            self._predicate_object_list(node)
+        self._expect(']')
+        return node
+
+    def _collection(self):
+        self._expect('(')
+        items = []
+        while self._peek()[1] != ')':
+            items.append(self._object())
+        self._expect(')')
+
+        head = '<{}nil>'.format(RDF)
+        for item in reversed(items):
+            node = self._new_bnode()
+            self._triples.append((node, '<{}first>'.format(RDF), item))
+            self._triples.append((node, '<{}rest>'.format(RDF), head))
+            head = node
+        return head
+
+    def _term(self):
+        kind, value = self._next()
+        return self._term_from(kind, value)
+
+    def _term_from(self, kind, value):
+        if kind == 'iri':
+            return '<{}>'.format(self._resolve(value[1:-1]))
+        if kind == 'name':
+            if value in ('true', 'false'):
+                return '"{}"^^<{}boolean>'.format(value, XSD)
+            prefix, local = value.split(':', 1)
+            if prefix not in self.prefixes:
+                raise ValueError("Undefined prefix {}".format(prefix))
+            return '<{}{}>'.format(self.prefixes[prefix], re.sub(r'\\(.)', r'\1', local))
+        if kind == 'bnode':
+            return value
+        if kind == 'number':
+            if re.fullmatch(r'[+-]?\d+', value):
+                datatype = 'integer'
+            elif 'e' in value.lower():
+                datatype = 'double'
+            else:
+                datatype = 'decimal'
+            return '"{}"^^<{}{}>'.format(value, XSD, datatype)
+        if kind == 'literal':
+            return self._literal(value)
+        raise ValueError("Unexpected token {}".format(value))
+
+    def _literal(self, value):
+        quote = value[:3] if value[:3] in ('"""', "'''") else value[0]
+        lexical = value[len(quote):-len(quote)]
+        if quote != '"':
+            # normalize to a single line, double quoted literal
+            lexical = lexical.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+            lexical = re.sub(r'\\\\(.)', r'\\\1', lexical) if quote in ("'''", "'") else lexical
+        literal = '"{}"'.format(lexical)
+
+        kind, next_value = self._peek()
+        if kind == 'datatype':
+            self.pos += 1
+            return '{}^^{}'.format(literal, self._term())
+        if kind == 'lang' and next_value not in ('@prefix', '@base'):
+            self.pos += 1
+            return literal + next_value
+        return literal
+
+    def _resolve(self, iri):
+        if ':' in iri or not self.base:
+            return iri
+        return self.base + iri
+
+    def _new_bnode(self):
+        self._bnodes += 1
+        return '_:genid{}'.format(self._bnodes)
+
+    def _peek(self):
+        if self.pos >= len(self.tokens):
+            return None, None
+        return self.tokens[self.pos]
+
+    def _next(self):
+        if self.pos >= len(self.tokens):
+            raise ValueError("Unexpected end of turtle")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _expect(self, value):
+        kind, actual = self._next()
+        if actual != value:
+            raise ValueError("Expected {} but found {}".format(value, actual))
+
+
+def _first_unmatched(text):
+    pos = 0
+    for m in TURTLE_TOKEN_RE.finditer(text):
+        if m.start() != pos:
+            break
+        pos = m.end()
+    return text[pos:]
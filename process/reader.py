@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import hashlib
+import io
+import itertools
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from .manifest import Manifest
+
+# size of the blocks read when splitting a file
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# number of lines used to estimate the average size of a record
+SAMPLE_LINES = 1000
+
+# extensions of compressed csv files. pandas decompresses these while reading, and zstandard decompresses .zst
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz', '.zip', '.zst')
+
+# extensions of columnar files read with pyarrow, and their format
+COLUMNAR_FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'ipc',
+    '.feather': 'ipc',
+    '.ipc': 'ipc',
+}
+
+
+class CsvRange(object):
+    """
+    A range of complete records in a csv file. Only the location of the range is pickled, so a worker process can
+    parse the range itself instead of receiving the parsed data.
+    """
+
+    def __init__(self, path, start, end, columns, input_hash):
+        """
+        :param path: path of the csv file
+        :param start: byte offset of the first record in the range
+        :param end: byte offset after the last record in the range
+        :param columns: column names from the header of the file
+        :param input_hash: hash of the bytes in the range
+        """
+        self.path = path
+        self.start = start
+        self.end = end
+        self.columns = columns
+        self.input_hash = input_hash
+
+    def read(self, usecols=None, dtype=None, engine='c'):
+        """
+        Parse the records in the range
+
+        :param usecols: optional list of the columns to read
+        :param dtype: optional dtype or dict of column -> dtype, passed to pandas.read_csv
+        :param engine: pandas.read_csv engine. The pyarrow engine doesn't support skipinitialspace, so leading spaces
+        are stripped from the string columns after reading
+        :return: pandas DataFrame
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(self.start)
+            data = f.read(self.end - self.start)
+
+        if engine != 'pyarrow':
+            return pd.read_csv(io.BytesIO(data), header=None, names=self.columns, usecols=usecols, dtype=dtype,
+                               skipinitialspace=True, engine=engine)
+
+        df = pd.read_csv(io.BytesIO(data), header=None, names=self.columns, usecols=usecols, dtype=dtype,
+                         engine=engine)
+        for col in df.columns:
+            if not pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+                df[col] = df[col].str.lstrip(' ')
+        return df
+
+
+def get_reader(config):
+    """
+    Return the reader for the config.data_file, chosen by its extension
+
+    :return: CsvReader, CsvRangeReader or ColumnarReader
+    """
+    path = config.data_file
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext in COLUMNAR_FORMATS:
+        return ColumnarReader(path, COLUMNAR_FORMATS[ext], config)
+
+    if config.parallel_read:
+        if ext in COMPRESSED_EXTENSIONS:
+            logging.warning("compressed data_files can't be split into byte ranges. Ignoring parallel_read")
+        else:
+            return CsvRangeReader(path, config)
+
+    return CsvReader(path, config)
+
+
+class CsvReader(object):
+    """
+    Reads a csv file in chunks in the main process. Compressed files are decompressed while reading. Zstandard
+    files are streamed through zstandard, as pandas doesn't read them. Requires zstandard for .zst files.
+    """
+
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config
+
+    def chunks(self):
+        """
+        :return: generator of (DataFrame, input_hash)
+        """
+        with self._open() as f:
+            columns = pd.read_csv(f, nrows=0, skipinitialspace=True).columns
+
+        with self._open() as f:
+            data = pd.read_csv(f, header=0, skipinitialspace=True, chunksize=self.config.chunk_size,
+                               **self.config.get_load_plan(columns))
+
+            for chunk in data:
+                yield chunk, Manifest.hash_chunk(chunk)
+
+    def _open(self):
+        """
+        :return: the file to pass to pandas.read_csv. Other than .zst files, pandas opens the path itself
+        """
+        if not self.path.lower().endswith('.zst'):
+            return contextlib.nullcontext(self.path)
+
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstandard is required to read {}".format(self.path))
+        return zstandard.open(self.path, 'rt', newline='')
+
+
+class CsvRangeReader(object):
+    """
+    Splits a csv file into CsvRanges, which are parsed by the worker processes
+    """
+
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config
+
+    def chunks(self):
+        """
+        :return: generator of (CsvRange, input_hash)
+        """
+        for csv_range in split_csv(self.path, self.config.chunk_size):
+            yield csv_range, csv_range.input_hash
+
+
+class ColumnarReader(object):
+    """
+    Reads a Parquet or Arrow file one row group at a time, ex: the record batches of an Arrow file. Only the planned
+    columns of each row group are decoded, and they are cast to the planned dtypes, like the csv readers. Row groups
+    larger than chunk_size rows are sliced into chunks of chunk_size rows without copying, so the chunks are the same
+    for a file however pyarrow would batch it. Requires pyarrow.
+    """
+
+    def __init__(self, path, file_format, config):
+        """
+        :param file_format: parquet or ipc
+        """
+        self.path = path
+        self.file_format = file_format
+        self.config = config
+
+    def chunks(self):
+        """
+        :return: generator of (DataFrame, input_hash)
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("pyarrow is required to read {}".format(self.path))
+
+        if self.file_format == 'parquet':
+            row_groups = self._parquet_row_groups(pq)
+        else:
+            row_groups = self._ipc_row_groups(pa)
+
+        for table in row_groups:
+            for offset in range(0, table.num_rows, self.config.chunk_size):
+                chunk = table.slice(offset, self.config.chunk_size).to_pandas()
+                yield chunk, Manifest.hash_chunk(chunk)
+
+    def _parquet_row_groups(self, pq):
+        f = pq.ParquetFile(self.path)
+        plan = self.config.get_load_plan(f.schema_arrow.names)
+
+        for i in range(f.num_row_groups):
+            yield _cast(f.read_row_group(i, columns=plan['usecols']), plan['dtype'])
+
+    def _ipc_row_groups(self, pa):
+        with pa.memory_map(self.path) as source:
+            try:
+                reader = pa.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            except pa.ArrowInvalid:
+                # an Arrow stream instead of an Arrow file
+                source.seek(0)
+                reader = pa.ipc.open_stream(source)
+                batches = iter(reader)
+
+            plan = self.config.get_load_plan(reader.schema.names)
+            for batch in batches:
+                yield _cast(pa.Table.from_batches([batch]).select(plan['usecols']), plan['dtype'])
+
+
+def _cast(table, dtype):
+    """
+    Cast the columns of a pyarrow Table to the dtypes of the load plan. Nulls are kept, as when pandas.read_csv
+    reads a column as str
+
+    :param dtype: dict of column -> dtype
+    """
+    import pyarrow as pa
+
+    for column, t in dtype.items():
+        i = table.schema.get_field_index(column)
+        if i == -1:
+            continue
+        arrow_type = pa.string() if t is str else pa.from_numpy_dtype(np.dtype(t))
+        if table.schema.field(i).type != arrow_type:
+            table = table.set_column(i, column, table.column(i).cast(arrow_type))
+    return table
+
+
+def split_csv(path, chunk_size, block_size=BLOCK_SIZE):
+    """
+    Split a csv file into ranges of about chunk_size records without parsing it. The file is scanned once, and the
+    ranges are split at the first newline at or after each target offset that is not inside a quoted field. The target
+    offsets are estimated from the average size of the first records.
+
+    :param path: path of the csv file
+    :param chunk_size: target number of records in each range
+    :return: generator of CsvRange
+    """
+    with open(path, 'rb') as f:
+        header = _read_record(f)
+        columns = list(pd.read_csv(io.BytesIO(header), nrows=0, skipinitialspace=True).columns)
+        start = f.tell()
+
+        sample = list(itertools.islice(f, SAMPLE_LINES))
+        record_size = sum(len(l) for l in sample) / len(sample) if sample else 1
+        chunk_bytes = max(int(record_size * chunk_size), 1)
+
+        f.seek(start)
+        for range_start, range_end, input_hash in _split(f, start, chunk_bytes, block_size):
+            yield CsvRange(path, range_start, range_end, columns, input_hash)
+
+
+def _split(f, start, chunk_bytes, block_size):
+    # each range ends at the first record end at or after the last byte of chunk_bytes
+    target = start + chunk_bytes - 1
+    in_quotes = False
+    h = hashlib.sha256()
+
+    while True:
+        offset = f.tell()
+        block = f.read(block_size)
+        if not block:
+            break
+
+        i = 0
+        hashed = 0
+        n = len(block)
+
+        while i < n:
+            if offset + n <= target:
+                in_quotes ^= bool(block.count(b'"', i) & 1)
+                break
+
+            # skip ahead to the target, keeping track of whether it is inside a quoted field
+            j = max(i, target - offset)
+            in_quotes ^= bool(block.count(b'"', i, j) & 1)
+
+            nl = block.find(b'\n', j)
+            if nl == -1:
+                in_quotes ^= bool(block.count(b'"', j) & 1)
+                break
+
+            in_quotes ^= bool(block.count(b'"', j, nl) & 1)
+            i = nl + 1
+
+            if not in_quotes:
+                h.update(block[hashed:i])
+                hashed = i
+                yield start, offset + i, h.hexdigest()
+
+                start = offset + i
+                target = start + chunk_bytes - 1
+                h = hashlib.sha256()
+
+        h.update(block[hashed:])
+
+    end = f.tell()
+    if end > start:
+        yield start, end, h.hexdigest()
+
+
+def _read_record(f):
+    """
+    Read a complete record, which may span multiple lines if a quoted field contains newlines
+    """
+    record = f.readline()
+    while record.count(b'"') % 2:
+        line = f.readline()
+        if not line:
+            break
+        record += line
+    return record
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import configparser
+import functools
 import logging
 import subprocess
 import os
@@ -7,27 +9,143 @@ import sys
 
 CUR_DIR = os.path.join(os.path.dirname(__file__))
 
-def run_reasoner(input_file, output_file, config_file, robot_path):
+# heap used when running the reasoner directly with run_reasoner
+DEFAULT_HEAP_MB = 8048
 
-    logging.debug("reasoning on file {}".format(input_file))
+# robot axiom generator for each of the inferences in reasoner.conf
+INFERENCE_AXIOM_GENERATORS = {
+    'types': 'ClassAssertion',
+    'subclasses': 'SubClass',
+    'equivalent_classes': 'EquivalentClass',
+    'disjoint_classes': 'DisjointClasses',
+    'property_values': 'PropertyAssertion',
+    'subproperties': 'SubObjectProperty',
+    'inverse_properties': 'InverseObjectProperties',
+}
+
+
+@functools.lru_cache()
+def reasoner_settings(config_file):
+    """
+    Parse the [Reasoning] section of the reasoner.conf file. Missing settings, or a missing file, use the defaults
+
+    :return: dict with the reasoner name, the list of robot axiom generators, annotate_inferred and the path of
+    the excluded_types_file, relative to the config_file, or None
+    """
+    parser = configparser.ConfigParser()
+    if config_file and os.path.exists(config_file):
+        parser.read(config_file)
+    section = parser['Reasoning'] if parser.has_section('Reasoning') else {}
+
+    inferences = [i.strip().lower() for i in re.split(r'[,\s]+', section.get('inferences', 'types')) if i.strip()]
+    for inference in inferences:
+        if inference not in INFERENCE_AXIOM_GENERATORS:
+            raise AttributeError("Invalid inference \"{}\" in {}. Valid inferences are [{}]".format(
+                inference, config_file, ",".join(INFERENCE_AXIOM_GENERATORS)))
+
+    axiom_generators = [INFERENCE_AXIOM_GENERATORS[i] for i in inferences]
+    if _is_true(section.get('preprocess_inverses', 'True')) and 'InverseObjectProperties' not in axiom_generators:
+        axiom_generators.insert(0, 'InverseObjectProperties')
+
+    excluded_types_file = section.get('excluded_types_file', '').strip()
+    if excluded_types_file:
+        excluded_types_file = os.path.join(os.path.dirname(config_file), excluded_types_file)
+
+    return {
+        'reasoner': section.get('reasoner', 'ELK').strip().lower(),
+        'axiom_generators': axiom_generators,
+        'annotate_inferred': _is_true(section.get('annotate_inferred', 'False')),
+        'excluded_types_file': excluded_types_file or None,
+    }
+
+
+def _is_true(value):
+    return str(value).strip().lower() in ('true', 'yes', '1')
+
+
+def reasoner_args(input_file, output_file, config_file, robot_path, schema_file=None, query=None, catalog=None):
+    """
+    Build the java args, excluding the heap size, to run the reasoner with robot using the settings in the
+    config_file
+
+    :param output_file: file to write the reasoned ontology to. May be None if a query is given
+    :param schema_file: optional file containing the schema triples shared by all input files. If given, it is
+    merged with the input_file before reasoning
+    :param query: optional tuple of (sparql_file, csv_file). If given, the query is chained after the reasoner, so
+    the reasoned ontology is queried without being written and parsed again
+    :param catalog: optional xml catalog file used to resolve the imported ontology to a local file
+    """
+    settings = reasoner_settings(config_file)
+    catalog_args = ['--catalog', catalog] if catalog else []
+
+    if schema_file:
+        # keep the owl:imports declaration instead of merging the imported ontology into the output
+        input_args = ['merge'] + catalog_args + ['--collapse-import-closure', 'false', '-i', input_file, '-i', schema_file, 'reason']
+    else:
+        input_args = ['reason'] + catalog_args + ['-i', input_file]
+
+    reason_args = ['-r', settings['reasoner'], '--axiom-generators', '"{}"'.format(" ".join(settings['axiom_generators'])), '--include-indirect', 'true', '--exclude-tautologies','structural']
+    if settings['annotate_inferred']:
+        reason_args.extend(['--annotate-inferred-axioms', 'true'])
 
     # the java version is unreliable and does not provide useful debugging output
-    cmd = ['java', '-Xmx8048m', '-jar', robot_path, 'reason', '-r', 'elk', '--axiom-generators', '"InverseObjectProperties ClassAssertion"', '-i', input_file, '--include-indirect', 'true', '--exclude-tautologies','structural','reduce','-o', output_file]
+    args = ['-jar', robot_path] + input_args + reason_args + ['reduce']
 
-    logging.debug("running reasoner with the following robot command: ")
-    logging.debug(subprocess.list2cmdline(cmd))
+    if output_file:
+        args.extend(['-o', output_file])
+
+    if query:
+        sparql_file, csv_file = query
+        args.extend(['query', '--query', sparql_file, csv_file])
+
+    return args
 
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = proc.communicate()
 
+def check_reasoner_output(input_file, output_file, stdout, stderr):
+    """
+    Log the result of a reasoner run
+    """
     # take filename from stdout from process, decode and clean up output
-    output = str(stdout.decode('utf-8')).replace('writing ','').replace('\n','').replace(CUR_DIR,'').lstrip()
+    output = stdout.replace('writing ','').replace('\n','').replace(CUR_DIR,'').lstrip()
 
     if not os.path.exists(output_file):
         #raise RuntimeError("Failed to perform reasoning on {}".format(input_file) + ".  " + output)
-        logging.debug("Failed to perform reasoning on {}".format(input_file) + ".  " + output)
-        logging.debug("Error message: " + stderr.decode(sys.stdout.encoding))
+        logging.warning("Failed to perform reasoning on {}".format(input_file) + ".  " + output)
+        logging.debug("Error message: " + stderr)
+        return
 
     # provide docker friendly output (this way user looks for file in relative path home environment instead of docker mount)
     cleanfilename = re.sub('^%s' % '/process/', '', output_file)
     logging.info('reasoned output at ' + cleanfilename)
+
+
+def run_reasoner(input_file, output_file, config_file, robot_path, schema_file=None, heap_mb=DEFAULT_HEAP_MB,
+                 catalog=None, timeout=None):
+    """
+    :param schema_file: optional file containing the schema triples shared by all input files. If given, it is
+    merged with the input_file before reasoning
+    :param heap_mb: maximum heap of the java process
+    :param catalog: optional xml catalog file used to resolve the imported ontology to a local file
+    :param timeout: optional wall-clock limit in seconds. The reasoner is killed if it runs longer
+    """
+
+    logging.debug("reasoning on file {}".format(input_file))
+
+    cmd = ['java', '-Xmx{}m'.format(heap_mb)] + reasoner_args(input_file, output_file, config_file, robot_path,
+                                                              schema_file=schema_file, catalog=catalog)
+
+    logging.debug("running reasoner with the following robot command: ")
+    logging.debug(subprocess.list2cmdline(cmd))
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        stdout, stderr = proc.communicate()
+        stderr += "reasoner timed out after {} seconds".format(timeout).encode('utf-8')
+        # a partial output is not kept
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+    check_reasoner_output(input_file, output_file, stdout.decode('utf-8'), stderr.decode(sys.stdout.encoding))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import collections
+import queue
+
+
+class Stage(object):
+    """
+    A step of the pipeline.
+
+    :param name: name of the stage
+    :param func: function run in the pool for each task. It is called with the args of the task and returns a tuple
+    of args for a task of the next stage, or None if there is nothing to pass on
+    :param limit: maximum number of tasks of this stage in progress at a time
+    :param next_stage: name of the stage that receives the results of this stage
+    :param callback: function called in the main process with the result of each task that returns a result
+    :param executor: object with a multiprocessing.Pool like apply_async method to run the tasks with. Defaults to the
+    pool of the scheduler
+    """
+
+    def __init__(self, name, func, limit, next_stage=None, callback=None, executor=None):
+        self.name = name
+        self.func = func
+        self.limit = max(limit, 1)
+        self.next_stage = next_stage
+        self.callback = callback
+        self.executor = executor
+        self.waiting = collections.deque()
+        self.running = 0
+
+
+class StageScheduler(object):
+    """
+    Runs tasks through a chain of stages using a shared multiprocessing pool, or the executor of the stage. As soon
+    as a task completes, its result is queued for the next stage, so all stages run at the same time instead of each
+    stage waiting for the previous stage to finish. Tasks of a stage are only submitted to the pool while the stage is
+    below its limit.
+    """
+
+    def __init__(self, pool, stages):
+        self.pool = pool
+        self.stages = collections.OrderedDict((stage.name, stage) for stage in stages)
+        self._completed = queue.Queue()
+
+    def submit(self, stage_name, *args):
+        """
+        Queue a task for the given stage. Blocks while the stage has a backlog, so the caller can't produce tasks
+        faster than the stage runs them.
+        """
+        stage = self.stages[stage_name]
+        stage.waiting.append(args)
+        self._dispatch()
+
+        while stage.waiting:
+            self._wait()
+
+    def queue(self, stage_name, *args):
+        """
+        Queue a task for the given stage without waiting for its backlog. Used by the stage callbacks, which are
+        called while the scheduler waits for a task
+        """
+        self.stages[stage_name].waiting.append(args)
+        self._dispatch()
+
+    def join(self):
+        """
+        Wait for all tasks, including the tasks they pass on to later stages, to complete
+        """
+        while any(stage.waiting or stage.running for stage in self.stages.values()):
+            self._wait()
+
+    def _dispatch(self):
+        for stage in self.stages.values():
+            while stage.waiting and stage.running < stage.limit:
+                args = stage.waiting.popleft()
+                stage.running += 1
+                executor = stage.executor or self.pool
+                executor.apply_async(stage.func, args,
+                                     callback=lambda result, s=stage: self._completed.put((s, result, None)),
+                                     error_callback=lambda err, s=stage: self._completed.put((s, None, err)))
+
+    def _wait(self):
+        """
+        Wait for a task to complete and queue its result for the next stage
+        """
+        stage, result, err = self._completed.get()
+        stage.running -= 1
+
+        if err is not None:
+            raise err
+
+        if result is not None:
+            if stage.callback:
+                stage.callback(result)
+            if stage.next_stage:
+                self.stages[stage.next_stage].waiting.append(result)
+
+        self._dispatch()
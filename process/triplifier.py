@@ -1,19 +1,22 @@
 # -*- coding: utf-8 -*-
 import re
+import numpy as np
 import pandas as pd
 import multiprocessing
 from multiprocessing.dummy import Pool as ThreadPool
 import logging
 from .utils import isNull
 
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+INTEGER_VALUE_PATTERN = r"[+-]?\d+(\.0+)?"
+
 
 class Triplifier(object):
     def __init__(self, config):
         self.config = config
-        self.integer_columns = []
-        for rule in self.config.rules:
-            if rule['rule'].lower() == 'integer':
-                self.integer_columns.extend(rule['columns'])
+        self.integer_columns = {column for column, rules in self.config.column_rules.items() if 'Integer' in rules}
 
     def triplify(self, data_frame):
         """
@@ -24,22 +27,134 @@ class Triplifier(object):
         """
         triples = []
 
-        data_frame = data_frame.fillna('')
+        for batch in self.triplify_batches(data_frame, len(data_frame)):
+            triples.extend(batch)
 
-        for index, row in data_frame.iterrows():
-            triples.extend(self._generate_triples_for_row(row))
+        return triples
 
-        triples.extend(self._generate_triples_for_relation_predicates())
+    def triplify_batches(self, data_frame, batch_size, include_schema=True):
+        """
+        Generate triples using the given data_frame and the config mappings, batch_size rows at a time. Only one
+        batch of triples is held in memory at a time.
+
+        :param data_frame: pandas DataFrame
+        :param batch_size: number of rows to triplify per batch
+        :param include_schema: if True, the last batch contains the schema_triples
+        :return: generator yielding a list of triples for each batch
+        """
+        batch_size = max(batch_size, 1)
+
+        for start in range(0, len(data_frame), batch_size):
+            yield self._generate_triples_for_frame(data_frame.iloc[start:start + batch_size].fillna(''))
+
+        if include_schema:
+            yield self.schema_triples()
+
+    def schema_triples(self):
+        """
+        Generate the triples describing the relation predicates, entities and the ontology import. These are the
+        same for every data_frame.
+
+        :return: list of schema triples
+        """
+        triples = self._generate_triples_for_relation_predicates()
         triples.extend(self._generate_triples_for_entities())
         triples.append(self._generate_ontology_import_triple())
 
         return triples
 
-    def _generate_triples_for_chunk(self, chunk):
+    def _generate_triples_for_frame(self, data_frame):
+        """
+        Generate the instance triples for every row of the data_frame using column operations.
+
+        Each entity type declaration, mapped column and relation produces one column of triples. The columns are
+        interleaved row by row, so the triples are returned in the same order as _generate_triples_for_row would
+        produce them when called on each row.
+        """
+        if len(data_frame) == 0:
+            return []
+
+        subjects = {}
+        triple_columns = []
+
+        for entity in self.config.entities:
+            s = "<" + entity['identifier_root'] + self._get_values(data_frame, entity['unique_key']) + ">"
+            subjects[entity['alias']] = s
+
+            if entity['concept_uri'] != RDF_TYPE:
+                triple_columns.append(s + " <{}> <{}>".format(RDF_TYPE, entity['concept_uri']))
+
+            for column, uri in entity['columns']:
+                triple_columns.append(self._generate_triples_for_column(data_frame, s, column, uri))
+
+        # format all triples describing relations
+        for relation in self.config.relations:
+            if relation['subject_entity_alias'] not in subjects or relation['object_entity_alias'] not in subjects:
+                raise RuntimeError("Error assigning relations between a subject and an object.  "
+                                   "Check to be sure each relation maps to an entity alias")
+
+            triple_columns.append(subjects[relation['subject_entity_alias']] + " <{}> ".format(relation['predicate'])
+                                  + subjects[relation['object_entity_alias']])
+
+        triples = np.column_stack(triple_columns).ravel()
+
+        return triples[triples != ''].tolist()
+
+    def _generate_triples_for_column(self, data_frame, subjects, column, uri):
+        """
+        Generate the triples for a single mapped column. Rows with an empty value produce an empty string.
+        """
+        list_for_column = self.config.get_vocabulary(column) if RDF_TYPE in uri else None
+
+        # the object only needs to be formatted once for each distinct value
+        codes, uniques = pd.factorize(self._get_values(data_frame, column))
+        objects = np.array([self._generate_object(val, uri, list_for_column) for val in uniques], dtype=object)[codes]
+
+        triples = subjects + " <{}> ".format(uri) + objects
+
+        return np.where(objects != '', triples, '')
+
+    def _generate_object(self, val, uri, list_for_column):
+        """
+        Format the object of the triple for a mapped column value. Returns an empty string if the value is null.
+
+        :param list_for_column: dict of list field -> defined_by for columns with a list and a rdf:type uri
+        """
+        literal_val = True
+
+        if list_for_column:
+            if val in list_for_column:
+                val = list_for_column[val]
+                literal_val = False
+
+        elif RDF_TYPE in uri:
+            val = self.config._get_uri_from_label(val)
+            literal_val = False
+
+        if isNull(val):
+            return ''
+
+        if literal_val:
+            return "\"{}\"^^<{}{}>".format(val, XSD, self._get_type(val))
+
+        return "<{}>".format(str(val))
+
+    def _triplify_by_row(self, data_frame):
+        """
+        Reference implementation of triplify which generates the triples one row at a time. This is much slower
+        than triplify and is only kept to verify and benchmark the column based implementation.
+        """
         triples = []
-        for index, row in chunk.iterrows():
+
+        data_frame = data_frame.fillna('')
+
+        for index, row in data_frame.iterrows():
             triples.extend(self._generate_triples_for_row(row))
 
+        triples.extend(self._generate_triples_for_relation_predicates())
+        triples.extend(self._generate_triples_for_entities())
+        triples.append(self._generate_ontology_import_triple())
+
         return triples
 
     def _generate_triples_for_row(self, row):
@@ -54,18 +169,16 @@ class Triplifier(object):
             for column, uri in entity['columns']:
                 val = self._get_value(row, column)
 
-                list_for_column = self.config.get_list(column)
+                list_for_column = self.config.get_vocabulary(column)
 
                 # if there is a specified list for this column & the field contains a defined_by, substitute the
                 # defined_by value for the list field
                 literal_val = True
 
                 if list_for_column and "http://www.w3.org/1999/02/22-rdf-syntax-ns#type" in uri:
-                    for i in list_for_column:
-                        if i['field'] == val and i['defined_by']:
-                            val = i['defined_by']
-                            literal_val = False
-                            break
+                    if val in list_for_column:
+                        val = list_for_column[val]
+                        literal_val = False
 
                 # if this is not a list but URI specified is rdf:type for mapping column then we assume this is object Property
                 # and attempt to convert 
@@ -175,6 +288,23 @@ class Triplifier(object):
 
         return val
 
+    def _get_values(self, data_frame, column):
+        """
+        Column equivalent of _get_value. Returns an object array of the string values of the column, or empty
+        strings if the column is missing.
+        """
+        if column not in data_frame:
+            return np.full(len(data_frame), '', dtype=object)
+
+        values = data_frame[column].astype(str).to_numpy(dtype=object)
+
+        if column in self.integer_columns:
+            codes, uniques = pd.factorize(values)
+            values = np.array([str(int(float(val))) if re.fullmatch(INTEGER_VALUE_PATTERN, val) else val
+                               for val in uniques], dtype=object)[codes]
+
+        return values
+
     @staticmethod
     def _get_type(val):
         if re.fullmatch(r"[+-]?\d+", str(val)):
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+class UniqueIndex(object):
+    """
+    Tracks the values seen in unique columns across multiple processes.
+
+    The values are sharded by hash into separate sqlite databases on disk, so memory use does not grow with the
+    number of values and processes only wait on each other when they write to the same shard. Each batch of values
+    is checked and added to a shard in a single transaction.
+    """
+
+    def __init__(self, index_dir, num_shards=16):
+        """
+        :param index_dir: directory to store the shards in
+        :param num_shards: number of shards to split the values into
+        """
+        self.index_dir = index_dir
+        self.num_shards = num_shards
+        self._connections = {}
+        self._pid = None
+
+    def __getstate__(self):
+        # sqlite connections can't be pickled or shared with forked processes. Each process opens its own
+        state = self.__dict__.copy()
+        state['_connections'] = {}
+        state['_pid'] = None
+        return state
+
+    def clear(self):
+        """
+        Remove all values from the index
+        """
+        self.close()
+        if os.path.exists(self.index_dir):
+            shutil.rmtree(self.index_dir)
+        os.makedirs(self.index_dir)
+
+        for shard in range(self.num_shards):
+            self._connection(shard).execute(
+                'CREATE TABLE IF NOT EXISTS keys (col TEXT, key TEXT, PRIMARY KEY (col, key)) WITHOUT ROWID')
+
+    def close(self):
+        if self._pid == os.getpid():
+            for conn in self._connections.values():
+                conn.close()
+        self._connections = {}
+
+    def remove(self):
+        """
+        Close the index and delete the shards from disk
+        """
+        self.close()
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+
+    def check_and_add(self, column, values):
+        """
+        Add the values to the index for the given column. Null values are ignored.
+
+        :param column: name of the unique column
+        :param values: pandas Series of values
+        :return: numpy bool array, True for each value that was already in the index before this call
+        """
+        seen = np.zeros(len(values), dtype=bool)
+        keys = self._keys(values)
+        not_null = keys.notnull().to_numpy()
+
+        if not not_null.any():
+            return seen
+
+        keys = keys[not_null].to_numpy(dtype=object)
+        shards = pd.util.hash_array(keys) % np.uint64(self.num_shards)
+        seen_keys = np.zeros(len(keys), dtype=bool)
+
+        for shard in np.unique(shards):
+            in_shard = shards == shard
+            existing = self._check_and_add_shard(int(shard), column, set(keys[in_shard]))
+            seen_keys[in_shard] = pd.Series(keys[in_shard]).isin(existing).to_numpy()
+
+        seen[not_null] = seen_keys
+        return seen
+
+    def _check_and_add_shard(self, shard, column, keys):
+        conn = self._connection(shard)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM batch')
+            conn.executemany('INSERT INTO batch VALUES (?)', ((k,) for k in keys))
+            existing = {r[0] for r in conn.execute(
+                'SELECT key FROM keys WHERE col = ? AND key IN (SELECT key FROM batch)', (column,))}
+            conn.execute('INSERT OR IGNORE INTO keys (col, key) SELECT ?, key FROM batch', (column,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        return existing
+
+    def _connection(self, shard):
+        if self._pid != os.getpid():
+            self._connections = {}
+            self._pid = os.getpid()
+
+        if shard not in self._connections:
+            conn = sqlite3.connect(os.path.join(self.index_dir, 'shard_{}.db'.format(shard)), timeout=600,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS batch (key TEXT PRIMARY KEY)')
+            self._connections[shard] = conn
+
+        return self._connections[shard]
+
+    @staticmethod
+    def _keys(values):
+        """
+        Convert the values to strings. Floats that are whole numbers are converted to ints first, as pandas will
+        read an integer column as floats if the chunk contains empty values.
+        """
+        keys = values.astype(object).where(values.notnull(), None).map(str, na_action='ignore')
+
+        if values.dtype.kind == 'f':
+            whole = values.notnull() & (values % 1 == 0)
+            keys[whole] = values[whole].astype('int64').astype(str)
+
+        return keys
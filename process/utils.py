@@ -5,6 +5,7 @@ import os
 import sys
 import logging
 import shutil
+from collections import OrderedDict
 import pandas as pd
 
 import requests
@@ -40,3 +41,43 @@ def isNull(val):
         return True
 
 
+
+
+class BoundedCache(object):
+    """
+    A least recently used cache holding at most maxsize items. Keeps count of the cache hits and misses
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for key, or default if key is not cached
+        """
+        if key in self._items:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def info(self):
+        """
+        Return a dict of the cache statistics
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'maxsize': self.maxsize, 'currsize': len(self._items)}
@@ -1,11 +1,29 @@
 # -*- coding: utf-8 -*-
+import atexit
 import csv
+import glob
+import json
+import os
 import re
 import logging
+import shutil
 
-import multiprocessing
+import numpy as np
 import pandas as pd
 
+from .unique_index import UniqueIndex
+
+
+INTEGER_PATTERN = r"[+-]?\d+(\.0+)?"
+# the number formats pandas parses as floats, including exponents and decimals without digits on one side, ex: 1e5, .5
+FLOAT_PATTERN = r"[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?"
+
+# maximum number of distinct invalid values logged for each rule & column in a data_frame
+MAX_LOGGED_VALUES = 10
+# number of most common invalid values written for each rule & column in the validation report. The counts of all
+# values are kept in the shards until they are merged, so the most common values of the whole run are reported
+MAX_REPORTED_VALUES = 20
+
 
 class InvalidData(Exception):
     pass
@@ -19,24 +37,92 @@ class Validator(object):
 
     def __init__(self, config):
         self.config = config
-        manager = multiprocessing.Manager()
 
-        self.unique_values_tracker = manager.dict()
-        self._init_tracker()  # to track unique values across multiple files
-        self.lock = manager.RLock()
+        # to track unique values across multiple files
+        self.unique_index = UniqueIndex(self.config.unique_index_dir)
+        self.unique_index.clear()
+        atexit.register(self.unique_index.remove)
+
+        # each process writes its invalid data and violation counts to its own shard files in this directory
+        if os.path.exists(self.config.validation_shard_dir):
+            shutil.rmtree(self.config.validation_shard_dir)
+        os.makedirs(self.config.validation_shard_dir)
+        atexit.register(shutil.rmtree, self.config.validation_shard_dir, True)
 
         with open(self.config.invalid_data_file, 'w') as f:
             f.write('')
             #csv.writer(f).writerow(self.config.headers)
 
-    def validate(self, data_frame):
-        return DataValidator(data_frame, self.config, self.unique_values_tracker, self.lock).validate()
+    def __enter__(self):
+        return self
 
-    def _init_tracker(self):
-        for rule in self.config.rules:
-            if rule['rule'].lower() == 'uniquevalue':
-                for col in rule['columns']:
-                    self.unique_values_tracker[col] = []
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # the shards are removed at exit, so the report is written even if the run fails
+        self.write_report()
+
+    def validate(self, data_frame):
+        return DataValidator(data_frame, self.config, self.unique_index).validate()
+
+    def unique_columns(self):
+        """
+        Return the list of columns with a UniqueValue rule
+        """
+        return [col for rule in self.config.rules if rule['rule'].lower() == 'uniquevalue' for col in rule['columns']]
+
+    def register_unique(self, data_frame):
+        """
+        Add the values of the unique columns to the index without validating the data. Used for data that was
+        validated in a previous run, so duplicates of it are still found in the data that is validated
+        """
+        for col in self.unique_columns():
+            if col in data_frame:
+                self.unique_index.check_and_add(col, data_frame[col])
+
+    def write_report(self):
+        """
+        Merge the shards written by each process into the invalid_data_file and validation_report_file, and log a
+        summary of the violations. If any row violated an error level rule, the location of the files is printed.
+
+        :return: dict of (rule, column, level) -> {'count': number of invalid rows, 'values': {value: count}}
+        """
+        with open(self.config.invalid_data_file, 'w') as f:
+            for shard in sorted(glob.glob(os.path.join(self.config.validation_shard_dir, 'invalid_data_*.csv'))):
+                with open(shard) as shard_file:
+                    shutil.copyfileobj(shard_file, f)
+
+        report = {}
+        for shard in sorted(glob.glob(os.path.join(self.config.validation_shard_dir, 'violations_*.jsonl'))):
+            with open(shard) as shard_file:
+                for line in shard_file:
+                    violation = json.loads(line)
+                    key = (violation['rule'], violation['column'], violation['level'])
+                    merged = report.setdefault(key, {'count': 0, 'values': {}})
+                    merged['count'] += violation['count']
+                    for val, count in violation['values'].items():
+                        merged['values'][val] = merged['values'].get(val, 0) + count
+
+        with open(self.config.validation_report_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['rule', 'column', 'level', 'count', 'values'])
+
+            for (rule, column, level), violation in report.items():
+                values = sorted(violation['values'].items(), key=lambda v: -v[1])[:MAX_REPORTED_VALUES]
+                violation['values'] = dict(values)
+                writer.writerow([rule, column, level, violation['count'],
+                                 '|'.join("{} ({})".format(val, count) for val, count in values)])
+
+                logging.info("{}: {} rows violated the {} rule in column `{}`".format(level.upper(), violation['count'],
+                                                                                      rule, column))
+
+        if any(level == 'error' for rule, column, level in report):
+            invalid_data_path = os.path.realpath(self.config.invalid_data_file)
+            if self.config.log_file:
+                log_path = os.path.realpath(self.config.log_file)
+                print("Validation Failed! The logs are located {} and {}".format(invalid_data_path, log_path))
+            else:
+                print("Validation Failed! The logs are located {}".format(invalid_data_path))
+
+        return report
 
 
 class DataValidator(object):
@@ -44,13 +130,14 @@ class DataValidator(object):
     performs basic data validation. Ensures that the data adheres to the specified rules
     """
 
-    def __init__(self, df, config, unique_values_tracker, lock):
+    def __init__(self, df, config, unique_index):
         self.config = config
         self.data = df
-        self.unique_values_tracker = unique_values_tracker
-        self.invalid_data = pd.DataFrame()
-        self.lock = lock
-        self.rulevioloation = ''
+        self.unique_index = unique_index
+        # list of (rule_name, column, mask) tuples. mask is a numpy bool array which is True for each invalid row
+        self.invalid_masks = []
+        # list of violation counts for the validation report
+        self.violations = []
 
     def validate(self):
         return self._validate_data()
@@ -64,52 +151,91 @@ class DataValidator(object):
             if rule_name == 'requiredvalue':
                 if not self._required_value_rule(rule['columns'], rule['level']):
                     valid = False
-                    self.ruleviolation = rule_name
             elif rule_name == 'uniquevalue':
                 if not self._unique_value_rule(rule['columns'], rule['level']):
                     valid = False
-                    self.ruleviolation = rule_name
             elif rule_name == 'controlledvocabulary':
                 if not self._controlled_vocab_rule(rule['columns'], rule['level'], rule['list']):
                     valid = False
-                    self.ruleviolation = rule_name
             elif rule_name == 'integer':
                 if not self._integer_rule(rule['columns'], rule['level']):
                     valid = False
-                    self.ruleviolation = rule_name
             elif rule_name == 'float':
                 if not self._float_rule(rule['columns'], rule['level']):
                     valid = False
-                    self.ruleviolation = rule_name
 
-        if len(self.invalid_data) > 0:
+        invalid = np.zeros(len(self.data), dtype=bool)
+        for rule_name, col, mask in self.invalid_masks:
+            invalid |= mask
+
+        if invalid.any():
             logging.debug("dropping invalid data")
-            with open(self.config.invalid_data_file, 'a') as f:
-                #f.write("Rule violoated: " + self.ruleviolation+"\n")
-                allrows = []
-                for index, row in self.invalid_data.iterrows():
-                    allrows.append(self.ruleviolation + " rule error")
-                self.invalid_data = self.invalid_data.assign(error=allrows)
-                self.invalid_data.to_csv(f, index=False, header=False)
+            self._write_shards()
 
             if self.config.drop_invalid:
-                # remove all rows that are in the invalid_data DataFrame
-                self.data.drop(self.invalid_data.index, inplace=True)
+                # remove all rows that violated a rule
+                self.data.drop(self.data.index[invalid], inplace=True)
                 valid = len(self.data) > 0
 
         return valid
 
+    def _add_invalid(self, rule_name, col, error_level, mask):
+        mask = mask.to_numpy(dtype=bool)
+        self.invalid_masks.append((rule_name, col, mask))
+
+        counts = self.data[col][mask].astype(str).where(self.data[col][mask].notnull(), '').value_counts()
+        self.violations.append({
+            'rule': rule_name,
+            'column': col,
+            'level': error_level.lower(),
+            'count': int(counts.sum()),
+            'values': {val: int(count) for val, count in counts.items()},
+        })
+
+    def _write_shards(self):
+        """
+        Append a sample of the invalid rows and the violation counts to the shard files of this process. At most
+        invalid_sample_size rows are written for each rule & column.
+        """
+        sample = np.zeros(len(self.data), dtype=bool)
+        for rule_name, col, mask in self.invalid_masks:
+            sample[np.flatnonzero(mask)[:self.config.invalid_sample_size]] = True
+
+        shard = os.path.join(self.config.validation_shard_dir, 'invalid_data_{}.csv'.format(os.getpid()))
+        with open(shard, 'a') as f:
+            invalid_data = self.data[sample].assign(error=self._error_labels()[sample])
+            invalid_data.to_csv(f, index=False, header=False)
+
+        shard = os.path.join(self.config.validation_shard_dir, 'violations_{}.jsonl'.format(os.getpid()))
+        with open(shard, 'a') as f:
+            for violation in self.violations:
+                f.write(json.dumps(violation) + "\n")
+
+    def _error_labels(self):
+        """
+        Return an array containing the names of the rules each row violated, ex: "requiredvalue|integer rule error"
+        """
+        rule_masks = {}
+        for rule_name, col, mask in self.invalid_masks:
+            rule_masks[rule_name] = rule_masks.get(rule_name, False) | mask
+
+        labels = np.full(len(self.data), '', dtype=object)
+
+        for rule_name, mask in rule_masks.items():
+            labels = np.where(mask, np.where(labels == '', rule_name, labels + '|' + rule_name), labels)
+
+        return labels + ' rule error'
+
     def _required_value_rule(self, columns, error_level):
         valid = True
 
         for col in columns:
-            invalid_data = self.data.loc[self.data[col].isnull()]
+            invalid = self.data[col].isnull()
 
-            if len(invalid_data) > 0:
+            if invalid.any():
                 self._log_error("Value missing in required column `{}`".format(col), error_level)
 
-                self.invalid_data = self.invalid_data.append(
-                    invalid_data.drop(self.invalid_data.index, errors='ignore'))
+                self._add_invalid('requiredvalue', col, error_level, invalid)
                 if error_level.lower() == 'error':
                     valid = False
 
@@ -119,57 +245,40 @@ class DataValidator(object):
         valid = True
 
         for col in columns:
-            invalid_data = pd.DataFrame()
+            values = self.data[col]
 
             # check for duplicates in current data_frame
-            dups = [g for _, g in self.data.groupby(col) if len(g) > 1]
-
-            # check for duplicates in existing values. we need a lock here so only 1 processes can check for duplicates
-            # AND add their values at a time
-            with self.lock:
-                past_values = self.unique_values_tracker[col]
+            invalid = values.duplicated(keep=False) & values.notnull()
 
-                global_dups = self.data[self.data[col].isin(past_values)]
+            # check for duplicates in the values of previous data_frames, and add the current values to the index
+            invalid |= self.unique_index.check_and_add(col, values)
 
-                # add current data_frame col values to tracker. to have changes propagated to multiple processes,
-                # we need to reassign the dict key as changes to the list values are not tracked
-                past_values.extend(self.data[col].tolist())
-                self.unique_values_tracker[col] = past_values
+            if invalid.any():
+                duplicates = values[invalid].unique()
+                if len(duplicates) > MAX_LOGGED_VALUES:
+                    self._log_error("Duplicate values {} and {} more in column `{}`".format(
+                        duplicates[:MAX_LOGGED_VALUES], len(duplicates) - MAX_LOGGED_VALUES, col), error_level)
+                else:
+                    self._log_error("Duplicate values {} in column `{}`".format(duplicates, col), error_level)
 
-            if len(dups) > 0:
-                invalid_data = pd.concat(dups)
-
-            if len(global_dups) > 0:
-                # merge global_dups into invalid_data
-                invalid_data = invalid_data.append(global_dups.drop(invalid_data.index, errors='ignore'))
-
-            if not invalid_data.empty:
-                self._log_error("Duplicate values {} in column `{}`".format(invalid_data[col].unique(), col),
-                                error_level)
-
-                self.invalid_data = self.invalid_data.append(
-                    invalid_data.drop(self.invalid_data.index, errors='ignore'))
+                self._add_invalid('uniquevalue', col, error_level, invalid)
                 if error_level.lower() == 'error':
                     valid = False
 
         return valid
 
-
     def _controlled_vocab_rule(self, columns, error_level, list_name):
         valid = True
 
-        list = self.config.lists[list_name]
-        list_values = [i['field'] for i in list]
+        list_values = self.config.vocabularies[list_name].keys()
         for col in columns:
-            invalid_data = self.data.loc[~self.data[col].isin(list_values)]
+            invalid = ~self.data[col].isin(list_values)
 
-            self.invalid_data = self.invalid_data.append(invalid_data.drop(self.invalid_data.index, errors='ignore'))
-            for val in invalid_data[col]:
-                self._log_error(
-                    "Value `{}` in column `{}` is not in the controlled vocabulary list `{}`".format(val, col,
-                                                                                                     list_name),
-                    error_level)
+            if invalid.any():
+                self._log_values("Value `{}` in column `{}` is not in the controlled vocabulary list `" + list_name + "`",
+                                 self.data[col][invalid], col, error_level)
 
+                self._add_invalid('controlledvocabulary', col, error_level, invalid)
                 if error_level.lower() == 'error':
                     valid = False
 
@@ -181,43 +290,67 @@ class DataValidator(object):
         for col in columns:
             # pandas can't store ints along floats and strings. The only way to coerce to ints is to drop all strings
             # and null values. We don't want to do this in the case of a warning. We will need to do the coercion later
+            values = self.data[col]
+            strings = values.astype(str)
+
+            # numbers with an integral value are ints, ex: 1e5, as when pandas parsed the column as numbers
+            numbers = pd.to_numeric(strings.where(strings.str.fullmatch(FLOAT_PATTERN)), errors='coerce')
+            integers = strings.str.fullmatch(INTEGER_PATTERN) | (numbers % 1 == 0)
 
-            # returns rows where value isn't an int, ignoring empty values
-            invalid_data = self.data[self.data[col].apply(
-                lambda x: False if not x or pd.isnull(x) or re.fullmatch(r"[+-]?\d+(\.0+)?", str(x)) else True
-            )]
+            # rows where value isn't an int, ignoring empty values
+            invalid = values.notnull() & (strings != '') & ~integers
 
-            self.invalid_data = self.invalid_data.append(invalid_data.drop(self.invalid_data.index, errors='ignore'))
-            for val in invalid_data[col]:
-                self._log_error("Value `{}` in column `{}` is not an integer".format(val, col), error_level)
+            if invalid.any():
+                self._log_values("Value `{}` in column `{}` is not an integer", values[invalid], col, error_level)
 
+                self._add_invalid('integer', col, error_level, invalid)
                 if error_level.lower() == 'error':
                     valid = False
 
         return valid
 
     def _float_rule(self, columns, error_level):
-        # This will convert all numbers to floats if possible, otherwise return a the value
-        mapper = lambda x: float(x) if re.fullmatch(r"[+-]?\d+(\.\d+)?", str(x)) else x
-
         valid = True
 
         for col in columns:
-            # first coerce values to floats if possible
-            self.data[col] = self.data[col].apply(mapper)
+            values = self.data[col]
 
-            # returns rows where value isn't a float, ignoring empty values
-            invalid_data = self.data[
-                self.data[col].apply(lambda x: False if not x or pd.isnull(x) or isinstance(x, float) else True)]
+            if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                # all values are numbers, so we only need to convert them to floats
+                self.data[col] = values.astype(float)
+                continue
 
-            self.invalid_data = self.invalid_data.append(invalid_data.drop(self.invalid_data.index, errors='ignore'))
-            for val in invalid_data[col]:
-                self._log_error("Value `{}` in column `{}` is not a float".format(val, col), error_level)
+            # convert all numbers to floats if possible, otherwise keep the value
+            strings = values.astype(str)
+            numbers = strings.str.fullmatch(FLOAT_PATTERN) & values.notnull()
+            self.data[col] = values.astype(object).where(~numbers, pd.to_numeric(strings.where(numbers),
+                                                                                  errors='coerce')).infer_objects()
 
+            # rows where value isn't a float, ignoring empty values
+            invalid = values.notnull() & (strings != '') & ~numbers
+
+            if invalid.any():
+                self._log_values("Value `{}` in column `{}` is not a float", values[invalid], col, error_level)
+
+                self._add_invalid('float', col, error_level, invalid)
                 if error_level.lower() == 'error':
                     valid = False
 
         return valid
 
+    def _log_values(self, msg, invalid_values, col, level):
+        """
+        Log msg for each distinct invalid value, up to MAX_LOGGED_VALUES values
+
+        :param msg: format string taking the value and column
+        """
+        values = invalid_values.unique()
+
+        for val in values[:MAX_LOGGED_VALUES]:
+            self._log_error(msg.format(val, col), level)
+
+        if len(values) > MAX_LOGGED_VALUES:
+            self._log_error("{} more invalid values in column `{}`".format(len(values) - MAX_LOGGED_VALUES, col), level)
+
     def _log_error(self, msg, level):
         logging.info("{}: {}".format(level.upper(), msg))
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import logging
+
+# maximum length in bytes of a reply line. The replies carry the stdout and stderr of the robot commands, which can
+# be much larger than the default 64 KiB limit of the asyncio streams
+REPLY_LIMIT = 256 * 1024 * 1024
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class RobotWorker(object):
+    """
+    A long running process that runs robot commands sent to it, so the JVM is started and the ontology loaded once
+    instead of for every file.
+
+    Jobs are sent to the stdin of the worker one per line, as json objects with an id and the robot args:
+
+        {"id": 1, "args": ["reason", "-i", "data_1.ttl", ...]}
+
+    and the worker replies with one line per job on stdout, in the same order:
+
+        {"id": 1, "exit": 0, "stdout": "...", "stderr": "..."}
+
+    Anything the worker writes to stderr is logged. worker/RobotWorker.java implements the protocol with ROBOT's
+    CommandManager, and keeps the imported ontology loaded between jobs.
+    """
+
+    def __init__(self, cmd):
+        """
+        :param cmd: list of the command and args that start the worker
+        """
+        self.cmd = cmd
+        self._proc = None
+        self._stderr = None
+        self._next_id = 0
+        # set once the worker is killed or exits while running a job. The returncode of the process is only set once
+        # it is reaped, so until then it would still look alive
+        self._dead = False
+
+    async def start(self):
+        self._proc = await asyncio.create_subprocess_exec(*self.cmd, stdin=asyncio.subprocess.PIPE,
+                                                          stdout=asyncio.subprocess.PIPE,
+                                                          stderr=asyncio.subprocess.PIPE, limit=REPLY_LIMIT)
+        self._stderr = asyncio.ensure_future(self._log_stderr())
+
+    @property
+    def alive(self):
+        return self._proc is not None and self._proc.returncode is None and not self._dead
+
+    async def run(self, args):
+        """
+        Run a robot command in the worker
+
+        :param args: robot args, excluding java and the robot jar
+        :return: dict with the exit code, stdout and stderr of the command
+        """
+        self._next_id += 1
+        job = {'id': self._next_id, 'args': args}
+
+        try:
+            self._proc.stdin.write((json.dumps(job) + '\n').encode('utf-8'))
+            await self._proc.stdin.drain()
+            line = await self._proc.stdout.readline()
+        except (BrokenPipeError, ConnectionResetError):
+            line = b''
+        except asyncio.CancelledError:
+            # the reply to the job would be read as the reply to the next job, so the worker can't be reused
+            self._dead = True
+            self._proc.kill()
+            raise
+
+        if not line:
+            self._dead = True
+            raise WorkerError("robot worker exited while running: {}".format(" ".join(args)))
+
+        result = json.loads(line.decode('utf-8'))
+        if result.get('id') != job['id']:
+            raise WorkerError("robot worker replied to job {} instead of {}".format(result.get('id'), job['id']))
+
+        return result
+
+    async def close(self):
+        if self.alive:
+            self._proc.stdin.close()
+            try:
+                await asyncio.wait_for(self._proc.wait(), 10)
+            except asyncio.TimeoutError:
+                self._proc.kill()
+                await self._proc.wait()
+        elif self._proc is not None and self._proc.returncode is None:
+            # killed or exited while running a job, and not reaped yet
+            try:
+                self._proc.kill()
+            except ProcessLookupError:
+                pass
+            await self._proc.wait()
+
+        if self._stderr:
+            await self._stderr
+
+    async def _log_stderr(self):
+        while True:
+            line = await self._proc.stderr.readline()
+            if not line:
+                break
+            logging.debug(line.decode('utf-8', errors='replace').rstrip())
+
+
+class RobotWorkerPool(object):
+    """
+    A fixed number of RobotWorkers. Each job is run by the next idle worker. Workers are started when first needed,
+    and replaced if they exit or are killed, ex: when a job times out. A dead worker is reaped and dropped before its
+    slot is reused, so no job is sent to it.
+    """
+
+    def __init__(self, cmd, size):
+        self.cmd = cmd
+        self.size = max(size, 1)
+        self._idle = None
+        self._workers = []
+
+    async def run(self, args):
+        """
+        Run a robot command in the next idle worker
+
+        :return: dict with the exit code, stdout and stderr of the command
+        """
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(None)
+
+        worker = await self._idle.get()
+        try:
+            if worker is None:
+                worker = RobotWorker(self.cmd)
+                self._workers.append(worker)
+                await worker.start()
+
+            return await worker.run(args)
+        finally:
+            if worker is not None and not worker.alive:
+                # the slot is freed first, so it isn't lost if the job is cancelled again while the worker is reaped
+                self._workers.remove(worker)
+                self._idle.put_nowait(None)
+                await worker.close()
+            else:
+                self._idle.put_nowait(worker)
+
+    async def close(self):
+        for worker in self._workers:
+            await worker.close()
+        self._workers = []
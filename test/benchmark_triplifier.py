@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the column based Triplifier.triplify with the row by row reference implementation.
+
+usage: python -m test.benchmark_triplifier [num_rows]
+"""
+import sys
+import timeit
+
+import pandas as pd
+
+from process.config import Config
+from process.triplifier import Triplifier
+
+
+class Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _make_data(num_rows):
+    data = pd.read_csv('test/data/valid.csv', header=0, skipinitialspace=True)
+    data = data.loc[data.index.repeat(num_rows)].reset_index(drop=True)
+    data['record_id'] = range(1, num_rows + 1)
+    return data
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    ns = Namespace(chunk_size=num_rows, config_dir='test/config', data_file='test/data/valid.csv', drop_invalid=True,
+                   log_file=False, num_processes=1, ontology='test/test-ontology.owl', output_dir='test/data',
+                   reasoner_config=None, verbose=False)
+    triplifier = Triplifier(Config(**ns.__dict__))
+    data = _make_data(num_rows)
+
+    assert triplifier.triplify(data) == triplifier._triplify_by_row(data)
+
+    for name, func in [('row by row', triplifier._triplify_by_row), ('columnar', triplifier.triplify)]:
+        seconds = min(timeit.repeat(lambda: func(data), number=1, repeat=3))
+        print("{:<12} {:>8.3f}s  {:>10.0f} rows/s".format(name, seconds, num_rows / seconds))
+
+
+if __name__ == '__main__':
+    main()
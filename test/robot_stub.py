@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Stands in for `java -Xmx... -jar robot.jar` in the tests. The reason command copies its input to its output, and
+the query command writes a csv with the EventID of each record in its input. Both may be chained in one command.
+
+If the ROBOT_STUB_FAIL environment variable is set, a reason command whose input contains its value fails.
+
+With --worker, runs as a RobotWorker, reading json jobs from stdin. The pid of the worker is appended to the file in
+the ROBOT_STUB_LOG environment variable for each job. Otherwise the args of each command are appended to it.
+"""
+import json
+import os
+import re
+import shutil
+import sys
+
+
+def robot(args):
+    if args[0] != 'query' and os.environ.get('ROBOT_STUB_FAIL'):
+        with open(args[args.index('-i') + 1]) as f:
+            if os.environ['ROBOT_STUB_FAIL'] in f.read():
+                sys.stderr.write('reasoning failed\n')
+                sys.exit(1)
+
+    if args[0] != 'query' and '-o' in args:
+        shutil.copyfile(args[args.index('-i') + 1], args[args.index('-o') + 1])
+
+    if 'query' in args:
+        input_file = args[args.index('--input' if '--input' in args else '-i') + 1]
+        with open(input_file) as f:
+            ids = re.findall(r'/EventID> "([^"]*)"', f.read())
+        with open(args[-1], 'w') as f:
+            f.write('observationID\n' + ''.join(i + '\n' for i in ids))
+
+
+if sys.argv[1] == '--worker':
+    for line in sys.stdin:
+        job = json.loads(line)
+        robot(job['args'])
+
+        with open(os.environ['ROBOT_STUB_LOG'], 'a') as f:
+            f.write('{}\n'.format(os.getpid()))
+
+        print(json.dumps({'id': job['id'], 'exit': 0, 'stdout': 'done', 'stderr': ''}), flush=True)
+else:
+    # skip the -Xmx option and -jar robot.jar
+    args = sys.argv[sys.argv.index('-jar') + 2:]
+
+    if 'ROBOT_STUB_LOG' in os.environ:
+        with open(os.environ['ROBOT_STUB_LOG'], 'a') as f:
+            f.write(' '.join(args) + '\n')
+
+    # write enough to stderr to fill the pipe buffer if it isn't read while running
+    sys.stderr.write('robot log line\n' * 10000)
+
+    robot(args)
@@ -0,0 +1,42 @@
+import os
+import shutil
+
+from process.abox import extract_abox
+from process.rdfio import RDF_TYPE, read_ntriples, read_turtle
+
+SAMPLE_ROOTS = ['urn:vertTrait/', 'urn:vertTraitObsProc/', 'urn:vertOrg/', 'urn:measurementDatum/']
+
+
+def test_should_only_keep_triples_of_data_individuals(tmpdir):
+    reasoned_file = str(tmpdir.join('reasoned_data.ttl'))
+    shutil.copy('sample_data/reasoned_data.ttl', reasoned_file)
+    triples = set(read_turtle(reasoned_file))
+
+    kept, dropped = extract_abox(reasoned_file, SAMPLE_ROOTS)
+
+    expected = {t for t in triples if t[0].startswith(tuple('<' + r for r in SAMPLE_ROOTS))}
+    assert set(read_ntriples(reasoned_file)) == expected
+    assert (kept, dropped) == (len(expected), len(triples) - len(expected))
+    assert os.path.getsize(reasoned_file) < os.path.getsize('sample_data/reasoned_data.ttl')
+    assert not os.path.exists(reasoned_file + '.tmp')
+
+    # the inferred types used by the query are kept
+    assert ('<urn:vertTrait/1>', RDF_TYPE, '<http://purl.obolibrary.org/obo/OBA_0000001>') in expected
+    assert not any(t[0] == '<urn:importInstance>' for t in expected)
+
+
+def test_should_read_turtle_one_statement_at_a_time(tmpdir):
+    turtle = tmpdir.join('data.ttl')
+    turtle.write('@prefix ex: <http://example.com/> .\n'
+                 'ex:a ex:p """multi-line literal .\n'
+                 'ending with a dot .""" ;\n'
+                 '    ex:q ex:b , ex:c .\n'
+                 '### comment .\n'
+                 'ex:b a ex:C .\n')
+
+    assert list(read_turtle(str(turtle))) == [
+        ('<http://example.com/a>', '<http://example.com/p>', '"multi-line literal .\\nending with a dot ."'),
+        ('<http://example.com/a>', '<http://example.com/q>', '<http://example.com/b>'),
+        ('<http://example.com/a>', '<http://example.com/q>', '<http://example.com/c>'),
+        ('<http://example.com/b>', RDF_TYPE, '<http://example.com/C>'),
+    ]
@@ -0,0 +1,96 @@
+import asyncio
+import os
+
+from process.bisector import Bisector, group_records, merge_files
+
+SCHEMA = ['<urn:importInstance> <http://www.w3.org/2002/07/owl#imports> <ontology.owl>']
+
+
+def _job(runs, bad='<urn:bad>', fail_all=False):
+    """
+    copies the input to the output, and fails if it contains the bad triple or doesn't import the ontology
+    """
+    async def job(input_file, output_file):
+        with open(input_file) as f:
+            content = f.read()
+        runs.append(content)
+        if fail_all or bad in content or SCHEMA[0] not in content:
+            raise RuntimeError("java exited with 1\nbad data")
+        with open(output_file, 'w') as f:
+            f.write(content)
+    return job
+
+
+def _write_input(tmpdir, num_subjects, bad_subject=None):
+    lines = []
+    for i in range(num_subjects):
+        for p in ('a', 'b'):
+            o = '<urn:bad>' if i == bad_subject and p == 'b' else '"{}"'.format(i)
+            lines.append('<urn:s/{}> <urn:{}> {} .\n'.format(i, p, o))
+    input_file = tmpdir.join('data_1.ttl')
+    input_file.write(''.join(lines) + SCHEMA[0] + ' .\n')
+    return str(input_file), lines
+
+
+def test_should_isolate_failing_records(tmpdir):
+    input_file, lines = _write_input(tmpdir, 8, bad_subject=5)
+    output_file = str(tmpdir.join('out.ttl'))
+    bisector = Bisector(str(tmpdir.join('bisect')), SCHEMA)
+    runs = []
+
+    assert not asyncio.run(bisector.run(_job(runs), input_file, output_file, merge_files))
+
+    with open(output_file) as f:
+        output = f.read().splitlines()
+    # all good records are reasoned, and each part has the schema
+    assert sorted(l for l in output if l != SCHEMA[0] + ' .') == sorted(
+        l.rstrip('\n') for l in lines if not l.startswith('<urn:s/5>'))
+    assert output.count(SCHEMA[0] + ' .') >= 2
+    # the whole record of the failing triple is quarantined
+    assert [(f, triples) for f, err, triples in bisector.quarantined] == [
+        (input_file, ['<urn:s/5> <urn:a> "5" .\n', '<urn:s/5> <urn:b> <urn:bad> .\n'])]
+    # the bisect files are removed
+    assert os.listdir(str(tmpdir.join('bisect'))) == []
+
+    report = tmpdir.join('quarantined.csv')
+    assert bisector.write_report(str(report)) == 2
+    assert report.read().splitlines() == ['file,error,record,triple',
+                                          'data_1.ttl,java exited with 1,<urn:s/5>,"<urn:s/5> <urn:a> ""5"" ."',
+                                          'data_1.ttl,java exited with 1,<urn:s/5>,<urn:s/5> <urn:b> <urn:bad> .']
+
+
+def test_should_group_related_subjects_into_records():
+    lines = ['<urn:org/1> <urn:a> "1" .\n',
+             '<urn:trait/1> <urn:of> <urn:org/1> .\n',
+             '<urn:trait/2> <urn:a> "2" .\n',
+             '<urn:datum/1> <urn:of> <urn:trait/1> .\n',
+             '<urn:trait/1> <urn:type> <urn:Trait> .\n',
+             'not a triple\n']
+
+    assert group_records(lines) == [
+        [lines[0], lines[1], lines[3], lines[4]],
+        [lines[2]],
+        [lines[5]]]
+
+
+def test_should_not_bisect_if_schema_fails(tmpdir):
+    input_file, lines = _write_input(tmpdir, 8)
+    bisector = Bisector(str(tmpdir.join('bisect')), SCHEMA)
+    runs = []
+
+    assert not asyncio.run(bisector.run(_job(runs, fail_all=True), input_file, str(tmpdir.join('out.ttl')),
+                                        merge_files))
+
+    # the file and the schema check are run once each
+    assert len(runs) == 2
+    assert sorted(l for f, err, triples in bisector.quarantined for l in triples) == sorted(lines)
+    assert not tmpdir.join('out.ttl').exists()
+
+
+def test_should_merge_csv_outputs(tmpdir):
+    for i in (1, 2):
+        tmpdir.join('{}.csv'.format(i)).write('observationID\nobs{}\n'.format(i))
+
+    merge_files([str(tmpdir.join('1.csv')), str(tmpdir.join('2.csv'))], str(tmpdir.join('out.csv')), header=True)
+
+    assert tmpdir.join('out.csv').read() == 'observationID\nobs1\nobs2\n'
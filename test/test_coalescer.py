@@ -0,0 +1,45 @@
+from process.coalescer import Coalescer, read_batches, write_batches, write_unit
+
+
+def test_should_merge_small_chunks():
+    coalescer = Coalescer(10)
+
+    assert coalescer.add(1, 'data_1', [(100, 4)]) == []
+    assert coalescer.add(2, 'data_2', [(50, 3), (120, 3)]) == [('unit_1', [['data_1', 0, 100], ['data_2', 0, 120]])]
+    assert coalescer.add(3, 'data_3', [(80, 2)]) == []
+    assert coalescer.flush() == [('unit_2', [['data_3', 0, 80]])]
+    assert coalescer.flush() == []
+    assert coalescer.names == ['unit_1', 'unit_2']
+
+
+def test_should_split_large_chunks_between_batches():
+    coalescer = Coalescer(10)
+
+    units = coalescer.add(1, 'data_1', [(10, 6), (20, 6), (30, 20), (40, 4)])
+
+    # a batch larger than the budget is a unit by itself
+    assert units == [('unit_1', [['data_1', 0, 10]]), ('unit_2', [['data_1', 10, 20]]),
+                     ('unit_3', [['data_1', 20, 30]])]
+    assert coalescer.flush() == [('unit_4', [['data_1', 30, 40]])]
+
+
+def test_should_add_chunks_in_index_order():
+    coalescer = Coalescer(10)
+
+    assert coalescer.add(3, 'data_3', [(10, 6)]) == []
+    # chunk 2 has no triples
+    assert coalescer.add(2, None, []) == []
+    assert coalescer.add(1, 'data_1', [(10, 6)]) == [('unit_1', [['data_1', 0, 10]])]
+    assert coalescer.flush() == [('unit_2', [['data_3', 0, 10]])]
+
+
+def test_should_write_unit(tmpdir):
+    tmpdir.join('data_1.ttl').write("<a> <p> <b> .\n<c> <p> <d> .\n<schema> <p> <o> .\n")
+    tmpdir.join('data_2.ttl').write("<e> <p> <f> .\n<schema> <p> <o> .\n")
+    write_batches(str(tmpdir.join('data_1.ttl')), [(14, 1), (28, 1)])
+
+    assert read_batches(str(tmpdir.join('data_1.ttl'))) == [(14, 1), (28, 1)]
+
+    unit_file = tmpdir.join('unit_1.ttl')
+    write_unit(str(unit_file), [['data_1', 14, 28], ['data_2', 0, 14]], str(tmpdir), ['<schema> <p> <o>'])
+    assert unit_file.read() == "<c> <p> <d> .\n<e> <p> <f> .\n<schema> <p> <o> .\n"
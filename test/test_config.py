@@ -30,3 +30,44 @@ def test_config(tmpdir):
     for rule in config.rules:
         assert rule['level'] in ["error", "warning"]
 
+
+
+def test_config_indexes():
+    ns = Namespace(chunk_size=50000, config_dir='test/config', data_file=None, drop_invalid=True, input_dir='test/data/input', log_file=False, num_processes=4, ontology='test/test-ontology.owl', output_dir='test/data/output', preprocessor=None, project='test', project_base='projects', reasoner_config=None, split_data_column=None, verbose=True)
+    config = Config(**ns.__dict__)
+
+    # entities are indexed by alias
+    assert config.get_entity('phenologicalObservingProcess')['unique_key'] == 'record_id'
+    assert config.get_entity('doesnt_exist') is None
+
+    # rules are indexed by column
+    assert config.get_rules('record_id') == {'UniqueValue', 'RequiredValue'}
+    assert config.get_rules('year') == {'RequiredValue', 'Integer'}
+    assert config.get_rules('doesnt_exist') == frozenset()
+
+    # no ControlledVocabulary rules are configured
+    assert config.get_list('phenophase_name') is None
+    assert config.get_vocabulary('phenophase_name') is None
+
+
+def test_should_cache_label_lookups():
+    ns = Namespace(chunk_size=50000, config_dir='test/config', data_file=None, drop_invalid=True, input_dir='test/data/input', log_file=False, num_processes=4, ontology='test/test-ontology.owl', output_dir='test/data/output', preprocessor=None, project='test', project_base='projects', reasoner_config=None, split_data_column=None, verbose=True)
+    config = Config(**ns.__dict__)
+
+    info = config.label_cache_info()
+    uri = config._get_uri_from_label('{flower presence}')
+    assert config._get_uri_from_label('{flower presence}') == uri
+    assert config.label_cache_info()['hits'] == info['hits'] + 1
+    assert config.label_cache_info()['misses'] == info['misses'] + 1
+
+
+def test_should_plan_csv_load():
+    ns = Namespace(chunk_size=50000, config_dir='test/config', data_file=None, drop_invalid=True, input_dir='test/data/input', log_file=False, num_processes=4, ontology='test/test-ontology.owl', output_dir='test/data/output', preprocessor=None, project='test', project_base='projects', reasoner_config=None, split_data_column=None, verbose=True)
+    config = Config(**ns.__dict__)
+
+    plan = config.get_load_plan(['record_id', 'notes', 'year', 'latitude', 'source', 'unmapped'])
+
+    # only the mapped, key and rule columns are read, in the order of the file
+    assert plan['usecols'] == ['record_id', 'year', 'latitude', 'source']
+    # Integer and Float columns are converted by the rules
+    assert plan['dtype'] == {'year': str, 'latitude': str}
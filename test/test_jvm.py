@@ -0,0 +1,165 @@
+import asyncio
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+import process.jvm
+from process.jvm import JvmExecutor, JvmJobError, JvmTimeoutError
+from process.worker import RobotWorkerPool
+
+
+# records the heap and start/end time of each job, and fails with an OutOfMemoryError if the heap is < 1024m
+JAVA_STUB = """#!/usr/bin/env python
+import sys, time
+heap = int(sys.argv[1][4:-1])
+with open(sys.argv[2], 'a') as f:
+    f.write('{} {} '.format(heap, time.time()))
+    time.sleep(0.2)
+    f.write('{}\\n'.format(time.time()))
+if heap < 1024:
+    sys.stderr.write('Exception in thread "main" java.lang.OutOfMemoryError: Java heap space\\n')
+    sys.exit(1)
+print('done')
+"""
+
+
+# a RobotWorker that records the start/end time of each job, and replies with a large stdout
+WORKER_STUB = """import json, sys, time
+for line in sys.stdin:
+    job = json.loads(line)
+    with open(job['args'][0], 'a') as f:
+        f.write('{} '.format(time.time()))
+        time.sleep(0.2)
+        f.write('{}\\n'.format(time.time()))
+    print(json.dumps({'id': job['id'], 'exit': 0, 'stdout': 'x' * 100000, 'stderr': ''}), flush=True)
+"""
+
+
+# a RobotWorker that hangs on the jobs with a "hang" arg, and replies with the pid of the worker otherwise
+HANGING_WORKER_STUB = """import json, os, sys, time
+for line in sys.stdin:
+    job = json.loads(line)
+    if job['args'] == ['hang']:
+        time.sleep(60)
+    print(json.dumps({'id': job['id'], 'exit': 0, 'stdout': str(os.getpid()), 'stderr': ''}), flush=True)
+"""
+
+
+@pytest.fixture
+def java(tmpdir, monkeypatch):
+    stub = tmpdir.join('java')
+    stub.write(JAVA_STUB)
+    os.chmod(str(stub), os.stat(str(stub)).st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(process.jvm, 'JAVA', str(stub))
+    return str(tmpdir.join('jobs.log'))
+
+
+def _jobs(log):
+    with open(log) as f:
+        return [tuple(float(v) for v in line.split()) for line in f]
+
+
+def _run_all(executor, args, kind, count, input_file='missing_input'):
+    futures = [executor.apply_async(executor.run, (args, input_file, kind)) for _ in range(count)]
+    return [f.result(timeout=30) for f in futures]
+
+
+def test_should_run_jobs_within_memory_budget(java, tmpdir):
+    input_file = tmpdir.join('input.ttl')
+    input_file.write('x' * 1000)
+
+    with JvmExecutor(3000, 4) as executor:
+        executor.history = {'reason': [[1000, 800]]}
+
+        assert _run_all(executor, [java], 'reason', 4, input_file=str(input_file)) == ['done'] * 4
+
+    jobs = _jobs(java)
+    assert [heap for heap, start, end in jobs] == [1200] * 4
+    # only 2 jobs with a 1200m heap fit in the budget at a time
+    for heap, start, end in jobs:
+        assert sum(1 for h, s, e in jobs if s < end and e > start) <= 2
+
+
+def test_should_retry_out_of_memory_with_more_heap(java):
+    with JvmExecutor(2048, 1) as executor:
+        executor.history = {'query': [[0, 512]]}
+
+        assert _run_all(executor, [java], 'query', 1) == ['done']
+
+    assert [heap for heap, start, end in _jobs(java)] == [512, 1024]
+
+
+def test_should_raise_when_out_of_memory_at_budget(java):
+    with JvmExecutor(512, 1) as executor:
+        with pytest.raises(JvmJobError):
+            _run_all(executor, [java], 'query', 1)
+
+
+def test_should_kill_jobs_that_time_out(java):
+    with JvmExecutor(2048, 1) as executor:
+        executor.history = {'query': [[0, 1024]]}
+
+        future = executor.apply_async(executor.run, ([java], 'missing_input', 'query', 0.05))
+        with pytest.raises(JvmTimeoutError) as err:
+            future.result(timeout=30)
+
+    assert err.value.timeout == 0.05
+    # the job was killed before it could log its end time
+    assert not os.path.exists(java) or all(len(job) < 3 for job in _jobs(java))
+
+
+def test_should_estimate_heap_from_similar_inputs():
+    executor = JvmExecutor(16000, 1)
+
+    # defaults are used until a job has been observed
+    assert executor.estimate_heap('reason', 10 ** 9) == process.jvm.DEFAULT_HEAP_MB['reason']
+
+    executor.history = {'reason': [[10 ** 6, 1000], [10 ** 8, 4000]]}
+
+    # 40 MB per 1 MB of input, with 50% headroom
+    assert executor.estimate_heap('reason', 10 ** 8) == 6000
+    # limited to the budget
+    assert executor.estimate_heap('reason', 10 ** 10) == 16000
+    # and at least MIN_HEAP_MB
+    assert executor.estimate_heap('reason', 10) == process.jvm.MIN_HEAP_MB
+
+
+def test_should_admit_worker_jobs_within_memory_budget(tmpdir):
+    worker = tmpdir.join('worker.py')
+    worker.write(WORKER_STUB)
+    log = str(tmpdir.join('jobs.log'))
+
+    with JvmExecutor(4096, 1, worker_cmd='"{}" "{}"'.format(sys.executable, worker), num_workers=2) as executor:
+        # the replies are larger than the default line limit of the asyncio streams
+        assert _run_all(executor, [log], 'reason', 3) == ['x' * 100000] * 3
+
+    # only 1 job is run at a time, although there are 2 workers
+    jobs = _jobs(log)
+    assert len(jobs) == 3
+    for start, end in jobs:
+        assert sum(1 for s, e in jobs if s < end and e > start) == 1
+
+
+def test_should_replace_worker_killed_by_timeout(tmpdir):
+    worker = tmpdir.join('worker.py')
+    worker.write(HANGING_WORKER_STUB)
+    pool = RobotWorkerPool([sys.executable, str(worker)], 1)
+
+    async def run():
+        first = await pool.run(['ok'])
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.run(['hang']), 1)
+        # the next job is run by a new worker, not the killed one
+        second = await pool.run(['ok'])
+        # the killed worker is dropped
+        alive = [w.alive for w in pool._workers]
+        await pool.close()
+        return first, second, alive
+
+    first, second, alive = asyncio.run(run())
+
+    assert first['stdout'] != second['stdout']
+    assert alive == [True]
@@ -0,0 +1,51 @@
+import json
+
+import process.manifest
+from process.manifest import Manifest
+
+
+def _saved(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_should_batch_saves(tmpdir, monkeypatch):
+    path = str(tmpdir.join('manifest.json'))
+    manifest = Manifest(path, {'config': 'a'}, save_every=3, save_interval=3600)
+    saves = []
+    save = manifest.save
+    monkeypatch.setattr(manifest, 'save', lambda: saves.append(1) or save())
+
+    for i in range(1, 8):
+        manifest.start_chunk('data_{}'.format(i), 'hash')
+        manifest.add_output('data_{}'.format(i), 'triplify', 'data_{}.ttl'.format(i))
+
+    # 7 updates are saved twice, and the last update is pending
+    assert len(saves) == 2
+    assert sorted(_saved(path)['chunks']) == ['data_{}'.format(i) for i in range(1, 7)]
+
+    with manifest:
+        pass
+
+    assert len(saves) == 3
+    assert _saved(path)['chunks']['data_7']['outputs'] == {'triplify': 'data_7.ttl'}
+
+    # nothing is pending, so flushing again doesn't save
+    manifest.flush()
+    assert len(saves) == 3
+
+
+def test_should_save_after_interval(tmpdir, monkeypatch):
+    path = str(tmpdir.join('manifest.json'))
+    now = [0]
+    monkeypatch.setattr(process.manifest.time, 'monotonic', lambda: now[0])
+    manifest = Manifest(path, {'config': 'a'}, save_every=100, save_interval=10)
+
+    manifest.start_chunk('data_1', 'hash')
+    manifest.add_output('data_1', 'triplify', 'data_1.ttl')
+    assert not tmpdir.join('manifest.json').exists()
+
+    now[0] = 10
+    manifest.start_chunk('data_2', 'hash')
+    manifest.add_output('data_2', 'triplify', 'data_2.ttl')
+    assert sorted(_saved(path)['chunks']) == ['data_1', 'data_2']
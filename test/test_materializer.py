@@ -0,0 +1,112 @@
+from process.materializer import TypeMaterializer, read_excluded_types
+from process.rdfio import RDF_TYPE, read_ntriples, read_turtle
+
+ONTOLOGY = 'test/test-ontology.owl'
+SAMPLE_ONTOLOGY = 'test/sample-ontology.owl'
+OBO = 'http://purl.obolibrary.org/obo/'
+NAMED_INDIVIDUAL = '<http://www.w3.org/2002/07/owl#NamedIndividual>'
+
+
+def _types(triples):
+    types = {}
+    for s, p, o in triples:
+        if p == RDF_TYPE:
+            types.setdefault(s, set()).add(o)
+    return types
+
+
+def _materialize(tmpdir, materializer, triples):
+    input_file = tmpdir.join('data.ttl')
+    input_file.write("".join("{} {} {} .\n".format(*t) for t in triples))
+    output_file = str(tmpdir.join('reasoned.ttl'))
+    materializer.materialize(str(input_file), output_file)
+    return list(read_ntriples(output_file))
+
+
+def test_should_compute_ancestors():
+    materializer = TypeMaterializer(ONTOLOGY)
+
+    # plant structures present -> plant structure presence -> plant phenological trait -> quality
+    assert materializer.ancestors(OBO + 'PPO_0002300') >= {OBO + 'PPO_0002300', OBO + 'PPO_0002001',
+                                                           OBO + 'PPO_0002000', OBO + 'PATO_0000001'}
+    assert materializer.ancestors('urn:unknown') == {'urn:unknown'}
+
+
+def test_should_materialize_types(tmpdir):
+    materializer = TypeMaterializer(ONTOLOGY)
+    triples = [
+        ('<urn:trait/1>', RDF_TYPE, '<{}PPO_0002300>'.format(OBO)),
+        ('<urn:trait/1>', '<http://rs.tdwg.org/dwc/terms/year>', '"1988"^^<http://www.w3.org/2001/XMLSchema#int>'),
+        ('<urn:other/1>', RDF_TYPE, '<urn:unknown>'),
+        ('<{}PPO_0002300>'.format(OBO), RDF_TYPE, '<http://www.w3.org/2000/01/rdf-schema#Class>'),
+    ]
+
+    output = _materialize(tmpdir, materializer, triples)
+
+    # the input triples are kept as is
+    assert output[:len(triples)] == triples
+    types = _types(output)
+    assert types['<urn:trait/1>'] == {'<{}>'.format(c) for c in materializer.ancestors(OBO + 'PPO_0002300')} | {
+        NAMED_INDIVIDUAL}
+    assert types['<urn:other/1>'] == {'<urn:unknown>', NAMED_INDIVIDUAL}
+    # classes aren't individuals
+    assert types['<{}PPO_0002300>'.format(OBO)] == {'<http://www.w3.org/2000/01/rdf-schema#Class>'}
+
+
+def test_should_exclude_types(tmpdir):
+    excluded_types = [(OBO + 'PPO_0002001', True, False), (OBO + 'PPO_0002000', False, True)]
+    materializer = TypeMaterializer(ONTOLOGY, excluded_types)
+
+    output = _materialize(tmpdir, materializer, [('<urn:trait/1>', RDF_TYPE, '<{}PPO_0002300>'.format(OBO)),
+                                                 ('<urn:trait/2>', RDF_TYPE, '<{}PPO_0002001>'.format(OBO))])
+
+    types = _types(output)
+    assert types['<urn:trait/1>'] == {'<{}PPO_0002300>'.format(OBO), '<{}PPO_0002000>'.format(OBO),
+                                      '<{}BFO_0000020>'.format(OBO), NAMED_INDIVIDUAL}
+    # asserted types are kept
+    assert types['<urn:trait/2>'] == {'<{}PPO_0002001>'.format(OBO), '<{}PPO_0002000>'.format(OBO),
+                                      NAMED_INDIVIDUAL}
+
+
+def test_should_read_excluded_types():
+    labels = {'plant structure presence': OBO + 'PPO_0002001', 'plant phenological trait': OBO + 'PPO_0002000'}
+
+    excluded_types = read_excluded_types('test/config/excluded_types.csv', lambda label: labels[label])
+
+    assert excluded_types == [(OBO + 'PPO_0002000', False, True), (OBO + 'PPO_0002001', True, False),
+                              (OBO + 'PPO_0002000', False, True)]
+
+
+def test_should_infer_the_same_types_as_robot(tmpdir):
+    """
+    sample_data/reasoned_data.ttl is the robot output for sample_data/unreasoned_data.ttl. test/sample-ontology.owl
+    is the class hierarchy of its imports closure, trimmed to the classes of the sample data
+    """
+    materializer = TypeMaterializer(SAMPLE_ONTOLOGY)
+    output_file = str(tmpdir.join('reasoned.ttl'))
+
+    materializer.materialize('sample_data/unreasoned_data.ttl', output_file)
+
+    expected = {s: types for s, types in _types(read_turtle('sample_data/reasoned_data.ttl')).items()
+                if NAMED_INDIVIDUAL in types}
+    actual = {s: types for s, types in _types(read_ntriples(output_file)).items() if s in expected}
+    assert actual == expected
+
+
+def test_should_compute_ancestors_of_equivalent_classes(tmpdir):
+    ontology = tmpdir.join('ontology.owl')
+    ontology.write('''<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:owl="http://www.w3.org/2002/07/owl#"
+         xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#">
+    <owl:Class rdf:about="urn:a"><rdfs:subClassOf rdf:resource="urn:b"/></owl:Class>
+    <owl:Class rdf:about="urn:b"><owl:equivalentClass rdf:resource="urn:c"/></owl:Class>
+    <owl:Class rdf:about="urn:c"><rdfs:subClassOf rdf:resource="urn:d"/></owl:Class>
+    <owl:Class rdf:about="urn:d"><rdfs:subClassOf rdf:resource="http://www.w3.org/2002/07/owl#Thing"/></owl:Class>
+</rdf:RDF>
+''')
+
+    materializer = TypeMaterializer(str(ontology))
+
+    assert materializer.ancestors('urn:a') == {'urn:a', 'urn:b', 'urn:c', 'urn:d'}
+    assert materializer.ancestors('urn:c') == {'urn:b', 'urn:c', 'urn:d'}
@@ -0,0 +1,82 @@
+import gzip
+import os
+
+import process.merger
+from process.merger import MAX_NAME_LENGTH, CsvMerger, _safe_name, sort_csv
+
+
+def _write_run(tmpdir, name, rows):
+    csv_file = tmpdir.join(name + '.csv')
+    csv_file.write('id,kind,traits\n' + ''.join(row + '\n' for row in rows))
+    run_file = str(tmpdir.join(name + '.run.csv'))
+    sort_csv(str(csv_file), run_file)
+    return run_file
+
+
+def _read(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        return f.read().splitlines()
+
+
+def test_should_sort_csv_without_duplicates(tmpdir):
+    run_file = _write_run(tmpdir, 'data_1', ['3,a,x', '1,b,"y|z"', '3,a,x', '2,a,x'])
+
+    assert _read(run_file) == ['id,kind,traits', '1,b,y|z', '2,a,x', '3,a,x']
+
+
+def test_should_merge_runs_without_duplicates(tmpdir):
+    runs = [_write_run(tmpdir, 'data_1', ['1,a,x', '4,a,x', '3,b,x']),
+            _write_run(tmpdir, 'data_2', ['2,a,x', '3,b,x', '5,b,"multi\nline"'])]
+    output_dir = str(tmpdir.join('merged'))
+
+    files, count = CsvMerger(output_dir, str(tmpdir.join('work'))).merge(runs)
+
+    assert files == [os.path.join(output_dir, 'part_0001.csv')]
+    assert count == 5
+    assert _read(files[0]) == ['id,kind,traits', '1,a,x', '2,a,x', '3,b,x', '4,a,x', '5,b,"multi', 'line"']
+
+
+def test_should_partition_merged_rows(tmpdir, monkeypatch):
+    # the runs are merged in several passes, and the partition files are closed and appended to
+    monkeypatch.setattr(process.merger, 'MAX_FAN_IN', 2)
+    monkeypatch.setattr(process.merger, 'MAX_OPEN_PARTITIONS', 1)
+    runs = [_write_run(tmpdir, 'data_{}'.format(i), ['{},{},x'.format(i, 'a' if i % 2 else 'b/c')])
+            for i in range(1, 6)]
+    output_dir = str(tmpdir.join('merged'))
+
+    files, count = CsvMerger(output_dir, str(tmpdir.join('work')), partition_column='kind', target_bytes=32,
+                             compress=True).merge(runs)
+
+    assert count == 5
+    assert sorted(os.path.relpath(f, output_dir) for f in files) == [
+        'kind=a/part_0001.csv.gz', 'kind=a/part_0002.csv.gz', 'kind=b%2Fc/part_0001.csv.gz']
+    assert _read(os.path.join(output_dir, 'kind=a', 'part_0001.csv.gz')) == ['id,kind,traits', '1,a,x', '3,a,x']
+    assert _read(os.path.join(output_dir, 'kind=a', 'part_0002.csv.gz')) == ['id,kind,traits', '5,a,x']
+    assert _read(os.path.join(output_dir, 'kind=b%2Fc', 'part_0001.csv.gz')) == ['id,kind,traits', '2,b/c,x',
+                                                                               '4,b/c,x']
+    assert os.listdir(str(tmpdir.join('work'))) == []
+
+
+def test_should_write_distinct_values_to_distinct_partitions(tmpdir):
+    values = ['a/b', 'a_b', 'a%2Fb', '', 'é', '..']
+    runs = [_write_run(tmpdir, 'data_1', ['{},{},x'.format(i, v) for i, v in enumerate(values)])]
+    output_dir = str(tmpdir.join('merged'))
+
+    files, count = CsvMerger(output_dir, str(tmpdir.join('work')), partition_column='kind').merge(runs)
+
+    assert count == len(values)
+    assert len(set(os.path.dirname(f) for f in files)) == len(values)
+    for i, value in enumerate(values):
+        assert _read(os.path.join(output_dir, 'kind=' + _safe_name(value), 'part_0001.csv')) == [
+            'id,kind,traits', '{},{},x'.format(i, value)]
+
+
+def test_should_hash_long_partition_names():
+    long_values = ['x' * 300 + 'a', 'x' * 300 + 'b']
+
+    names = [_safe_name(v) for v in long_values]
+
+    assert names[0] != names[1]
+    assert all(len(name) == MAX_NAME_LENGTH and '~' in name for name in names)
+    assert _safe_name('a b%') == 'a%20b%25'
@@ -0,0 +1,51 @@
+import os
+
+from process.ontology import OntologyCache, _imports
+
+REASONER_CONFIG = 'test/config/reasoner.conf'
+
+ONTOLOGY = '''<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:owl="http://www.w3.org/2002/07/owl#">
+    <owl:Ontology rdf:about="urn:test:ontology">
+        <owl:imports rdf:resource="{}"/>
+    </owl:Ontology>
+</rdf:RDF>
+'''
+
+
+def _run_robot(runs):
+    def run_robot(args, input_file):
+        runs.append(args)
+        with open(args[args.index('-o') + 1], 'w') as f:
+            f.write('classified')
+    return run_robot
+
+
+def test_should_key_cache_by_imports_closure(tmpdir):
+    ontology = tmpdir.join('ontology.owl')
+    ontology.write(ONTOLOGY.format('imports/base.owl'))
+    tmpdir.mkdir('imports').join('base.owl').write('<rdf:RDF/>')
+    cache = OntologyCache(str(tmpdir.join('cache')), 'robot.jar', REASONER_CONFIG)
+    runs = []
+
+    first = cache.prepare(str(ontology), _run_robot(runs))
+    assert cache.prepare(str(ontology), _run_robot(runs)) == first
+    assert len(runs) == 1
+
+    # the root ontology is unchanged, but its import now imports another ontology
+    tmpdir.join('imports', 'base.owl').write(ONTOLOGY.format('file:' + str(tmpdir.join('other.owl'))))
+    tmpdir.join('other.owl').write('<rdf:RDF/>')
+    second = cache.prepare(str(ontology), _run_robot(runs))
+
+    assert second != first
+    assert len(runs) == 2
+    assert os.path.exists(second)
+
+
+def test_should_find_imports_in_each_syntax():
+    assert _imports(ONTOLOGY.format('a.owl').encode('utf-8')) == [b'a.owl']
+    assert _imports(b'<urn:o> a owl:Ontology ;\n owl:imports <a.owl>, <b.owl> .') == [b'a.owl', b'b.owl']
+    assert _imports(b'<urn:o> <http://www.w3.org/2002/07/owl#imports> <a.owl> .') == [b'a.owl']
+    assert _imports(b'<Ontology><Import>a.owl</Import></Ontology>') == [b'a.owl']
+    assert _imports(b'Ontology(<urn:o>\nImport(<a.owl>)\n)') == [b'a.owl']
@@ -0,0 +1,309 @@
+import csv
+import logging
+import os
+import re
+import sys
+
+import pytest
+
+import process.jvm
+from process.process import Process
+from process.rdfio import read_ntriples
+
+
+class Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+ROBOT_STUB = os.path.join(os.path.dirname(__file__), 'robot_stub.py')
+
+
+@pytest.fixture
+def config(tmpdir, monkeypatch):
+    from process.config import Config
+
+    # robot is not run in the tests
+    monkeypatch.setattr(process.jvm, 'JAVA', ROBOT_STUB)
+
+    def make_config(data_file, **kwargs):
+        args = dict(chunk_size=2, config_dir='test/config', data_file=str(data_file), drop_invalid=True,
+                    log_file=False, num_processes=2, ontology='test/test-ontology.owl', output_dir=str(tmpdir),
+                    reasoner_config=None, verbose=False)
+        args.update(kwargs)
+        return Config(**Namespace(**args).__dict__)
+
+    return make_config
+
+
+def _write_data(tmpdir, num_rows):
+    data_file = tmpdir.join('data.csv')
+    rows = ["{},1988,120,-12.99,13.00,me,{{flower presence}},unmapped".format(i) for i in range(1, num_rows + 1)]
+    data_file.write("record_id,year,day_of_year,latitude,longitude,source,phenophase_name,notes\n" +
+                    "\n".join(rows) + "\n")
+    return data_file
+
+
+def test_should_run_all_stages(config, tmpdir):
+    config = config(_write_data(tmpdir, 5))
+
+    Process(config).run()
+
+    assert sorted(os.listdir(config.output_unreasoned_dir)) == ['data_1.ttl', 'data_2.ttl', 'data_3.ttl']
+    assert sorted(os.listdir(config.output_reasoned_dir)) == ['data_1.ttl', 'data_2.ttl', 'data_3.ttl']
+    assert sorted(os.listdir(config.output_reasoned_csv_dir)) == ['data_1.ttl.csv', 'data_2.ttl.csv',
+                                                                  'data_3.ttl.csv']
+
+    with open(os.path.join(config.output_unreasoned_dir, 'data_3.ttl')) as f:
+        triples = f.read().splitlines()
+    assert '<http://n2t.net/ark:/21547/Anm25> <http://rs.tdwg.org/dwc/terms/EventID> ' \
+           '"5"^^<http://www.w3.org/2001/XMLSchema#integer> .' in triples
+
+
+def test_should_resume_changed_and_failed_chunks(config, tmpdir):
+    Process(config(_write_data(tmpdir, 5))).run()
+
+    # mark the outputs that should be reused, and remove the output of a "failed" stage
+    config = config(_write_data(tmpdir, 7), resume=True)
+    for dir in [config.output_unreasoned_dir, config.output_reasoned_dir]:
+        with open(os.path.join(dir, 'data_2.ttl'), 'w') as f:
+            f.write('unchanged')
+    os.remove(os.path.join(config.output_reasoned_csv_dir, 'data_1.ttl.csv'))
+    with open(os.path.join(config.output_reasoned_dir, 'data_1.ttl'), 'w') as f:
+        f.write('reasoned')
+
+    Process(config).run()
+
+    assert sorted(os.listdir(config.output_reasoned_csv_dir)) == ['data_1.ttl.csv', 'data_2.ttl.csv',
+                                                                  'data_3.ttl.csv', 'data_4.ttl.csv']
+    for dir in [config.output_unreasoned_dir, config.output_reasoned_dir]:
+        with open(os.path.join(dir, 'data_2.ttl')) as f:
+            assert f.read() == 'unchanged'
+
+    # only the rdf2csv stage is run again for data_1
+    with open(os.path.join(config.output_reasoned_dir, 'data_1.ttl')) as f:
+        assert f.read() == 'reasoned'
+
+    # data_3 changed, so it is triplified again
+    with open(os.path.join(config.output_unreasoned_dir, 'data_3.ttl')) as f:
+        assert '"6"^^<http://www.w3.org/2001/XMLSchema#integer>' in f.read()
+
+
+def test_should_remove_outputs_of_chunks_no_longer_in_input(config, tmpdir):
+    Process(config(_write_data(tmpdir, 5))).run()
+
+    config = config(_write_data(tmpdir, 3), resume=True)
+    Process(config).run()
+
+    assert sorted(os.listdir(config.output_unreasoned_dir)) == ['data_1.ttl', 'data_2.ttl']
+    assert sorted(os.listdir(config.output_reasoned_csv_dir)) == ['data_1.ttl.csv', 'data_2.ttl.csv']
+
+
+def test_should_triplify_same_data_with_parallel_read(config, tmpdir):
+    data_file = _write_data(tmpdir, 5)
+
+    config = config(data_file)
+    Process(config).run()
+    expected = {}
+    for file in os.listdir(config.output_unreasoned_dir):
+        with open(os.path.join(config.output_unreasoned_dir, file)) as f:
+            expected[file] = sorted(f.read().splitlines())
+
+    Process(config.__class__(**dict(config.__dict__, parallel_read=True))).run()
+
+    for file, triples in expected.items():
+        with open(os.path.join(config.output_unreasoned_dir, file)) as f:
+            assert sorted(f.read().splitlines()) == triples
+
+
+def test_should_run_robot_in_workers(config, tmpdir, monkeypatch):
+    log = tmpdir.join('workers.log')
+    monkeypatch.setenv('ROBOT_STUB_LOG', str(log))
+
+    config = config(_write_data(tmpdir, 5), robot_worker='"{}" "{}" --worker'.format(sys.executable, ROBOT_STUB),
+                    robot_workers=2)
+    Process(config).run()
+
+    assert sorted(os.listdir(config.output_reasoned_csv_dir)) == ['data_1.ttl.csv', 'data_2.ttl.csv',
+                                                                  'data_3.ttl.csv']
+    # 3 reason and 3 query jobs are run by at most 2 workers
+    pids = log.read().splitlines()
+    assert len(pids) == 6
+    assert len(set(pids)) <= 2
+
+
+@pytest.mark.parametrize('keep_reasoned', [False, True])
+def test_should_chain_reasoning_and_query(config, tmpdir, keep_reasoned):
+    config = config(_write_data(tmpdir, 5), chain_query=True, keep_reasoned=keep_reasoned)
+    Process(config).run()
+
+    assert sorted(os.listdir(config.output_reasoned_csv_dir)) == ['data_1.ttl.csv', 'data_2.ttl.csv',
+                                                                  'data_3.ttl.csv']
+    expected = ['data_1.ttl', 'data_2.ttl', 'data_3.ttl'] if keep_reasoned else []
+    assert sorted(os.listdir(config.output_reasoned_dir)) == expected
+
+
+def test_should_reason_with_cached_ontology(config, tmpdir, monkeypatch):
+    log = tmpdir.join('robot.log')
+    monkeypatch.setenv('ROBOT_STUB_LOG', str(log))
+    cache_dir = tmpdir.join('ontology_cache')
+
+    for i in range(2):
+        Process(config(_write_data(tmpdir, 3), ontology_cache=str(cache_dir))).run()
+
+    # the ontology is prepared once, and each robot command resolves it with the catalog
+    commands = log.read().splitlines()
+    assert sum(1 for c in commands if 'merge' in c) == 1
+    catalogs = [c.split()[c.split().index('--catalog') + 1] for c in commands if 'merge' not in c]
+    assert len(catalogs) == 8
+    assert all(os.path.exists(c) for c in catalogs)
+
+
+def test_should_reason_with_native_engine(config, tmpdir, monkeypatch):
+    log = tmpdir.join('robot.log')
+    monkeypatch.setenv('ROBOT_STUB_LOG', str(log))
+    config = config(_write_data(tmpdir, 3), reasoner_engine='native')
+
+    Process(config).run()
+
+    assert sorted(os.listdir(config.output_reasoned_dir)) == ['data_1.ttl', 'data_2.ttl']
+    with open(os.path.join(config.output_reasoned_dir, 'data_1.ttl')) as f:
+        reasoned = f.read()
+    assert '<http://www.w3.org/2002/07/owl#NamedIndividual>' in reasoned
+
+    # only the queries are run by robot
+    commands = log.read().splitlines()
+    assert len(commands) == 2
+    assert all('reason' not in c.split() for c in commands)
+
+
+def test_should_coalesce_chunks_into_reasoning_units(config, tmpdir, monkeypatch):
+    log = tmpdir.join('robot.log')
+    monkeypatch.setenv('ROBOT_STUB_LOG', str(log))
+    config = config(_write_data(tmpdir, 5), batch_size=1, reason_batch_triples=30)
+
+    Process(config).run()
+
+    def instance_triples(dir):
+        triples = []
+        for file in sorted(os.listdir(dir)):
+            if file.endswith('.ttl'):
+                with open(os.path.join(dir, file)) as f:
+                    triples.extend(t for t in f.read().splitlines() if t.startswith('<http://n2t.net'))
+        return sorted(triples)
+
+    units = sorted(f for f in os.listdir(config.output_units_dir) if f.endswith('.ttl'))
+    # 9 triples per row, so 3 rows fit in each unit instead of the 2 rows of each chunk
+    assert len(units) == 2
+    # each instance triple is reasoned once, and each unit has the ontology import
+    assert instance_triples(config.output_units_dir) == instance_triples(config.output_unreasoned_dir)
+    for unit in units:
+        with open(os.path.join(config.output_units_dir, unit)) as f:
+            assert 'owl#imports' in f.read()
+    assert sorted(os.listdir(config.output_reasoned_dir)) == units
+    assert sorted(os.listdir(config.output_reasoned_csv_dir)) == [u + '.csv' for u in units]
+
+    # the units are reused by a resumed run
+    log.write('')
+    Process(config.__class__(**dict(config.__dict__, resume=True))).run()
+    assert log.read() == ''
+
+
+def test_should_quarantine_triples_that_fail_reasoning(config, tmpdir, monkeypatch):
+    # the reasoner fails on the triples of record 4
+    monkeypatch.setenv('ROBOT_STUB_FAIL', '"4"^^')
+    config = config(_write_data(tmpdir, 5))
+
+    Process(config).run()
+
+    # the other record in the chunk is still reasoned
+    assert sorted(os.listdir(config.output_reasoned_dir)) == ['data_1.ttl', 'data_2.ttl', 'data_3.ttl']
+    with open(os.path.join(config.output_reasoned_dir, 'data_2.ttl')) as f:
+        reasoned = f.read()
+    assert '"3"^^<http://www.w3.org/2001/XMLSchema#integer>' in reasoned
+    assert '"4"^^' not in reasoned
+
+    with open(config.quarantine_report_file) as f:
+        report = list(csv.DictReader(f))
+    # all the triples of the entities of record 4 are quarantined together
+    assert len(report) > 1
+    assert {row['file'] for row in report} == {'data_2.ttl'}
+    assert len({row['record'] for row in report}) == 1
+    assert any('"4"^^' in row['triple'] for row in report)
+    assert all('24>' in row['triple'] for row in report)
+    assert not os.path.exists(config.bisect_dir)
+
+
+def test_should_only_keep_instance_triples_with_abox_only(config, tmpdir):
+    config = config(_write_data(tmpdir, 3), reasoner_engine='native', abox_only=True)
+
+    Process(config).run()
+
+    triples = list(read_ntriples(os.path.join(config.output_reasoned_dir, 'data_1.ttl')))
+    roots = tuple('<' + entity['identifier_root'] for entity in config.entities)
+    assert triples
+    assert all(s.startswith(roots) for s, p, o in triples)
+    assert ('<http://n2t.net/ark:/21547/Anl21>', '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>',
+            '<http://www.w3.org/2002/07/owl#NamedIndividual>') in triples
+
+
+def test_should_compress_reasoned_csv(config, tmpdir, monkeypatch):
+    log = tmpdir.join('robot.log')
+    monkeypatch.setenv('ROBOT_STUB_LOG', str(log))
+    Process(config(_write_data(tmpdir, 3), compress_csv=True)).run()
+
+    config = config(_write_data(tmpdir, 3), compress_csv=True, resume=True)
+    assert sorted(os.listdir(config.output_reasoned_csv_dir)) == ['data_1.ttl.csv.gz', 'data_2.ttl.csv.gz']
+
+    # the compressed outputs are reused
+    log.write('')
+    Process(config).run()
+    assert log.read() == ''
+
+
+def test_should_merge_reasoned_csv(config, tmpdir):
+    first = config(_write_data(tmpdir, 5), merge_csv=True)
+
+    Process(first).run()
+
+    with open(os.path.join(first.output_merged_csv_dir, 'part_0001.csv')) as f:
+        assert f.read().splitlines() == ['observationID', '1', '2', '3', '4', '5']
+    assert os.listdir(first.merge_runs_dir) == []
+
+    # the runs of the reused csv files are sorted again
+    resumed = config(_write_data(tmpdir, 5), merge_csv=True, partition_column='observationID', resume=True)
+    Process(resumed).run()
+
+    assert sorted(os.listdir(resumed.output_merged_csv_dir)) == ['observationID={}'.format(i) for i in range(1, 6)]
+
+
+def test_should_convert_to_csv_with_native_engine(config, tmpdir, monkeypatch):
+    log = tmpdir.join('robot.log')
+    monkeypatch.setenv('ROBOT_STUB_LOG', str(log))
+    config = config(_write_data(tmpdir, 3), rdf2csv_engine='native')
+
+    Process(config).run()
+
+    with open(os.path.join(config.output_reasoned_csv_dir, 'data_1.ttl.csv')) as f:
+        rows = list(csv.DictReader(f))
+    assert [row['record_id'] for row in rows] == ['1', '2']
+    assert rows[0]['phenophase_name'] == 'obo:PPO_0002027'
+
+    # only the reasoner is run by robot
+    commands = log.read().splitlines()
+    assert len(commands) == 2
+    assert all('query' not in c.split() for c in commands)
+
+
+def test_should_log_label_cache_stats_once_per_run(config, tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    config = config(_write_data(tmpdir, 3))
+    main_info = dict(config.label_cache_info())
+
+    Process(config).run()
+
+    lines = [r.getMessage() for r in caplog.records if r.getMessage().startswith('label cache:')]
+    assert len(lines) == 1
+    hits, misses = (int(v) for v in re.match(r'label cache: (\d+) hits, (\d+) misses', lines[0]).groups())
+    # the lookups made by the workers while triplifying are included
+    assert hits + misses > main_info['hits'] + main_info['misses']
@@ -0,0 +1,76 @@
+import csv
+
+from process.projector import Projector
+
+DWC = 'http://rs.tdwg.org/dwc/terms/'
+OBO = 'http://purl.obolibrary.org/obo/'
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+
+def _entity(alias, columns):
+    return {'alias': alias, 'identifier_root': 'urn:{}/'.format(alias), 'columns': columns}
+
+
+# layout of the sample_data/fetch_reasoned.sparql query
+SAMPLE_ENTITIES = [
+    _entity('vertTraitObsProc', [('observationID', DWC + 'eventID'), ('decimalLatitude', DWC + 'decimalLatitude'),
+                                 ('decimalLongitude', DWC + 'decimalLongitude'), ('country', DWC + 'country'),
+                                 ('locality', DWC + 'locality'), ('samplingProtocol', DWC + 'samplingProtocol'),
+                                 ('yearCollected', DWC + 'year')]),
+    _entity('vertOrg', [('individualID', DWC + 'individualID'), ('materialSampleID', DWC + 'materialSampleID'),
+                        ('scientificName', DWC + 'scientificName'), ('genus', DWC + 'genus'),
+                        ('specificEpithet', DWC + 'specificEpithet'), ('basisOfRecord', DWC + 'basisOfRecord'),
+                        ('lifeStage', DWC + 'lifeStage'), ('sex', DWC + 'sex'),
+                        ('projectID', DWC + 'collectionCode')]),
+    _entity('measurementDatum', [('measurementValue', DWC + 'measurementValue'),
+                                 ('measurementUnit', DWC + 'measurementUnit'),
+                                 ('measurementMethod', DWC + 'measurementMethod')]),
+    _entity('vertTrait', [('measurementType', DWC + 'measurementType'), ('traits', RDF_TYPE)]),
+]
+SAMPLE_RELATIONS = [
+    {'subject_entity_alias': 'measurementDatum', 'predicate': OBO + 'IAO_0000136', 'object_entity_alias': 'vertTrait'},
+    {'subject_entity_alias': 'vertTrait', 'predicate': OBO + 'RO_0000052', 'object_entity_alias': 'vertOrg'},
+    {'subject_entity_alias': 'vertTraitObsProc', 'predicate': OBO + 'OBI_0000299',
+     'object_entity_alias': 'measurementDatum'},
+    {'subject_entity_alias': 'vertOrg', 'predicate': OBO + 'OBI_0000295', 'object_entity_alias': 'vertTraitObsProc'},
+]
+
+def _rows(path):
+    """
+    :return: sorted list of the rows as (column, value) tuples. The order of the traits isn't significant
+    """
+    with open(path) as f:
+        return sorted(tuple(sorted((k, '|'.join(sorted(v.split('|'))) if k == 'traits' else v) for k, v in row.items()))
+                      for row in csv.DictReader(f))
+
+
+def test_should_project_same_rows_as_sparql_query(tmpdir):
+    output_file = str(tmpdir.join('reasoned_data.ttl.csv'))
+    projector = Projector(SAMPLE_ENTITIES, SAMPLE_RELATIONS)
+
+    count = projector.project('sample_data/reasoned_data.ttl', output_file)
+
+    assert projector.root_entity == 'vertTrait'
+    assert count == 16
+    assert _rows(output_file) == _rows('sample_data/reasoned_data.ttl.csv')
+
+
+def test_should_only_write_rows_where_all_relations_hold(tmpdir):
+    entities = [_entity('a', [('name', DWC + 'name'), ('types', RDF_TYPE)]), _entity('b', [('value', DWC + 'value')])]
+    relations = [{'subject_entity_alias': 'a', 'predicate': OBO + 'rel', 'object_entity_alias': 'b'}]
+    input_file = tmpdir.join('data.ttl')
+    input_file.write('<urn:a/1> <{dwc}name> "one\\"s" .\n'
+                     '<urn:a/1> <{type}> <{obo}A> .\n'
+                     '<urn:a/1> <{type}> <http://www.w3.org/2002/07/owl#NamedIndividual> .\n'
+                     '<urn:a/1> <{type}> <{obo}B> .\n'
+                     '<urn:a/1> <{obo}rel> <urn:b/1> .\n'
+                     '<urn:b/1> <{dwc}value> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .\n'
+                     '<urn:a/2> <{dwc}name> "two" .\n'
+                     '<http://example.com/ontology> <{type}> <http://www.w3.org/2002/07/owl#Ontology> .\n'
+                     .format(dwc=DWC, obo=OBO, type=RDF_TYPE))
+    output_file = tmpdir.join('data.ttl.csv')
+
+    Projector(entities, relations).project(str(input_file), str(output_file))
+
+    # a/2 isn't related to a b individual
+    assert output_file.read() == 'name,types,value\n"one""s",{obo}A|{obo}B,1\n'.format(obo=OBO)
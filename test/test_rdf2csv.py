@@ -0,0 +1,59 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from process.rdf2csv import DEFAULT_PREFIXES, compact_prefixes, read_sparql_prefixes
+
+
+def test_should_read_prefixes_from_sparql():
+    prefixes = read_sparql_prefixes('test/config/fetch_reasoned.sparql')
+
+    assert prefixes['obo'] == 'http://purl.obolibrary.org/obo/'
+    assert prefixes['dwc'] == 'http://rs.tdwg.org/dwc/terms/'
+    assert read_sparql_prefixes(None) == DEFAULT_PREFIXES
+
+
+def test_should_compact_prefixes_in_one_pass(tmpdir):
+    csv_file = tmpdir.join('data.ttl.csv')
+    csv_file.write("id,traits\n"
+                   "1,http://purl.obolibrary.org/obo/PATO_1|https://purl.obolibrary.org/obo/PATO_2\n"
+                   "2,http://example.com/a/b/c|http://example.com/a/d|urn:x\n")
+
+    output_file = compact_prefixes(str(csv_file), {'obo': 'http://purl.obolibrary.org/obo/',
+                                                   'a': 'http://example.com/a/', 'c': 'http://example.com/a/b/',
+                                                   'urn': 'urn:'})
+
+    assert output_file == str(csv_file)
+    assert csv_file.read() == "id,traits\n1,obo:PATO_1|obo:PATO_2\n2,c:c|a:d|urn:x\n"
+    assert os.listdir(str(tmpdir)) == ['data.ttl.csv']
+
+
+def test_should_compress_compacted_file(tmpdir):
+    csv_file = tmpdir.join('data.ttl.csv')
+    csv_file.write("id,traits\n1,http://purl.obolibrary.org/obo/PATO_1\n")
+
+    output_file = compact_prefixes(str(csv_file), compress=True)
+
+    assert output_file == str(csv_file) + '.gz'
+    assert os.listdir(str(tmpdir)) == ['data.ttl.csv.gz']
+    with gzip.open(output_file, 'rt') as f:
+        assert f.read() == "id,traits\n1,obo:PATO_1\n"
+
+
+def test_should_compact_files_concurrently(tmpdir, capsys):
+    # the stages compact their csv files in the executor threads, so files must not share any global state, ex: the
+    # sys.stdout swapped by fileinput inplace editing
+    files = []
+    for i in range(8):
+        csv_file = tmpdir.join('data_{}.ttl.csv'.format(i))
+        csv_file.write("id,traits\n" + "{},http://purl.obolibrary.org/obo/PATO_{}\n".format(i, i) * 1000)
+        files.append(str(csv_file))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        outputs = list(executor.map(compact_prefixes, files))
+
+    assert outputs == files
+    for i, output_file in enumerate(outputs):
+        with open(output_file) as f:
+            assert f.read() == "id,traits\n" + "{},obo:PATO_{}\n".format(i, i) * 1000
+    assert capsys.readouterr().out == ''
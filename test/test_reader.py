@@ -0,0 +1,134 @@
+import sys
+
+import pandas as pd
+import pytest
+
+from process.reader import ColumnarReader, CsvReader, get_reader, split_csv
+
+
+def test_should_split_csv_at_records(tmpdir):
+    data_file = tmpdir.join('data.csv')
+    rows = ['{},"multi\nline, ""quoted""",{}'.format(i, i * 0.5) if i % 3 else '{},plain,{}'.format(i, i * 0.5)
+            for i in range(100)]
+    data_file.write('id,"text",value\n' + '\n'.join(rows) + '\n')
+
+    for block_size in [5, 64, 1024 * 1024]:
+        ranges = list(split_csv(str(data_file), 10, block_size=block_size))
+
+        assert len(ranges) > 5
+        assert all(r.columns == ['id', 'text', 'value'] for r in ranges)
+
+        data = pd.concat([r.read() for r in ranges], ignore_index=True)
+        assert data.equals(pd.read_csv(str(data_file), skipinitialspace=True))
+
+
+def test_should_hash_ranges_by_content(tmpdir):
+    data_file = tmpdir.join('data.csv')
+    data_file.write('id,value\n' + ''.join('{},a\n'.format(i) for i in range(20)))
+    before = [r.input_hash for r in split_csv(str(data_file), 5)]
+
+    data_file.write('id,value\n' + ''.join('{},a\n'.format(i) for i in range(25)))
+    after = [r.input_hash for r in split_csv(str(data_file), 5)]
+
+    assert before[:-1] == after[:len(before) - 1]
+    assert len(after) > len(before)
+
+
+class Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+@pytest.fixture
+def config(tmpdir):
+    from process.config import Config
+
+    def make_config(data_file, **kwargs):
+        args = dict(chunk_size=2, config_dir='test/config', data_file=str(data_file), drop_invalid=True,
+                    log_file=False, num_processes=1, ontology='test/test-ontology.owl', output_dir=str(tmpdir),
+                    reasoner_config=None, verbose=False)
+        args.update(kwargs)
+        return Config(**Namespace(**args).__dict__)
+
+    return make_config
+
+
+DATA = pd.DataFrame({
+    'record_id': [1, 2, 3, 4, 5],
+    'year': ['1988', '1989', '1990', '1991', '1992'],
+    'notes': ['a', 'b', 'c', 'd', 'e'],
+})
+
+
+def test_should_read_compressed_csv(config, tmpdir):
+    data_file = str(tmpdir.join('data.csv.gz'))
+    DATA.to_csv(data_file, index=False)
+
+    reader = get_reader(config(data_file, parallel_read=True))
+    assert isinstance(reader, CsvReader)
+
+    chunks = [chunk for chunk, input_hash in reader.chunks()]
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert list(chunks[0].columns) == ['record_id', 'year']
+    assert list(pd.concat(chunks)['year']) == list(DATA['year'])
+
+
+@pytest.mark.parametrize('parallel_read', [False, True])
+def test_should_read_zstandard_csv(config, tmpdir, parallel_read):
+    zstandard = pytest.importorskip('zstandard')
+    data_file = str(tmpdir.join('data.csv.zst'))
+    with zstandard.open(data_file, 'wt') as f:
+        DATA.to_csv(f, index=False)
+
+    reader = get_reader(config(data_file, parallel_read=parallel_read))
+    assert isinstance(reader, CsvReader)
+
+    chunks = [chunk for chunk, input_hash in reader.chunks()]
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert list(chunks[0].columns) == ['record_id', 'year']
+    assert list(pd.concat(chunks)['year']) == list(DATA['year'])
+
+
+def test_should_not_split_zstandard_csv(config, tmpdir, monkeypatch):
+    # zstandard files are never split into byte ranges, and need zstandard to be read
+    monkeypatch.setitem(sys.modules, 'zstandard', None)
+    data_file = tmpdir.join('data.csv.zst')
+    data_file.write_binary(b'\x28\xb5\x2f\xfd')
+
+    reader = get_reader(config(str(data_file), parallel_read=True))
+
+    assert isinstance(reader, CsvReader)
+    with pytest.raises(RuntimeError, match='zstandard is required'):
+        next(reader.chunks())
+
+
+def test_should_read_parquet_row_groups(config, tmpdir):
+    pytest.importorskip('pyarrow')
+
+    data_file = str(tmpdir.join('data.parquet'))
+    # year is an Integer rule column, which is read as str like the csv readers do
+    DATA.assign(year=DATA['year'].astype(int)).to_parquet(data_file, index=False, row_group_size=3)
+
+    reader = get_reader(config(data_file))
+    assert isinstance(reader, ColumnarReader)
+
+    chunks = [chunk for chunk, input_hash in reader.chunks()]
+    # the row groups of 3 and 2 rows are sliced into chunks of at most chunk_size rows
+    assert [len(c) for c in chunks] == [2, 1, 2]
+    assert list(chunks[0].columns) == ['record_id', 'year']
+    assert list(pd.concat(chunks)['year']) == list(DATA['year'])
+
+
+def test_should_read_arrow_record_batches(config, tmpdir):
+    pa = pytest.importorskip('pyarrow')
+
+    data_file = str(tmpdir.join('data.arrow'))
+    table = pa.Table.from_pandas(DATA, preserve_index=False)
+    with pa.ipc.new_file(data_file, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=3):
+            writer.write_batch(batch)
+
+    chunks = [chunk for chunk, input_hash in get_reader(config(data_file)).chunks()]
+
+    assert [len(c) for c in chunks] == [2, 1, 2]
+    assert list(pd.concat(chunks)['record_id']) == list(DATA['record_id'])
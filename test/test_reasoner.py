@@ -0,0 +1,30 @@
+import pytest
+
+from process.reasoner import reasoner_args, reasoner_settings
+
+
+def test_should_build_reasoner_args_from_config():
+    args = reasoner_args('data.ttl', 'reasoned.ttl', 'test/config/reasoner.conf', 'robot.jar')
+
+    assert args == ['-jar', 'robot.jar', 'reason', '-i', 'data.ttl', '-r', 'elk', '--axiom-generators',
+                    '"InverseObjectProperties ClassAssertion"', '--include-indirect', 'true', '--exclude-tautologies',
+                    'structural', 'reduce', '-o', 'reasoned.ttl']
+
+
+def test_should_parse_reasoner_settings(tmpdir):
+    config_file = tmpdir.join('reasoner.conf')
+    config_file.write("[Reasoning]\nreasoner = HermiT\ninferences = types, subclasses\nannotate_inferred = True\n"
+                      "preprocess_inverses = False\n")
+
+    assert reasoner_settings(str(config_file)) == {
+        'reasoner': 'hermit',
+        'axiom_generators': ['ClassAssertion', 'SubClass'],
+        'annotate_inferred': True,
+        'excluded_types_file': None,
+    }
+
+    config_file = tmpdir.join('invalid.conf')
+    config_file.write("[Reasoning]\ninferences = everything\n")
+
+    with pytest.raises(AttributeError):
+        reasoner_settings(str(config_file))
@@ -0,0 +1,53 @@
+import threading
+import time
+from multiprocessing.dummy import Pool as ThreadPool
+
+from process.scheduler import Stage, StageScheduler
+
+
+class Recorder(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+        self.events = []
+
+    def stage(self, name, result, duration=0.01):
+        def run(*args):
+            with self.lock:
+                self.running[name] = self.running.get(name, 0) + 1
+                self.max_running[name] = max(self.max_running.get(name, 0), self.running[name])
+                self.events.append((name, args[0]))
+            time.sleep(duration)
+            with self.lock:
+                self.running[name] -= 1
+            return result(*args)
+
+        return run
+
+
+def test_should_pass_results_to_next_stage_while_running():
+    recorder = Recorder()
+
+    with ThreadPool(6) as pool:
+        scheduler = StageScheduler(pool, [
+            Stage('first', recorder.stage('first', lambda i: (i * 10,), duration=0.05), 2, next_stage='second'),
+            Stage('second', recorder.stage('second', lambda i: None if i == 30 else (i + 1,)), 1, next_stage='third'),
+            Stage('third', recorder.stage('third', lambda i: None), 3),
+        ])
+
+        for i in range(1, 7):
+            scheduler.submit('first', i)
+        scheduler.join()
+
+    assert sorted(i for name, i in recorder.events if name == 'second') == [10, 20, 30, 40, 50, 60]
+    # the result of 30 is not passed on
+    assert sorted(i for name, i in recorder.events if name == 'third') == [11, 21, 41, 51, 61]
+
+    # later stages start before the first stage is done
+    assert recorder.events.index(('second', 10)) < recorder.events.index(('first', 6))
+
+    # the limits of each stage are respected
+    assert recorder.max_running['first'] == 2
+    assert recorder.max_running['second'] == 1
+    assert recorder.max_running['third'] <= 3
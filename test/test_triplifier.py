@@ -84,3 +84,46 @@ def test_should_generate_valid_triples(config):
 
     # Check length of triples
     assert len(triples) == len(expected_triples)
+
+
+def test_should_generate_same_triples_as_row_by_row(config):
+    config = config("data/valid.csv")
+    triplifier = Triplifier(config)
+
+    data = pd.DataFrame({
+        'record_id': [1, 2, 3, 4],
+        'year': ['1988', '2010.00', 'unknown', None],
+        'day_of_year': [120, None, 3, 4],
+        'latitude': [-12.99, 13.0, None, 0.0],
+        'longitude': ['13.00', '', 'string', '+4'],
+        'source': ['me', None, 'you', 'them'],
+        'phenophase_name': ['{flower presence}', '{flower presence}', None, '{flower presence}'],
+    })
+
+    assert triplifier.triplify(data.copy()) == triplifier._triplify_by_row(data.copy())
+
+
+def test_should_generate_same_triples_in_batches(config):
+    config = config("data/valid.csv")
+    triplifier = Triplifier(config)
+
+    data = _load_data(config)
+    data = data.loc[data.index.repeat(5)].reset_index(drop=True)
+    data['record_id'] = range(1, 6)
+
+    batches = list(triplifier.triplify_batches(data, 2))
+
+    # 3 batches of data and 1 batch of entity, relation and import triples
+    assert len(batches) == 4
+    assert [t for batch in batches for t in batch] == triplifier.triplify(data)
+
+
+def test_should_exclude_schema_triples(config):
+    config = config("data/valid.csv")
+    triplifier = Triplifier(config)
+
+    data = _load_data(config)
+    triples = [t for batch in triplifier.triplify_batches(data, 10, include_schema=False) for t in batch]
+
+    assert len(triples) == 9
+    assert triples + triplifier.schema_triples() == triplifier.triplify(data)
@@ -0,0 +1,33 @@
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from process.unique_index import UniqueIndex
+
+
+def test_should_find_values_added_in_previous_batches(tmpdir):
+    index = UniqueIndex(str(tmpdir.join('index')), num_shards=4)
+    index.clear()
+
+    assert not index.check_and_add('record_id', pd.Series([1, 2, 3])).any()
+    assert list(index.check_and_add('record_id', pd.Series([3.0, 4.0, None, 1.0]))) == [True, False, False, True]
+    assert list(index.check_and_add('record_id', pd.Series(['4', '5']))) == [True, False]
+
+    # columns are tracked separately
+    assert not index.check_and_add('other_id', pd.Series([1, 2, 3])).any()
+
+
+def _add_range(index, start, end):
+    return index.check_and_add('record_id', pd.Series(range(start, end)))
+
+
+def test_should_add_values_once_across_processes(tmpdir):
+    index = UniqueIndex(str(tmpdir.join('index')), num_shards=4)
+    index.clear()
+
+    with multiprocessing.Pool(processes=4) as pool:
+        results = pool.starmap(_add_range, [(index, 0, 1000), (index, 500, 1500), (index, 1000, 2000)])
+
+    # every value in the overlapping ranges is reported as seen by exactly 1 process
+    assert sum(np.count_nonzero(r) for r in results) == 1000
@@ -1,3 +1,5 @@
+import os
+
 import pytest
 from testfixtures import LogCapture
 from process.validator import Validator, InvalidData, DataValidator
@@ -56,3 +58,130 @@ def test_should_return_false_for_invalid_data(config, capfd):
                     ('root', 'DEBUG', 'dropping invalid data')
         )
 
+
+def test_should_drop_invalid_rows_and_coerce_floats(config):
+    config = config("data/invalid_input.csv")
+
+    data = pd.DataFrame({
+        'record_id': [1, 2, 3, 3],
+        'year': ['2010', '2010.0', 'x', '2011'],
+        'day_of_year': [1, 2, 3, 4],
+        'latitude': ['1', '-2.5', '1.2.3', '4'],
+        'longitude': [1.0, 2.0, 3.0, 4.0],
+        'phenophase_name': ['a', 'b', 'c', 'd'],
+        'source': ['s', 's', 's', 's'],
+    })
+    validator = Validator(config)
+
+    with LogCapture() as l:
+        assert validator.validate(data) is True
+
+        l.check(
+            ('root', 'INFO', 'ERROR: Duplicate values [3] in column `record_id`'),
+            ('root', 'INFO', 'WARNING: Value `x` in column `year` is not an integer'),
+            ('root', 'INFO', 'ERROR: Value `1.2.3` in column `latitude` is not a float'),
+            ('root', 'DEBUG', 'dropping invalid data')
+        )
+
+    assert data['record_id'].tolist() == [1, 2]
+    assert data['latitude'].tolist() == [1.0, -2.5]
+
+def test_should_accept_exponent_and_bare_decimal_numbers(config):
+    config = config("data/invalid_input.csv")
+
+    # the csv readers read the Integer and Float rule columns as strings
+    data = pd.DataFrame({
+        'record_id': [1, 2, 3, 4, 5],
+        'year': ['1e3', '2010.', '+2011', '2.01e3', '2.0101e3'],
+        'day_of_year': [1, 2, 3, 4, 5],
+        'latitude': ['1e5', '.5', '5.', '-1.5E-3', '+2'],
+        'longitude': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'phenophase_name': ['a', 'b', 'c', 'd', 'e'],
+        'source': ['s', 's', 's', 's', 's'],
+    })
+    validator = Validator(config)
+
+    with LogCapture() as l:
+        assert validator.validate(data) is True
+
+        l.check(
+            ('root', 'INFO', 'WARNING: Value `2.0101e3` in column `year` is not an integer'),
+            ('root', 'DEBUG', 'dropping invalid data')
+        )
+
+    assert data['latitude'].tolist() == [100000.0, 0.5, 5.0, -0.0015]
+
+
+def test_should_write_validation_report(tmpdir):
+    from process.config import Config
+
+    ns = Namespace(chunk_size=50000, config_dir='test/config', data_file='test/data/invalid_input.csv', drop_invalid=True, log_file=False, num_processes=4, ontology='test/test-ontology.owl', output_dir=str(tmpdir), reasoner_config=None, verbose=True, invalid_sample_size=1)
+    config = Config(**ns.__dict__)
+
+    data = pd.DataFrame({
+        'record_id': [1, 2, 3, 4],
+        'year': ['x', 'x', 'y', '2011'],
+        'day_of_year': [1, 2, 3, 4],
+        'latitude': [1.0, 2.0, 3.0, 4.0],
+        'longitude': [1.0, 2.0, 3.0, 4.0],
+        'phenophase_name': ['a', 'b', 'c', 'd'],
+        'source': ['s', 's', 's', 's'],
+    })
+    validator = Validator(config)
+    validator.validate(data)
+
+    report = validator.write_report()
+    assert report == {('integer', 'year', 'warning'): {'count': 3, 'values': {'x': 2, 'y': 1}}}
+
+    # only invalid_sample_size rows are written for each rule & column
+    with open(config.invalid_data_file) as f:
+        assert f.read() == "1,x,1,1.0,1.0,a,s,integer rule error\n"
+
+    with open(config.validation_report_file) as f:
+        assert f.read().splitlines() == ['rule,column,level,count,values', 'integer,year,warning,3,x (2)|y (1)']
+
+
+def test_should_report_most_common_values_of_the_run(tmpdir, monkeypatch, capsys):
+    import process.validator
+    from process.config import Config
+
+    monkeypatch.setattr(process.validator, 'MAX_REPORTED_VALUES', 1)
+    ns = Namespace(chunk_size=50000, config_dir='test/config', data_file='test/data/invalid_input.csv', drop_invalid=True, log_file=False, num_processes=4, ontology='test/test-ontology.owl', output_dir=str(tmpdir), reasoner_config=None, verbose=True)
+    config = Config(**ns.__dict__)
+
+    with Validator(config) as validator:
+        # b is never the most common invalid value of a chunk, but is the most common of the run
+        for i, years in enumerate((['a', 'a', 'b'], ['c', 'c', 'b'], ['d', 'd', 'b'])):
+            validator.validate(pd.DataFrame({
+                'record_id': range(i * 3, i * 3 + 3),
+                'year': years,
+                'day_of_year': [1] * len(years),
+                'latitude': [1.0] * len(years),
+                'longitude': [1.0] * len(years),
+                'phenophase_name': ['a'] * len(years),
+                'source': ['s'] * len(years),
+            }))
+
+    # the report is written when the validator exits
+    with open(config.validation_report_file) as f:
+        assert f.read().splitlines() == ['rule,column,level,count,values', 'integer,year,warning,9,b (3)']
+    # only warnings, so validation didn't fail
+    assert 'Validation Failed' not in capsys.readouterr().out
+
+
+def test_should_print_report_location_when_validation_fails(tmpdir, capsys):
+    from process.config import Config
+
+    ns = Namespace(chunk_size=50000, config_dir='test/config', data_file='test/data/invalid_input.csv', drop_invalid=False, log_file=False, num_processes=4, ontology='test/test-ontology.owl', output_dir=str(tmpdir), reasoner_config=None, verbose=True)
+    config = Config(**ns.__dict__)
+    validator = Validator(config)
+
+    assert validator.validate(_load_data(config)) is False
+    assert 'Validation Failed' not in capsys.readouterr().out
+
+    validator.write_report()
+
+    with open(config.invalid_data_file) as f:
+        assert f.read()
+    assert capsys.readouterr().out == "Validation Failed! The logs are located {}\n".format(
+        os.path.realpath(config.invalid_data_file))
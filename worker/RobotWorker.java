@@ -0,0 +1,202 @@
+import com.fasterxml.jackson.databind.JsonNode;
+import com.fasterxml.jackson.databind.ObjectMapper;
+import com.fasterxml.jackson.databind.node.ObjectNode;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.HashSet;
+import java.util.List;
+import java.util.Set;
+import org.obolibrary.robot.CatalogXmlIRIMapper;
+import org.obolibrary.robot.CommandManager;
+import org.obolibrary.robot.CommandState;
+import org.obolibrary.robot.MergeCommand;
+import org.obolibrary.robot.QueryCommand;
+import org.obolibrary.robot.ReasonCommand;
+import org.obolibrary.robot.ReduceCommand;
+import org.semanticweb.owlapi.apibinding.OWLManager;
+import org.semanticweb.owlapi.model.AddImport;
+import org.semanticweb.owlapi.model.AddOntologyAnnotation;
+import org.semanticweb.owlapi.model.OWLAnnotation;
+import org.semanticweb.owlapi.model.OWLAxiom;
+import org.semanticweb.owlapi.model.OWLImportsDeclaration;
+import org.semanticweb.owlapi.model.OWLOntology;
+import org.semanticweb.owlapi.model.OWLOntologyID;
+import org.semanticweb.owlapi.model.OWLOntologyManager;
+
+/**
+ * Long running ROBOT worker for the ontology data pipeline, started with --robot_worker. See process/worker.py for
+ * the json lines protocol.
+ *
+ * <p>The JVM and ROBOT's CommandManager are started once. The input files of the first command of each job are
+ * loaded into an OWLOntologyManager that is kept between jobs, so the ontology imported by the data files, or the
+ * prepared copy mapped by a --catalog, is fetched and parsed by the first job only. The inputs are merged into one
+ * ontology, which is passed to the commands as the chained input, and removed from the manager after the job.
+ *
+ * <p>Build with: javac -cp lib/robot.jar -d lib worker/RobotWorker.java
+ *
+ * <p>Run with: java -Xmx8g -cp lib/robot.jar:lib RobotWorker
+ */
+public class RobotWorker {
+  private static final Set<String> INPUT_OPTIONS = new HashSet<>(Arrays.asList("-i", "--input"));
+  private static final Set<String> CATALOG_OPTIONS = new HashSet<>(Arrays.asList("--catalog"));
+
+  private final CommandManager commands = new CommandManager();
+  private final OWLOntologyManager manager = OWLManager.createOWLOntologyManager();
+  private final Set<String> catalogs = new HashSet<>();
+
+  public RobotWorker() {
+    // the commands used by the pipeline, see process/reasoner.py and process/rdf2csv.py
+    commands.addCommand("merge", new MergeCommand());
+    commands.addCommand("query", new QueryCommand());
+    commands.addCommand("reason", new ReasonCommand());
+    commands.addCommand("reduce", new ReduceCommand());
+  }
+
+  public static void main(String[] args) throws Exception {
+    // the replies are the only output on stdout. Anything the commands print is returned in the reply
+    PrintStream replies =
+        new PrintStream(new FileOutputStream(FileDescriptor.out), true, StandardCharsets.UTF_8.name());
+    BufferedReader jobs = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+    ObjectMapper mapper = new ObjectMapper();
+    RobotWorker worker = new RobotWorker();
+
+    String line;
+    while ((line = jobs.readLine()) != null) {
+      if (line.trim().isEmpty()) {
+        continue;
+      }
+      JsonNode job = mapper.readTree(line);
+      List<String> jobArgs = new ArrayList<>();
+      for (JsonNode arg : job.get("args")) {
+        jobArgs.add(arg.asText());
+      }
+
+      ObjectNode reply = worker.run(jobArgs, mapper);
+      reply.set("id", job.get("id"));
+      replies.println(mapper.writeValueAsString(reply));
+      replies.flush();
+    }
+  }
+
+  /**
+   * Run a ROBOT command line, ex: reason -i data_1.ttl ... -o reasoned/data_1.ttl
+   *
+   * @return reply with the exit code, stdout and stderr of the command
+   */
+  public ObjectNode run(List<String> args, ObjectMapper mapper) throws Exception {
+    ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+    ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+    PrintStream originalOut = System.out;
+    System.setOut(new PrintStream(stdout, true, StandardCharsets.UTF_8.name()));
+
+    int exit = 0;
+    OWLOntology input = null;
+    try {
+      List<String> commandArgs = new ArrayList<>(args);
+      for (String catalog : removeOption(commandArgs, CATALOG_OPTIONS, commandArgs.size())) {
+        if (catalogs.add(catalog)) {
+          manager.getIRIMappers().add(new CatalogXmlIRIMapper(new File(catalog)));
+        }
+      }
+
+      List<String> inputs = removeOption(commandArgs, INPUT_OPTIONS, firstCommandEnd(commandArgs));
+      CommandState state = new CommandState();
+      if (!inputs.isEmpty()) {
+        input = load(inputs);
+        state.setOntology(input);
+      }
+
+      commands.execute(state, commandArgs.toArray(new String[0]));
+    } catch (Exception e) {
+      exit = 1;
+      PrintStream err = new PrintStream(stderr, true, StandardCharsets.UTF_8.name());
+      e.printStackTrace(err);
+      err.flush();
+    } finally {
+      System.setOut(originalOut);
+      if (input != null) {
+        manager.removeOntology(input);
+      }
+    }
+
+    ObjectNode reply = mapper.createObjectNode();
+    reply.put("exit", exit);
+    reply.put("stdout", stdout.toString(StandardCharsets.UTF_8.name()));
+    reply.put("stderr", stderr.toString(StandardCharsets.UTF_8.name()));
+    return reply;
+  }
+
+  /**
+   * Load the input files into the resident manager, merged into one ontology with the id of the first file. Each
+   * file is removed from the manager once copied, as the files of a job may declare the same ontology IRI.
+   */
+  private OWLOntology load(List<String> inputs) throws Exception {
+    if (inputs.size() == 1) {
+      return manager.loadOntologyFromOntologyDocument(new File(inputs.get(0)));
+    }
+
+    OWLOntologyID id = null;
+    Set<OWLAxiom> axioms = new HashSet<>();
+    Set<OWLImportsDeclaration> imports = new HashSet<>();
+    Set<OWLAnnotation> annotations = new HashSet<>();
+    for (String path : inputs) {
+      OWLOntology ontology = manager.loadOntologyFromOntologyDocument(new File(path));
+      if (id == null) {
+        id = ontology.getOntologyID();
+      }
+      axioms.addAll(ontology.getAxioms());
+      imports.addAll(ontology.getImportsDeclarations());
+      annotations.addAll(ontology.getAnnotations());
+      manager.removeOntology(ontology);
+    }
+
+    OWLOntology merged = manager.createOntology(id);
+    for (OWLImportsDeclaration declaration : imports) {
+      manager.applyChange(new AddImport(merged, declaration));
+    }
+    for (OWLAnnotation annotation : annotations) {
+      manager.applyChange(new AddOntologyAnnotation(merged, annotation));
+    }
+    manager.addAxioms(merged, axioms);
+    return merged;
+  }
+
+  /** @return index of the second command of a chained command line, or the size of args */
+  private static int firstCommandEnd(List<String> args) {
+    Set<String> names = new HashSet<>(Arrays.asList("merge", "query", "reason", "reduce"));
+    for (int i = 1; i < args.size(); i++) {
+      if (names.contains(args.get(i))) {
+        return i;
+      }
+    }
+    return args.size();
+  }
+
+  /**
+   * Remove the options and their values wherever they occur before end in args
+   *
+   * @return the values, in the order they occur
+   */
+  private static List<String> removeOption(List<String> args, Set<String> options, int end) {
+    List<String> values = new ArrayList<>();
+    int i = 0;
+    while (i < Math.min(end, args.size()) - 1) {
+      if (options.contains(args.get(i))) {
+        values.add(args.remove(i + 1));
+        args.remove(i);
+        end -= 2;
+      } else {
+        i++;
+      }
+    }
+    return values;
+  }
+}